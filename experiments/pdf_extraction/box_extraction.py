@@ -1,6 +1,17 @@
 import fitz
 import os
-import sys
+import time
+import numpy as np
+
+# Candidate filters
+MIN_BOX_SIZE = 50            # ignore tiny icons/checkboxes (width or height below this)
+MAX_PAGE_AREA_RATIO = 0.95   # rects covering more of the page are backgrounds/borders
+DUPLICATE_TOLERANCE = 2      # x0, y0, width, height all closer than this -> same box
+
+# Capture
+CAPTURE_ZOOM = 2             # high resolution zoom (2x)
+CLIP_PADDING = 2             # small padding to capture stroke width safely
+UNION_FALLBACK_RATIO = 1.5   # render per clip when the union is this much larger than the boxes
 
 def is_contained(inner, outer):
     """
@@ -13,10 +24,218 @@ def is_contained(inner, outer):
         inner.y1 <= outer.y1
     )
 
-def extract_boxes(pdf_path, output_dir="output_box"):
+def select_boxes_reference(rects, page_rect):
+    """
+    Original O(n^2) candidate selection, kept as the reference for select_boxes().
+    Returns the outermost boxes sorted by y0.
+    """
+    page_area = page_rect.width * page_rect.height
+
+    # 1. Collect all potential rectangular candidates
+    candidates = []
+    for rect in rects:
+        width = rect.width
+        height = rect.height
+        area = width * height
+
+        # Filter: Minimum Size (e.g., 50x50) to ignore tiny icons/checkboxes
+        if width < MIN_BOX_SIZE or height < MIN_BOX_SIZE:
+            continue
+
+        # Filter: Maximum Size (exclude full page borders)
+        # If a rect covers > 95% of the page, it's likely a background or border.
+        if area > (page_area * MAX_PAGE_AREA_RATIO):
+            continue
+
+        # Deduplication Check (exact or very close matches)
+        is_duplicate = False
+        for existing_rect in candidates:
+            if abs(existing_rect.x0 - rect.x0) < DUPLICATE_TOLERANCE and abs(existing_rect.y0 - rect.y0) < DUPLICATE_TOLERANCE and \
+               abs(existing_rect.width - width) < DUPLICATE_TOLERANCE and abs(existing_rect.height - height) < DUPLICATE_TOLERANCE:
+                is_duplicate = True
+                break
+
+        if not is_duplicate:
+            candidates.append(rect)
+
+    # 2. Container Logic (Remove nested boxes)
+    # Sort by Area Descending (Largest to Smallest)
+    candidates.sort(key=lambda r: r.width * r.height, reverse=True)
+
+    final_boxes = []
+    for candidate in candidates:
+        # Check if this candidate is contained in any already selected (larger) box
+        is_nested = False
+        for selected in final_boxes:
+            if is_contained(candidate, selected):
+                is_nested = True
+                break
+
+        if not is_nested:
+            final_boxes.append(candidate)
+
+    # Sort again by vertical position (y0) for logical file ordering
+    final_boxes.sort(key=lambda r: r.y0)
+    return final_boxes
+
+def select_boxes(rects, page_rect):
+    """
+    Vectorized candidate selection with the same output as select_boxes_reference().
+
+    - Size/area filters run on NumPy rect arrays.
+    - Near-duplicate removal keeps the original greedy order but only compares against
+      accepted candidates in the neighbouring cells of a (x0, y0) grid with cell size
+      DUPLICATE_TOLERANCE, instead of against every candidate.
+    - Nesting checks each candidate against the selected boxes as one array operation.
+    """
+    if not rects:
+        return []
+
+    coords = np.array([(r.x0, r.y0, r.x1, r.y1) for r in rects], dtype=np.float64)
+    keep = size_filter(coords, page_rect.width * page_rect.height)
+    return [rects[i] for i in select_box_indices(coords, np.flatnonzero(keep))]
+
+def size_filter(coords, page_area, min_size=MIN_BOX_SIZE, max_area_ratio=MAX_PAGE_AREA_RATIO):
+    """
+    Step 1 of select_boxes() on an (n, 4) x0/y0/x1/y1 array: True for rects at least
+    min_size wide and high and covering at most max_area_ratio of page_area.
+    page_area may be a per-row array, so a whole book can be filtered in one pass.
+    """
+    width = np.maximum(coords[:, 2] - coords[:, 0], 0)
+    height = np.maximum(coords[:, 3] - coords[:, 1], 0)
+    return (width >= min_size) & (height >= min_size) & (width * height <= page_area * max_area_ratio)
+
+def select_box_indices(coords, order, tolerance=DUPLICATE_TOLERANCE):
+    """
+    Steps 2-3 of select_boxes() on one page: near-duplicate removal and container logic over
+    the candidate row indices in order (ascending, already size-filtered).
+    Returns the selected row indices sorted by y0.
+    """
+    x0, y0, x1, y1 = coords.T
+    width = np.maximum(x1 - x0, 0)
+    height = np.maximum(y1 - y0, 0)
+    area = width * height
+
+    # 2. Greedy near-duplicate removal through a grid index
+    tol = tolerance
+    grid = {}
+    candidates = []
+    for i, cx, cy, cw, ch in zip(order.tolist(), x0[order].tolist(), y0[order].tolist(),
+                                  width[order].tolist(), height[order].tolist()):
+        gx, gy = int(cx // tol), int(cy // tol)
+        is_duplicate = False
+        for nx in (gx - 1, gx, gx + 1):
+            for ny in (gy - 1, gy, gy + 1):
+                for ex, ey, ew, eh in grid.get((nx, ny), ()):
+                    if abs(ex - cx) < tol and abs(ey - cy) < tol and abs(ew - cw) < tol and abs(eh - ch) < tol:
+                        is_duplicate = True
+                        break
+                if is_duplicate:
+                    break
+            if is_duplicate:
+                break
+        if not is_duplicate:
+            grid.setdefault((gx, gy), []).append((cx, cy, cw, ch))
+            candidates.append(i)
+
+    # 3. Container logic: largest first (stable, like list.sort(reverse=True))
+    candidates = np.array(candidates, dtype=np.int64)
+    candidates = candidates[np.argsort(-area[candidates], kind="stable")]
+
+    sel = np.empty((len(candidates), 4), dtype=np.float64)
+    selected = []
+    for i in candidates.tolist():
+        k = len(selected)
+        if k:
+            s = sel[:k]
+            if np.any((s[:, 0] <= x0[i]) & (s[:, 1] <= y0[i]) & (s[:, 2] >= x1[i]) & (s[:, 3] >= y1[i])):
+                continue
+        sel[k] = coords[i]
+        selected.append(i)
+
+    selected.sort(key=lambda i: y0[i])
+    return selected
+
+def box_clip(rect, page_rect):
+    """Capture area for a box: padded by CLIP_PADDING and kept within page bounds."""
+    clip = fitz.Rect(rect.x0 - CLIP_PADDING, rect.y0 - CLIP_PADDING, rect.x1 + CLIP_PADDING, rect.y1 + CLIP_PADDING)
+    return clip & page_rect
+
+def edge_strips(clip, zoom):
+    """
+    Page-space strips covering the partially covered edge pixels of a clip.
+    MuPDF culls drawing items against the exact (fractional) clip, so these pixels can
+    differ from the same pixels in a larger render and are re-rendered per clip.
+    """
+    ir = (clip * fitz.Matrix(zoom, zoom)).irect
+    strips = []
+    if ir.y0 < clip.y0 * zoom:
+        strips.append(fitz.Rect(clip.x0, clip.y0, clip.x1, (ir.y0 + 1) / zoom))
+    if ir.y1 > clip.y1 * zoom:
+        strips.append(fitz.Rect(clip.x0, (ir.y1 - 1) / zoom, clip.x1, clip.y1))
+    if ir.x0 < clip.x0 * zoom:
+        strips.append(fitz.Rect(clip.x0, clip.y0, (ir.x0 + 1) / zoom, clip.y1))
+    if ir.x1 > clip.x1 * zoom:
+        strips.append(fitz.Rect((ir.x1 - 1) / zoom, clip.y0, clip.x1, clip.y1))
+    return strips
+
+def render_clips(page, clips, zoom=CAPTURE_ZOOM, mode="auto"):
+    """
+    Renders each clip area of a page. Returns (pixmaps, used_mode).
+
+    - "clip": page.get_pixmap() per clip (original behaviour, re-interprets the page each time)
+    - "crop": one render of the union of the clips; each box is sliced from that buffer
+      (a NumPy view, copied once into its own Pixmap for PNG encoding) and its edge pixels
+      are patched from small per-clip strip renders
+    - "auto": "crop", unless the union area exceeds UNION_FALLBACK_RATIO x the summed clip
+      areas (few boxes far apart), in which case clips are rendered one by one from a
+      shared display list ("displaylist")
+    """
+    matrix = fitz.Matrix(zoom, zoom)
+    if mode == "clip":
+        return [page.get_pixmap(matrix=matrix, clip=clip) for clip in clips], "clip"
+
+    display_list = page.get_displaylist()
+    union = fitz.Rect(clips[0])
+    for clip in clips[1:]:
+        union |= clip
+
+    if mode == "auto" and union.get_area() > UNION_FALLBACK_RATIO * sum(clip.get_area() for clip in clips):
+        return [display_list.get_pixmap(matrix=matrix, clip=clip) for clip in clips], "displaylist"
+
+    full = display_list.get_pixmap(matrix=matrix, clip=union)
+    buffer = np.frombuffer(full.samples_mv, dtype=np.uint8).reshape(full.h, full.w, full.n)
+    pixmaps = []
+    for clip in clips:
+        ir = (clip * matrix).irect
+        view = buffer[ir.y0 - full.y:ir.y1 - full.y, ir.x0 - full.x:ir.x1 - full.x]
+        pix = fitz.Pixmap(full.colorspace, ir.width, ir.height, view.tobytes(), full.alpha)
+        pix.set_origin(ir.x0, ir.y0)
+        for strip in edge_strips(clip, zoom):
+            strip_pix = display_list.get_pixmap(matrix=matrix, clip=strip)
+            pix.copy(strip_pix, strip_pix.irect)
+        pixmaps.append(pix)
+    return pixmaps, "crop"
+
+def compare_pixmaps(a, b):
+    """Returns (identical, max channel difference) of two renders of the same clip."""
+    if tuple(a.irect) != tuple(b.irect) or a.n != b.n:
+        return False, 255
+    if a.samples_mv == b.samples_mv:
+        return True, 0
+    diff = np.abs(np.frombuffer(a.samples_mv, dtype=np.uint8).astype(np.int16) -
+                  np.frombuffer(b.samples_mv, dtype=np.uint8).astype(np.int16))
+    return False, int(diff.max())
+
+def extract_boxes(pdf_path, output_dir="output_box", capture="auto", verify=False, drawing_cache=None):
     """
     Extracts content within distinct 'box' structures (outermost containers).
     Captures the area as a screenshot (preserving text layout and styles).
+
+    capture selects the render strategy (see render_clips). With verify=True every page is
+    also rendered the original per-clip way, and pixel differences and timings are reported.
+    drawing_cache is a drawing_cache.py directory: boxes are then selected from the cached
+    geometry (dumped on the first run) instead of calling page.get_drawings() per page.
     """
     if not os.path.exists(pdf_path):
         print(f"Error: File not found at {pdf_path}")
@@ -25,82 +244,56 @@ def extract_boxes(pdf_path, output_dir="output_box"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    cached_boxes = None
+    if drawing_cache:
+        from drawing_cache import load_drawings, select_boxes_cached
+
+        cache, hit = load_drawings(pdf_path, drawing_cache)
+        rows = cache.drawings
+        cached_boxes = {page_index: [fitz.Rect(rows["x0"][i], rows["y0"][i], rows["x1"][i], rows["y1"][i]) for i in boxes]
+                        for page_index, boxes in select_boxes_cached(cache).items()}
+        print(f"Drawing cache {'hit' if hit else 'built'}: {len(rows)} drawings ({drawing_cache})")
+
     doc = fitz.open(pdf_path)
     print(f"Opened with Box Extraction: {pdf_path}")
     print("-" * 30)
     
     total_captured = 0
+    capture_seconds = 0.0
+    reference_seconds = 0.0
+    mismatched = []
 
     for page_num, page in enumerate(doc):
-        # Page dimensions
-        page_w = page.rect.width
-        page_h = page.rect.height
-        page_area = page_w * page_h
-
-        drawings = page.get_drawings()
-        
-        # 1. Collect all potential rectangular candidates
-        candidates = []
-        for shape in drawings:
-            rect = shape['rect']
-            width = rect.width
-            height = rect.height
-            area = width * height
-            
-            # Filter: Minimum Size (e.g., 50x50) to ignore tiny icons/checkboxes
-            if width < 50 or height < 50:
-                continue
-                
-            # Filter: Maximum Size (exclude full page borders)
-            # If a rect covers > 95% of the page, it's likely a background or border.
-            if area > (page_area * 0.95):
-                continue
-            
-            # Deduplication Check (exact or very close matches)
-            is_duplicate = False
-            for existing_rect in candidates:
-                if abs(existing_rect.x0 - rect.x0) < 2 and abs(existing_rect.y0 - rect.y0) < 2 and \
-                   abs(existing_rect.width - width) < 2 and abs(existing_rect.height - height) < 2:
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                candidates.append(rect)
-        
-        # 2. Container Logic (Remove nested boxes)
-        # Sort by Area Descending (Largest to Smallest)
-        candidates.sort(key=lambda r: r.width * r.height, reverse=True)
-        
-        final_boxes = []
-        for candidate in candidates:
-            # Check if this candidate is contained in any already selected (larger) box
-            is_nested = False
-            for selected in final_boxes:
-                if is_contained(candidate, selected):
-                    is_nested = True
-                    break
-            
-            if not is_nested:
-                final_boxes.append(candidate)
+        # 1-2. Candidate collection, dedup and container logic
+        if cached_boxes is not None:
+            final_boxes = cached_boxes.get(page_num, [])
+        else:
+            final_boxes = select_boxes([shape['rect'] for shape in page.get_drawings()], page.rect)
 
         # 3. Capture Selected Boxes
         if final_boxes:
-            print(f"Processing Page {page_num + 1}: Found {len(final_boxes)} outermost boxes.")
-            
-            # Sort again by vertical position (y0) for logical file ordering
-            final_boxes.sort(key=lambda r: r.y0)
-
-            for i, rect in enumerate(final_boxes, start=1):
-                # Buffer: Add small padding to capture stroke width safely
-                clip = fitz.Rect(rect.x0 - 2, rect.y0 - 2, rect.x1 + 2, rect.y1 + 2)
-                
-                # Ensure clip is within page bounds
-                clip = clip & page.rect 
+            clips = [box_clip(rect, page.rect) for rect in final_boxes]
 
-                # High resolution zoom (2x)
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat, clip=clip)
-                
+            start = time.perf_counter()
+            pixmaps, used_mode = render_clips(page, clips, CAPTURE_ZOOM, capture)
+            elapsed = time.perf_counter() - start
+            capture_seconds += elapsed
+
+            message = f"Processing Page {page_num + 1}: Found {len(final_boxes)} outermost boxes. ({used_mode} {elapsed * 1000:.1f} ms"
+            if verify:
+                start = time.perf_counter()
+                reference, _ = render_clips(page, clips, CAPTURE_ZOOM, "clip")
+                reference_elapsed = time.perf_counter() - start
+                reference_seconds += reference_elapsed
+
+                results = [compare_pixmaps(pix, ref) for pix, ref in zip(pixmaps, reference)]
+                identical = sum(1 for same, _ in results if same)
+                max_diff = max(diff for _, diff in results)
+                mismatched.extend((page_num + 1, i) for i, (same, _) in enumerate(results, start=1) if not same)
+                message += f" vs clip {reference_elapsed * 1000:.1f} ms, {identical}/{len(results)} identical, max diff {max_diff}"
+            print(message + ")")
+
+            for i, pix in enumerate(pixmaps, start=1):
                 # Save
                 filename = f"p{page_num+1}_box_{i}.png"
                 filepath = os.path.join(output_dir, filename)
@@ -110,10 +303,101 @@ def extract_boxes(pdf_path, output_dir="output_box"):
 
     print("-" * 30)
     print(f"Extraction Complete. Total Boxes Captured: {total_captured}")
+    print(f"Capture Time: {capture_seconds:.2f}s ({capture})")
+    if verify:
+        print(f"Reference Capture Time: {reference_seconds:.2f}s (clip), "
+              f"{total_captured - len(mismatched)}/{total_captured} boxes pixel-identical")
+        for page_no, index in mismatched[:20]:
+            print(f"  Differs: p{page_no}_box_{index}.png")
     print(f"Output Directory: {output_dir}")
 
+def box_stage(capture="auto"):
+    """
+    Pipeline stage (scripts/pdf_pipeline.py): yields one PNG item per selected box,
+    reusing the page's shared get_drawings() result.
+    """
+    def stage(ctx):
+        final_boxes = select_boxes([shape['rect'] for shape in ctx.drawings], ctx.page.rect)
+        if not final_boxes:
+            return
+        clips = [box_clip(rect, ctx.page.rect) for rect in final_boxes]
+        pixmaps, _ = render_clips(ctx.page, clips, CAPTURE_ZOOM, capture)
+        for i, (rect, pix) in enumerate(zip(final_boxes, pixmaps), start=1):
+            yield ctx.item("box", i, bbox=list(rect), data=pix.tobytes("png"), ext="png")
+    return stage
+
+def make_benchmark_page(doc, n_drawings, seed=0):
+    """
+    Adds a page with n_drawings stroked rects: nested panels, near-duplicate outlines,
+    tiny icons and a full-page border, roughly like a dense textbook layout.
+    """
+    import random
+
+    rng = random.Random(seed)
+    page = doc.new_page(width=595, height=842)
+    shape = page.new_shape()
+    shape.draw_rect(fitz.Rect(5, 5, 590, 837))  # page border (filtered by area)
+    shape.finish(color=(0, 0, 0), width=0.5)
+    for _ in range(n_drawings - 1):
+        kind = rng.random()
+        x0, y0 = rng.uniform(10, 480), rng.uniform(10, 720)
+        if kind < 0.3:
+            w, h = rng.uniform(5, 45), rng.uniform(5, 45)       # icon (filtered by size)
+        elif kind < 0.5:
+            x0, y0 = round(x0 / 40) * 40 + rng.uniform(0, 1.5), round(y0 / 40) * 40 + rng.uniform(0, 1.5)
+            w, h = 80 + rng.uniform(0, 1.5), 60 + rng.uniform(0, 1.5)  # near-duplicate outlines
+        else:
+            w, h = rng.uniform(50, 575 - x0), rng.uniform(50, 822 - y0)
+        shape.draw_rect(fitz.Rect(x0, y0, x0 + w, y0 + h))
+        shape.finish(color=(0, 0, 0), width=0.5)  # one path per rect, like separate drawings
+    shape.commit()
+    return page
+
+def benchmark(sizes=(1000, 5000, 10000, 20000), repeat=3):
+    """
+    Times select_boxes_reference() vs select_boxes() on synthetic pages and checks
+    that both return the same boxes in the same order.
+    """
+    doc = fitz.open()
+    print(f"{'drawings':>8} {'candidates':>10} {'boxes':>6} {'reference (s)':>14} {'vectorized (s)':>15} {'speedup':>8}")
+    for i, n in enumerate(sizes):
+        page = make_benchmark_page(doc, n, seed=i)
+        rects = [shape['rect'] for shape in page.get_drawings()]
+
+        timings = {}
+        results = {}
+        for name, fn in (("reference", select_boxes_reference), ("vectorized", select_boxes)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results[name] = fn(rects, page.rect)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        reference = [tuple(r) for r in results["reference"]]
+        if reference != [tuple(r) for r in results["vectorized"]]:
+            raise AssertionError(f"select_boxes output differs from reference on {n} drawings")
+
+        print(f"{n:>8} {len(rects):>10} {len(reference):>6} {timings['reference']:>14.3f} "
+              f"{timings['vectorized']:>15.3f} {timings['reference'] / timings['vectorized']:>7.1f}x")
+    doc.close()
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python box_extraction.py <pdf_path>")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Box-based region extraction")
+    parser.add_argument("pdf_path", nargs="?")
+    parser.add_argument("--output-dir", default="output_box")
+    parser.add_argument("--capture", choices=["auto", "crop", "clip"], default="auto",
+                        help="auto/crop: render each page once and slice boxes, clip: render per box")
+    parser.add_argument("--verify", action="store_true", help="compare against per-box rendering and report timings")
+    parser.add_argument("--bench", action="store_true", help="benchmark box selection on synthetic dense pages")
+    parser.add_argument("--drawing-cache", metavar="DIR", help="select boxes from cached drawing geometry (see drawing_cache.py)")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark()
+    elif not args.pdf_path:
+        parser.print_usage()
     else:
-        extract_boxes(sys.argv[1])
+        extract_boxes(args.pdf_path, args.output_dir, args.capture, args.verify, args.drawing_cache)
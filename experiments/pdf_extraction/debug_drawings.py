@@ -1,28 +1,32 @@
+import os
+
 import fitz
 
+from drawing_cache import CACHE_DIR, load_drawings
+
 def inspect_drawings(pdf_path, page_num=20):
-    doc = fitz.open(pdf_path)
-    page = doc[page_num]  # Inspector specific page (0-indexed)
+    # Drawings come from the per-book cache (drawing_cache.py) next to the PDF; get_drawings() only runs on the first call
+    cache, _ = load_drawings(pdf_path, os.path.join(os.path.dirname(os.path.abspath(pdf_path)), CACHE_DIR))
+    drawings = cache.page(page_num)  # Inspector specific page (0-indexed)
     
     print(f"--- Drawings on Page {page_num + 1} ---")
-    drawings = page.get_drawings()
     print(f"Total drawings found: {len(drawings)}")
     
     for i, shape in enumerate(drawings[:20]): # Show first 20
-        rect = shape['rect']
-        type_name = shape['type'] # s (stroke), f (fill), etc
-        items = shape['items'] # (op, p1, p2, ...)
+        rect = fitz.Rect(shape['x0'], shape['y0'], shape['x1'], shape['y1'])
+        type_name = shape['type'].decode() # s (stroke), f (fill), etc
+        items = int(shape['items']) # number of path items
         
         width = rect.width
         height = rect.height
         
         print(f"Shape {i+1}: Type={type_name}, Rect={rect}, W={width:.1f}, H={height:.1f}")
         # Detect if it looks like a box (rectangle path)
-        if len(items) == 1 and items[0][0] == 're':
-            print(f"  -> RECTANGLE DETECTED! {items[0]}")
-        elif len(items) >= 4:
+        if shape['rect']:
+            print(f"  -> RECTANGLE DETECTED! single 're' path, rect={rect}")
+        elif items >= 4:
             # Check for 4-line closed path?
-            print(f"  -> Complex Path: {len(items)} segments")
+            print(f"  -> Complex Path: {items} segments")
 
 if __name__ == "__main__":
     # Page 21 (index 20) had many images, might have boxes.
@@ -0,0 +1,197 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import fitz
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+from extraction_state import fingerprint_file
+from box_extraction import DUPLICATE_TOLERANCE, MAX_PAGE_AREA_RATIO, MIN_BOX_SIZE, select_box_indices, size_filter
+
+# One-time dump of every page's vector drawings, so box-selection tuning does not re-run
+# page.get_drawings() over the whole PDF. One compressed .npz per book, named by the SHA-256
+# of the PDF file; any change to the PDF (or CACHE_VERSION) is a miss and the book is re-dumped.
+#   drawings: one row per get_drawings() path, in page order then drawing order
+#   pages:    page size plus the [start, start + count) slice of drawings for each page
+CACHE_DIR = ".drawing_cache"
+CACHE_VERSION = 2
+
+DRAWING_DTYPE = np.dtype([
+    ("page", "<u4"),
+    ("x0", "<f8"), ("y0", "<f8"), ("x1", "<f8"), ("y1", "<f8"),  # float64: same values as fitz.Rect
+    ("type", "S2"),        # get_drawings() "type": f, s, fs
+    ("items", "<u4"),      # number of path items (lines, curves, rects, quads)
+    ("rect", "?"),         # the path is a single 're' item (a plain rectangle)
+])
+
+PAGE_DTYPE = np.dtype([("width", "<f8"), ("height", "<f8"), ("start", "<u8"), ("count", "<u4")])
+
+class DrawingCache:
+    """Drawings of one book as structured arrays (see DRAWING_DTYPE / PAGE_DTYPE)."""
+
+    def __init__(self, drawings, pages, fingerprint, book=""):
+        self.drawings = drawings
+        self.pages = pages
+        self.fingerprint = fingerprint
+        self.book = book
+
+    @property
+    def coords(self):
+        """(n, 4) float64 x0/y0/x1/y1 array of every drawing in the book."""
+        return np.column_stack([self.drawings[key] for key in ("x0", "y0", "x1", "y1")])
+
+    def page(self, page_index):
+        """Rows of one page (0-based) as a view."""
+        start, count = int(self.pages["start"][page_index]), int(self.pages["count"][page_index])
+        return self.drawings[start:start + count]
+
+    def page_rects(self, page_index):
+        return [fitz.Rect(row["x0"], row["y0"], row["x1"], row["y1"]) for row in self.page(page_index)]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, drawings=self.drawings, pages=self.pages,
+                            meta=np.array([CACHE_VERSION, self.fingerprint, self.book]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            version, fingerprint, book = data["meta"].tolist()
+            if int(version) != CACHE_VERSION:
+                return None
+            return cls(data["drawings"], data["pages"], fingerprint, book)
+
+def dump_drawings(pdf_path):
+    """Runs page.get_drawings() once on every page and packs the result into a DrawingCache."""
+    rows, pages = [], []
+    with fitz.open(pdf_path) as doc:
+        for page_index, page in enumerate(doc):
+            drawings = page.get_drawings()
+            pages.append((page.rect.width, page.rect.height, len(rows), len(drawings)))
+            for shape in drawings:
+                rect, items = shape["rect"], shape["items"]
+                rows.append((page_index, rect.x0, rect.y0, rect.x1, rect.y1, (shape.get("type") or "").encode(),
+                             len(items), len(items) == 1 and items[0][0] == "re"))
+    return DrawingCache(np.array(rows, dtype=DRAWING_DTYPE), np.array(pages, dtype=PAGE_DTYPE),
+                        fingerprint_file(pdf_path), os.path.splitext(os.path.basename(pdf_path))[0])
+
+def load_drawings(pdf_path, cache_dir=CACHE_DIR, rebuild=False):
+    """
+    Cached drawings of pdf_path, dumping them on the first call (or when the PDF changed).
+    Returns (DrawingCache, hit) where hit is False if get_drawings() had to run.
+    """
+    fingerprint = fingerprint_file(pdf_path)
+    path = os.path.join(cache_dir, f"{fingerprint}.npz")
+    if not rebuild and os.path.exists(path):
+        cache = DrawingCache.load(path)
+        if cache is not None:
+            return cache, True
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache = dump_drawings(pdf_path)
+    cache.save(path)
+    return cache, False
+
+def select_boxes_cached(cache, min_size=MIN_BOX_SIZE, max_area_ratio=MAX_PAGE_AREA_RATIO, tolerance=DUPLICATE_TOLERANCE):
+    """
+    box_extraction.select_boxes() over a whole book from the cache.
+    The size/area filter runs as one vectorized pass over every drawing of the book; the
+    order-dependent duplicate and nesting steps then run per page on the surviving candidates.
+    Returns {page_index: [row index into cache.drawings, ...]} sorted by y0, for pages with boxes.
+    """
+    coords = cache.coords
+    page_area = (cache.pages["width"] * cache.pages["height"])[cache.drawings["page"]]
+    candidates = np.flatnonzero(size_filter(coords, page_area, min_size, max_area_ratio))
+    if not len(candidates):
+        return {}
+
+    # Candidates are in page order: split them at page boundaries
+    pages = cache.drawings["page"][candidates]
+    bounds = np.flatnonzero(np.diff(pages)) + 1
+    selected = {}
+    for group in np.split(candidates, bounds):
+        page_index = int(cache.drawings["page"][group[0]])
+        start = int(cache.pages["start"][page_index])
+        count = int(cache.pages["count"][page_index])
+        boxes = select_box_indices(coords[start:start + count], group - start, tolerance)
+        if boxes:
+            selected[page_index] = [start + i for i in boxes]
+    return selected
+
+def sweep(cache, min_sizes, area_ratios, tolerances=(DUPLICATE_TOLERANCE,)):
+    """Box counts for every threshold combination. Returns a list of result dicts."""
+    results = []
+    for min_size, area_ratio, tolerance in itertools.product(min_sizes, area_ratios, tolerances):
+        start = time.perf_counter()
+        selected = select_boxes_cached(cache, min_size, area_ratio, tolerance)
+        results.append({
+            "min_size": min_size, "max_area_ratio": area_ratio, "tolerance": tolerance,
+            "boxes": sum(len(boxes) for boxes in selected.values()), "pages_with_boxes": len(selected),
+            "seconds": time.perf_counter() - start,
+        })
+    return results
+
+def verify(pdf_path, cache):
+    """Checks the cached selection against select_boxes() on live get_drawings() for every page."""
+    from box_extraction import select_boxes
+
+    selected = select_boxes_cached(cache)
+    mismatched = []
+    with fitz.open(pdf_path) as doc:
+        for page_index, page in enumerate(doc):
+            live = [tuple(r) for r in select_boxes([shape["rect"] for shape in page.get_drawings()], page.rect)]
+            rows = cache.drawings[selected.get(page_index, [])]
+            cached = [(row["x0"], row["y0"], row["x1"], row["y1"]) for row in rows]
+            if live != cached:
+                mismatched.append(page_index + 1)
+    return mismatched
+
+def parse_values(text, cast=float):
+    return [cast(value) for value in text.split(",") if value.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cached drawing geometry for box-selection tuning")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    dump = sub.add_parser("dump", help="dump every page's drawings once (skipped when cached)")
+    dump.add_argument("pdf_paths", nargs="+")
+    dump.add_argument("--cache-dir", default=CACHE_DIR)
+    dump.add_argument("--rebuild", action="store_true", help="re-run get_drawings() even when cached")
+
+    sweep_parser = sub.add_parser("sweep", help="box counts for a grid of thresholds, straight from the cache")
+    sweep_parser.add_argument("pdf_path")
+    sweep_parser.add_argument("--cache-dir", default=CACHE_DIR)
+    sweep_parser.add_argument("--min-size", default="30,40,50,60,80", help="comma separated MIN_BOX_SIZE values")
+    sweep_parser.add_argument("--area-ratio", default="0.85,0.9,0.95,0.99", help="comma separated MAX_PAGE_AREA_RATIO values")
+    sweep_parser.add_argument("--tolerance", default=str(DUPLICATE_TOLERANCE), help="comma separated DUPLICATE_TOLERANCE values")
+    sweep_parser.add_argument("--verify", action="store_true",
+                              help="check the cached selection against live get_drawings() with the current thresholds")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        for pdf_path in args.pdf_paths:
+            start = time.perf_counter()
+            cache, hit = load_drawings(pdf_path, args.cache_dir, args.rebuild)
+            path = os.path.join(args.cache_dir, f"{cache.fingerprint}.npz")
+            print(f"{'Cached' if hit else 'Dumped'}: {pdf_path} - {len(cache.pages)} pages, {len(cache.drawings)} drawings, "
+                  f"{os.path.getsize(path) / 1024:.0f} KB in {time.perf_counter() - start:.2f}s ({path})")
+    else:
+        start = time.perf_counter()
+        cache, hit = load_drawings(args.pdf_path, args.cache_dir)
+        print(f"{'Loaded' if hit else 'Dumped'} {len(cache.drawings)} drawings on {len(cache.pages)} pages "
+              f"in {time.perf_counter() - start:.2f}s")
+        results = sweep(cache, parse_values(args.min_size), parse_values(args.area_ratio), parse_values(args.tolerance))
+        print(f"{'min size':>8} {'area ratio':>10} {'tol':>5} {'boxes':>7} {'pages':>6} {'time (s)':>9}")
+        for result in results:
+            print(f"{result['min_size']:>8g} {result['max_area_ratio']:>10g} {result['tolerance']:>5g} {result['boxes']:>7} "
+                  f"{result['pages_with_boxes']:>6} {result['seconds']:>9.3f}")
+        print(f"{len(results)} combinations in {sum(result['seconds'] for result in results):.2f}s")
+        if args.verify:
+            mismatched = verify(args.pdf_path, cache)
+            print("Cached selection matches live get_drawings()" if not mismatched
+                  else f"Cached selection differs on pages {mismatched[:20]}")
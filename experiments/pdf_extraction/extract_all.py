@@ -0,0 +1,151 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+from instrumentation import METRICS, add_arguments as add_metrics_arguments
+from image_pack import PackSink
+from low_memory import LOW_MEMORY_CONFIG
+from toc_index import add_arguments as add_scope_arguments, load_toc, select_pages
+from pdf_pipeline import DirectorySink, JsonlSink, Pipeline, image_stage, kind_filter, table_stage, text_stage
+from extract_images import CONFIG, passes_filters, plan_image
+from box_extraction import box_stage
+from improved_extraction import could_have_table
+
+def image_prefilter(doc, img):
+    """Metadata-only rejection (no decode), same as scripts/extract_images.py."""
+    return plan_image(doc, img)[0] != "reject"
+
+def chapter_tagger(toc):
+    """Pipeline filter that keeps every item and tags it with its TOC chapter title (items.jsonl)."""
+    def keep(item):
+        chapter = toc.resolve(item["book"], item["page"])
+        if chapter:
+            item["chapter"] = chapter["title"]
+        return True
+    return keep
+
+def build_stages(kinds, capture="auto"):
+    stages = {
+        "text": text_stage,
+        "image": image_stage(prefilter=image_prefilter),
+        "table": table_stage(classifier=could_have_table),
+        "box": box_stage(capture),
+    }
+    return [stages[kind] for kind in kinds]
+
+def build_pipeline(output_dir, kinds, capture="auto", memory_limit_mb=None, pack_dir=None, toc=None, book=None, pages=None):
+    """
+    One pass, all outputs:
+      images/  embedded images passing the CONFIG filters (extract_images.py naming)
+      boxes/   outermost box snapshots (box_extraction.py naming)
+      tables/  table snapshots (improved_extraction.py naming)
+      items.jsonl  metadata of every item, including page text; with book, merged into the existing
+                   file so only that book's records (only the given 1-based pages, if any) are replaced
+    memory_limit_mb enables the bounded-memory mode of scripts/low_memory.py.
+    pack_dir additionally writes the images as one pack file per book (scripts/image_pack.py).
+    toc (scripts/toc_index.py TocIndex) tags every item with its chapter title.
+    """
+    sinks = [
+        DirectorySink(os.path.join(output_dir, "images"), kinds=["image"],
+                      name=lambda item: f"{item['book']}_p{item['page']:03d}_{item['index']:02d}.{item['ext']}"),
+        DirectorySink(os.path.join(output_dir, "boxes"), kinds=["box"],
+                      name=lambda item: f"p{item['page']}_box_{item['index']}.png"),
+        DirectorySink(os.path.join(output_dir, "tables"), kinds=["table"],
+                      name=lambda item: f"p{item['page']}_table_{item['index']}.png"),
+        JsonlSink(os.path.join(output_dir, "items.jsonl"), book=book, only=pages),
+    ]
+    if pack_dir:
+        sinks.append(PackSink(pack_dir))
+    return Pipeline(
+        stages=build_stages(kinds, capture),
+        filters=[
+            kind_filter("image", lambda item: passes_filters(item["width"], item["height"], len(item["data"]) / 1024)),
+        ] + ([chapter_tagger(toc)] if toc else []),
+        sinks=sinks,
+        memory_limit_mb=memory_limit_mb,
+    )
+
+def extract_all(pdf_path, output_dir="output_all", kinds=("text", "image", "table", "box"), capture="auto",
+                memory_limit_mb=None, pack_dir=None, pages=None, toc=None):
+    """
+    Walks the PDF once and writes every output kind.
+    pages (1-based, scripts/toc_index.py select_pages) limits the walk to those pages.
+    """
+    if not os.path.exists(pdf_path):
+        print(f"Error: File not found at {pdf_path}")
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    scope = "" if pages is None else f", {len(pages)} selected pages"
+    print(f"Single-pass extraction: {pdf_path} ({', '.join(kinds)}{scope})")
+    print(f"Filters: Min Size {CONFIG['MIN_WIDTH']}x{CONFIG['MIN_HEIGHT']}, Min KB {CONFIG['MIN_FILE_SIZE_KB']}")
+    book = os.path.splitext(os.path.basename(pdf_path))[0]
+    stats = build_pipeline(output_dir, kinds, capture, memory_limit_mb, pack_dir, toc, book, pages).run(
+        pdf_path, pages=None if pages is None else [page - 1 for page in pages], book=book)
+
+    print("-" * 30)
+    print(f"Pages: {stats['pages']} in {stats['seconds']:.2f}s (max queue {stats['max_queue']})")
+    for kind in kinds:
+        print(f"  {kind:<6}: produced {stats['produced'].get(kind, 0)}, filtered {stats['filtered'].get(kind, 0)}, "
+              f"written {stats['written'].get(kind, 0)}")
+    if "memory" in stats:
+        print(f"Low-memory: peak private RSS {stats['memory']['peak_mb']} MB (limit {stats['memory']['limit_mb']} MB), "
+              f"{stats['memory']['pressure']} pressure events")
+    print(f"Output Directory: {output_dir}")
+    return stats
+
+def benchmark(pdf_path, output_dir="output_all_bench", kinds=("text", "image", "table", "box")):
+    """Single pass with all stages vs one pass per stage (how the separate scripts walk the PDF)."""
+    start = time.perf_counter()
+    build_pipeline(os.path.join(output_dir, "single"), kinds).run(pdf_path)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for kind in kinds:
+        build_pipeline(os.path.join(output_dir, kind), [kind]).run(pdf_path)
+    separate = time.perf_counter() - start
+
+    print(f"Single pass : {single:.2f}s")
+    print(f"Per-stage   : {separate:.2f}s ({len(kinds)} passes)")
+    return {"single": single, "separate": separate}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-pass extraction: images, boxes, tables and text")
+    parser.add_argument("pdf_path")
+    parser.add_argument("--output-dir", default="output_all")
+    parser.add_argument("--kinds", default="text,image,table,box", help="comma separated: text,image,table,box")
+    parser.add_argument("--capture", choices=["auto", "crop", "clip"], default="auto", help="box capture mode")
+    parser.add_argument("--bench", action="store_true", help="compare against one pass per output kind")
+    parser.add_argument("--low-memory", nargs="?", type=int, const=LOW_MEMORY_CONFIG["RSS_LIMIT_MB"], default=None,
+                        metavar="RSS_MB", help="bounded-memory mode with a private RSS ceiling (scripts/low_memory.py)")
+    parser.add_argument("--pack", metavar="PACK_DIR", default=None,
+                        help="also write images as one pack file per book (scripts/image_pack.py)")
+    add_scope_arguments(parser)
+    add_metrics_arguments(parser, profile=True)
+    args = parser.parse_args()
+    if args.metrics:
+        METRICS.configure(args.metrics, args.profile_page)
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    if args.bench:
+        benchmark(args.pdf_path, kinds=kinds)
+    else:
+        toc = load_toc(args.toc) if args.toc or args.chapter else None
+        pages = None
+        if args.chapter or args.pages:
+            if args.pack:
+                parser.error("--pack writes whole books; it cannot be combined with --chapter/--pages")
+            import fitz  # PyMuPDF
+
+            with fitz.open(args.pdf_path) as doc:
+                page_count = len(doc)
+            try:
+                pages = select_pages(toc, os.path.splitext(os.path.basename(args.pdf_path))[0], args.chapter, args.pages,
+                                     page_count)
+            except ValueError as e:
+                parser.error(str(e))
+        extract_all(args.pdf_path, args.output_dir, kinds, args.capture, args.low_memory, args.pack, pages, toc)
+    METRICS.close()
@@ -1,21 +1,226 @@
 import fitz  # PyMuPDF
 import os
-import sys
 import hashlib
 import io
+import json
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+from low_memory import LOW_MEMORY_CONFIG, MemoryGovernor, SpillSet, open_document
+
+# Save resumable state every N pages
+CHECKPOINT_EVERY = 10
+
+# Bounded-memory mode keeps the dedup hashes here (inside output_dir) instead of in extraction_state.json
+SPILL_FILENAME = "seen_hashes.sqlite"
+
+# Table pre-classifier: find_tables() (lines strategy) needs ruled horizontal and vertical edges,
+# so pages without them are skipped. Horizontally ruled pages with column-aligned text blocks
+# are also kept as candidates.
+TABLE_CLASSIFIER = {
+    "MIN_SEGMENT_LENGTH": 10.0,  # ignore drawn segments shorter than this (pt)
+    "AXIS_TOLERANCE": 1.0,       # max deviation for a segment to count as horizontal/vertical (pt)
+    "MIN_HORIZONTAL": 3,         # ruled table: at least this many distinct horizontal ruling positions ...
+    "MIN_VERTICAL": 3,           # ... and this many vertical ones (a single frame has only 2 of each)
+    "ALIGN_TOLERANCE": 2.0,      # text blocks whose x0 differ by less than this share a column (pt)
+    "MIN_ALIGNED_COLUMNS": 2,    # horizontally ruled page: this many columns ...
+    "MIN_COLUMN_ROWS": 3,        # ... each with at least this many text blocks
+}
 
 def get_image_hash(image_bytes):
     """Calculates MD5 hash of image bytes for deduplication."""
     return hashlib.md5(image_bytes).hexdigest()
 
-def extract_advanced(pdf_path, output_dir="output_improved"):
+def get_file_fingerprint(pdf_path):
+    """SHA-256 of the whole PDF, used to detect unchanged books between runs."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_state(state_path, fingerprint):
+    """
+    Loads the checkpoint for this PDF. A different fingerprint means the PDF changed:
+    outputs from the previous run are removed and extraction starts over.
+    """
+    fresh = {"fingerprint": fingerprint, "complete": False, "next_page": 0, "stats": None,
+             "seen_hashes": [], "seen_xrefs": {}, "outputs": []}
+    if not os.path.exists(state_path):
+        return fresh
+
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("fingerprint") == fingerprint:
+        return state
+
+    for path in state.get("outputs", []):
+        if os.path.exists(path):
+            os.remove(path)
+    return fresh
+
+def save_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def count_positions(values, tol):
+    """Number of distinct positions among values, merging those closer than tol."""
+    positions = 0
+    last = None
+    for value in sorted(values):
+        if last is None or value - last > tol:
+            positions += 1
+        last = value
+    return positions
+
+def count_axis_segments(drawings):
+    """
+    Counts distinct horizontal (y) and vertical (x) ruling positions in get_drawings() output.
+    Lines, thin rectangles and axis-aligned quads are rulings. Larger rectangles only contribute
+    their edges when they look like table cells, i.e. share an edge position with another
+    rectangle; a lone frame around a photo or the page border is not a ruling.
+    """
+    min_len = TABLE_CLASSIFIER["MIN_SEGMENT_LENGTH"]
+    tol = TABLE_CLASSIFIER["AXIS_TOLERANCE"]
+    ys, xs, boxes = [], [], []
+    for path in drawings:
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) <= tol and abs(p1.x - p2.x) >= min_len:
+                    ys.append(p1.y)
+                elif abs(p1.x - p2.x) <= tol and abs(p1.y - p2.y) >= min_len:
+                    xs.append(p1.x)
+            elif item[0] in ("re", "qu"):
+                rect = item[1] if item[0] == "re" else item[1].rect
+                if item[0] == "qu" and not item[1].is_rectangular:
+                    continue
+                if rect.height <= tol and rect.width >= min_len:
+                    ys.append(rect.y0)
+                elif rect.width <= tol and rect.height >= min_len:
+                    xs.append(rect.x0)
+                elif rect.width >= min_len and rect.height >= min_len:
+                    boxes.append(rect)
+
+    # Edge positions bucketed by tol: a rect shares an edge when a neighbouring bucket holds
+    # an edge of another rect (its own opposite edge is at least min_len away)
+    edges = Counter()
+    for rect in boxes:
+        for axis, value in (("x", rect.x0), ("x", rect.x1), ("y", rect.y0), ("y", rect.y1)):
+            edges[axis, round(value / tol)] += 1
+    for rect in boxes:
+        if any(sum(edges[axis, round(value / tol) + d] for d in (-1, 0, 1)) > 1
+               for axis, value in (("x", rect.x0), ("x", rect.x1), ("y", rect.y0), ("y", rect.y1))):
+            ys.extend((rect.y0, rect.y1))
+            xs.extend((rect.x0, rect.x1))
+    return count_positions(ys, tol), count_positions(xs, tol)
+
+def count_aligned_columns(page):
+    """Number of x positions where at least MIN_COLUMN_ROWS text blocks start (column alignment)."""
+    tol = TABLE_CLASSIFIER["ALIGN_TOLERANCE"]
+    starts = sorted(block[0] for block in page.get_text("blocks") if block[6] == 0)
+    columns = 0
+    run = 0
+    for i, x0 in enumerate(starts):
+        run = run + 1 if i and x0 - starts[i - 1] < tol else 1
+        if run == TABLE_CLASSIFIER["MIN_COLUMN_ROWS"]:
+            columns += 1
+    return columns
+
+def could_have_table(page, drawings=None):
+    """
+    Cheap pre-classifier for find_tables(). Returns (is_candidate, signals).
+    drawings: an already computed page.get_drawings() result, if the caller has one.
+    """
+    horizontal, vertical = count_axis_segments(page.get_drawings() if drawings is None else drawings)
+    signals = {"horizontal": horizontal, "vertical": vertical}
+    if horizontal < TABLE_CLASSIFIER["MIN_HORIZONTAL"]:
+        return False, signals
+    if vertical >= TABLE_CLASSIFIER["MIN_VERTICAL"]:
+        return True, signals
+    signals["aligned_columns"] = count_aligned_columns(page)
+    return signals["aligned_columns"] >= TABLE_CLASSIFIER["MIN_ALIGNED_COLUMNS"], signals
+
+def get_page_fingerprint(page):
+    """
+    MD5 of the page content stream, page size and the resources it draws through: Form XObject
+    dictionaries and streams (nested ones included) and font dictionaries. Pages placed with
+    show_pdf_page() all share the content stream "q /fzFrm0 Do Q", so the stream alone collides.
+    """
+    doc = page.parent
+    digest = hashlib.md5(page.read_contents())
+    digest.update(str(tuple(page.rect)).encode())
+    for xref, *_ in page.get_xobjects():
+        digest.update(doc.xref_object(xref, compressed=True).encode())
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(doc.xref_object(font[0], compressed=True).encode())
+    return digest.hexdigest()
+
+def load_table_cache(cache_path):
+    """Page fingerprint -> table bboxes, kept across runs and across PDFs."""
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def detect_tables(page, table_cache, stats, report, exhaustive=False, verify=False):
+    """
+    Returns table bboxes for a page: from the cache, or from find_tables() when the page
+    passes the pre-classifier. exhaustive=True runs find_tables() on every page without
+    consulting the cache (the result is still stored). verify=True also runs find_tables()
+    on skipped pages and records what the skip missed.
+    """
+    page_no = page.number + 1
+    fingerprint = get_page_fingerprint(page)
+    if not exhaustive and fingerprint in table_cache:
+        stats["table_cache_hits"] += 1
+        report["cache_hits"].append(page_no)
+        report["tables_found"] += len(table_cache[fingerprint])
+        return table_cache[fingerprint]
+
+    if not exhaustive:
+        start = time.perf_counter()
+        is_candidate, signals = could_have_table(page)
+        report["classifier_seconds"] += time.perf_counter() - start
+        if not is_candidate:
+            stats["table_pages_skipped"] += 1
+            report["skipped"].append(page_no)
+            if verify:
+                missed = len(page.find_tables().tables)
+                if missed:
+                    report["missed"][str(page_no)] = {"tables": missed, **signals}
+            return []
+
+    start = time.perf_counter()
+    bboxes = [list(table.bbox) for table in page.find_tables().tables]
+    report["find_tables_seconds"] += time.perf_counter() - start
+    stats["table_pages_scanned"] += 1
+    report["scanned"].append(page_no)
+    report["tables_found"] += len(bboxes)
+    table_cache[fingerprint] = bboxes
+    return bboxes
+
+def extract_advanced(pdf_path, output_dir="output_improved", exhaustive_tables=False, verify_tables=False,
+                     memory_limit_mb=None):
     """
     Extracts text, images, and tables from a PDF with post-processing.
     
     Features:
     - Filters small images (icons, decorations).
     - Removes duplicate images.
-    - Extracts tables as images.
+    - Extracts tables as images. find_tables() only runs on pages that pass a cheap
+      line/alignment pre-classifier (all pages with exhaustive_tables=True), and detections
+      are cached per page fingerprint (table_cache.json). Skipped pages are listed in
+      table_scan_report.json; verify_tables=True also checks them with find_tables().
+    - Skips unchanged PDFs and resumes interrupted runs (extraction_state.json).
+    - memory_limit_mb: bounded-memory mode (scripts/low_memory.py). The PDF is memory-mapped,
+      MuPDF's store is emptied periodically and the dedup hashes are spilled to seen_hashes.sqlite.
     """
     if not os.path.exists(pdf_path):
         print(f"Error: File not found at {pdf_path}")
@@ -31,24 +236,57 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
     os.makedirs(img_dir, exist_ok=True)
     os.makedirs(table_dir, exist_ok=True)
 
+    state_path = os.path.join(output_dir, "extraction_state.json")
+    state = load_state(state_path, get_file_fingerprint(pdf_path))
+    if state["complete"]:
+        print(f"Unchanged since last run, skipping: {pdf_path}")
+        return
+
+    table_cache_path = os.path.join(output_dir, "table_cache.json")
+    table_cache = load_table_cache(table_cache_path)
+    report = {"scanned": [], "skipped": [], "cache_hits": [], "missed": {}, "tables_found": 0,
+              "classifier_seconds": 0.0, "find_tables_seconds": 0.0}
+
     try:
-        doc = fitz.open(pdf_path)
+        governor = MemoryGovernor(memory_limit_mb) if memory_limit_mb else None
+        doc = open_document(pdf_path, governor) if governor else fitz.open(pdf_path)
         print(f"Opened PDF: {pdf_path}")
         print(f"Total Pages: {len(doc)}")
+        if state["next_page"]:
+            print(f"Resuming from Page {state['next_page'] + 1}")
         print("-" * 30)
 
         # Statistics
-        stats = {
+        stats = state["stats"] or {
             "total_images_found": 0,
             "saved_images": 0,
             "skipped_small": 0,
             "skipped_duplicate": 0,
             "extracted_tables": 0
         }
+        for key in ("table_pages_scanned", "table_pages_skipped", "table_cache_hits"):
+            stats.setdefault(key, 0)
         
-        seen_hashes = set()
+        spill_path = os.path.join(output_dir, SPILL_FILENAME)
+        if governor is not None:
+            # Committed right after each checkpoint, so a resumed run sees exactly the checkpointed hashes
+            seen_hashes = SpillSet(spill_path)
+            if not state["next_page"]:
+                seen_hashes.clear()
+            seen_hashes.update(state["seen_hashes"])
+        else:
+            seen_hashes = set(state["seen_hashes"])
+            if state.get("seen_hashes_spilled") and os.path.exists(spill_path):
+                # Resuming a bounded-memory run without the flag
+                spilled = SpillSet(spill_path)
+                seen_hashes.update(spilled)
+                spilled.close()
+        # xref -> verdict ("small" / "duplicate" / "saved"), so a shared xref is decoded only once
+        seen_xrefs = {int(xref): verdict for xref, verdict in state["seen_xrefs"].items()}
+        outputs = state["outputs"]
 
-        for page_num, page in enumerate(doc):
+        for page_num in range(state["next_page"], len(doc)):
+            page = doc[page_num]
             print(f"Processing Page {page_num + 1}...")
 
             # --- 1. Image Extraction (with Filtering & Dedup) ---
@@ -57,6 +295,14 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
             
             for img_index, img in enumerate(image_list, start=1):
                 xref = img[0]
+                if xref in seen_xrefs:
+                    # Same xref -> same bytes: it was either filtered out or is already saved/known.
+                    if seen_xrefs[xref] == "small":
+                        stats["skipped_small"] += 1
+                    else:
+                        stats["skipped_duplicate"] += 1
+                    continue
+
                 base_image = doc.extract_image(xref)
                 image_bytes = base_image["image"]
                 image_ext = base_image["ext"]
@@ -74,16 +320,19 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
                 is_extreme_ratio = aspect_ratio > 10 or aspect_ratio < 0.1
 
                 if is_small or is_tiny_dim or is_extreme_ratio:
+                    seen_xrefs[xref] = "small"
                     stats["skipped_small"] += 1
                     continue
 
                 # Filter 2: Deduplication
                 img_hash = get_image_hash(image_bytes)
                 if img_hash in seen_hashes:
+                    seen_xrefs[xref] = "duplicate"
                     stats["skipped_duplicate"] += 1
                     continue
                 
                 seen_hashes.add(img_hash)
+                seen_xrefs[xref] = "saved"
 
                 # Save Image
                 image_filename = f"p{page_num+1}_{img_index}.{image_ext}"
@@ -91,16 +340,15 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
                 
                 with open(image_path, "wb") as f:
                     f.write(image_bytes)
+                outputs.append(image_path)
                 
                 stats["saved_images"] += 1
 
             # --- 2. Table Extraction (Snapshot) ---
-            tables = page.find_tables()
-            if tables.tables:
-                print(f"  [Tables] Found {len(tables.tables)} tables.")
-                for i, table in enumerate(tables.tables, start=1):
-                    # Get bbox of the table
-                    bbox = table.bbox
+            table_bboxes = detect_tables(page, table_cache, stats, report, exhaustive_tables, verify_tables)
+            if table_bboxes:
+                print(f"  [Tables] Found {len(table_bboxes)} tables.")
+                for i, bbox in enumerate(table_bboxes, start=1):
                     # Clip coordinates must be wrapped in fitz.Rect for consistency
                     clip = fitz.Rect(bbox)
                     
@@ -111,8 +359,30 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
                     table_filename = f"p{page_num+1}_table_{i}.png"
                     table_path = os.path.join(table_dir, table_filename)
                     pix.save(table_path)
+                    pix = None
+                    outputs.append(table_path)
                     
                     stats["extracted_tables"] += 1
+
+            # --- 3. Checkpoint ---
+            is_last_page = page_num == len(doc) - 1
+            if (page_num + 1) % CHECKPOINT_EVERY == 0 or is_last_page:
+                state.update({
+                    "complete": is_last_page,
+                    "next_page": page_num + 1,
+                    "stats": stats,
+                    "seen_hashes": [] if governor is not None else sorted(seen_hashes),
+                    "seen_hashes_spilled": governor is not None,
+                    "seen_xrefs": seen_xrefs,
+                })
+                save_state(state_path, state)
+                save_state(table_cache_path, table_cache)
+                if governor is not None:
+                    seen_hashes.commit()
+
+            page = None
+            if governor is not None:
+                governor.page_done()
             
         print("-" * 30)
         print("Extraction Complete!")
@@ -122,14 +392,38 @@ def extract_advanced(pdf_path, output_dir="output_improved"):
         print(f"  Skipped (Small/Line): {stats['skipped_small']}")
         print(f"  Skipped (Duplicate) : {stats['skipped_duplicate']}")
         print(f"  Extracted Tables    : {stats['extracted_tables']}")
+        if governor is not None:
+            memory = governor.summary()
+            seen_hashes.close()
+            print(f"  Low-memory          : peak private RSS {memory['peak_mb']} MB (limit {memory['limit_mb']} MB), "
+                  f"{memory['pressure']} pressure events")
+        print(f"  Table Pages Scanned : {stats['table_pages_scanned']} "
+              f"(skipped {stats['table_pages_skipped']}, cached {stats['table_cache_hits']})")
+        print(f"  Table Scan Time     : classifier {report['classifier_seconds']:.2f}s, "
+              f"find_tables {report['find_tables_seconds']:.2f}s")
+        if verify_tables:
+            missed = sum(entry["tables"] for entry in report["missed"].values())
+            found = report["tables_found"]
+            recall = found / (found + missed) if found + missed else 1.0
+            print(f"  Table Verify        : {missed} tables on skipped pages, recall vs exhaustive {recall:.1%}")
+            for page_no, entry in list(report["missed"].items())[:10]:
+                print(f"    Missed: page {page_no} {entry}")
+        save_state(os.path.join(output_dir, "table_scan_report.json"), report)
         print(f"Output Directory: {output_dir}")
 
     except Exception as e:
         print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python improved_extraction.py <path_to_pdf_file>")
-    else:
-        pdf_file = sys.argv[1]
-        extract_advanced(pdf_file)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Advanced extraction (images + tables)")
+    parser.add_argument("pdf_file")
+    parser.add_argument("--output-dir", default="output_improved")
+    parser.add_argument("--exhaustive-tables", action="store_true", help="run find_tables on every page")
+    parser.add_argument("--verify-tables", action="store_true",
+                        help="also run find_tables on skipped pages and report what the pre-classifier missed")
+    parser.add_argument("--low-memory", nargs="?", type=int, const=LOW_MEMORY_CONFIG["RSS_LIMIT_MB"], default=None,
+                        metavar="RSS_MB", help="bounded-memory mode with a private RSS ceiling (scripts/low_memory.py)")
+    args = parser.parse_args()
+    extract_advanced(args.pdf_file, args.output_dir, args.exhaustive_tables, args.verify_tables, args.low_memory)
@@ -2,10 +2,47 @@ import fitz  # PyMuPDF
 import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+from pdf_pipeline import DirectorySink, Pipeline, image_stage, text_stage
+
+class PageReport:
+    """
+    Prints the per-page progress report. Items arrive in page order, text first,
+    so a page's image summary is printed when the next page starts (or on close).
+    """
+
+    def __init__(self):
+        self.images = None
+
+    def write(self, item):
+        if item["kind"] == "text":
+            self.close()
+            text = item["text"]
+            text_preview = text[:100].replace('\n', ' ') + "..." if len(text) > 100 else text
+            print(f"Processing Page {item['page']}...")
+            print(f"  [Text] Length: {len(text)} chars | Preview: {text_preview}")
+            self.images = []
+        else:
+            self.images.append(item)
+
+    def close(self, ok=True):
+        if self.images is None:
+            return
+        if self.images:
+            print(f"  [Images] Found {len(self.images)} images.")
+            for item in self.images:
+                print(f"    - Saved: page{item['page']}_img{item['index']}.{item['ext']} ({len(item['data'])/1024:.1f} KB)")
+        else:
+            print("  [Images] No images found.")
+        print("-" * 30)
+        self.images = None
+
 def extract_from_pdf(pdf_path, output_dir="output"):
     """
     Extracts text and images from a PDF file.
-    
+    Thin front-end over scripts/pdf_pipeline.py (text + unfiltered images).
+
     Args:
         pdf_path (str): Path to the PDF file.
         output_dir (str): Directory to save extracted images.
@@ -20,46 +57,23 @@ def extract_from_pdf(pdf_path, output_dir="output"):
         print(f"Created output directory: {output_dir}")
 
     try:
-        doc = fitz.open(pdf_path)
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
         print(f"Opened PDF: {pdf_path}")
-        print(f"Total Pages: {len(doc)}")
+        print(f"Total Pages: {page_count}")
         print("-" * 30)
 
-        total_images = 0
-        
-        for page_num, page in enumerate(doc):
-            print(f"Processing Page {page_num + 1}...")
-            
-            # 1. Extract Text
-            text = page.get_text()
-            text_preview = text[:100].replace('\n', ' ') + "..." if len(text) > 100 else text
-            print(f"  [Text] Length: {len(text)} chars | Preview: {text_preview}")
-
-            # 2. Extract Images
-            image_list = page.get_images(full=True)
-            if image_list:
-                print(f"  [Images] Found {len(image_list)} images.")
-                for img_index, img in enumerate(image_list, start=1):
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    image_filename = f"page{page_num+1}_img{img_index}.{image_ext}"
-                    image_path = os.path.join(output_dir, image_filename)
-                    
-                    with open(image_path, "wb") as f:
-                        f.write(image_bytes)
-                    
-                    print(f"    - Saved: {image_filename} ({len(image_bytes)/1024:.1f} KB)")
-                    total_images += 1
-            else:
-                print("  [Images] No images found.")
-            
-            print("-" * 30)
+        pipeline = Pipeline(
+            stages=[text_stage, image_stage()],
+            sinks=[
+                DirectorySink(output_dir, name=lambda item: f"page{item['page']}_img{item['index']}.{item['ext']}", kinds=["image"]),
+                PageReport(),
+            ],
+        )
+        stats = pipeline.run(pdf_path)
 
         print(f"Extraction Complete!")
-        print(f"Total Images Extracted: {total_images}")
+        print(f"Total Images Extracted: {stats['written'].get('image', 0)}")
         print(f"Check the '{output_dir}' directory for extracted files.")
 
     except Exception as e:
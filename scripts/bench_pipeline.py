@@ -0,0 +1,305 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPERIMENTS_DIR = os.path.join(SCRIPTS_DIR, "..", "experiments", "pdf_extraction")
+sys.path.insert(0, EXPERIMENTS_DIR)
+
+from synthetic_pdf import generate_book, generate_toc
+
+# === 파이프라인 벤치마크 (Pipeline Benchmark Suite) ===
+# 합성 PDF 코퍼스(synthetic_pdf.py)를 만들어 단계별로 시간을 재고, 저장된 기준값(baseline)과 비교합니다.
+# 단계마다 새 프로세스(spawn)에서 실행하므로 최대 RSS 는 해당 단계만의 값입니다.
+# 측정값: seconds, pages_per_sec, items_per_sec (이미지/박스/표/목차 항목), peak_rss_mb, bytes_written
+# 기준값은 프로필 -> 머신(machine_key: CPU 모델/코어 수/Python 버전)별로 저장합니다.
+# 모든 실행은 먼저 calibrate 단계(PyMuPDF 로 본문 PDF 를 1배율 렌더링, 저장소 코드를 거치지 않음)를 재고,
+# 단계별 relative_cost = 단계 시간 / calibrate 시간 을 함께 기록합니다. (머신 속도가 달라도 비교 가능한 비율)
+# 회귀 판정 (기준값 대비):
+#   relative_cost 가 TOLERANCE 이상 커지면 실패(exit 1). 다른 머신의 기준값과도 이 비율로 비교합니다.
+#   같은 머신의 기준값이 있으면 처리량(pages/items per sec) 이 TOLERANCE 이상 낮아지거나
+#   최대 RSS 가 RSS_TOLERANCE 이상 커져도 실패
+#   bytes_written 이 달라지면 출력이 바뀐 것이므로 경고만 출력 (의도한 변경이면 --update-baseline)
+# ============================
+
+BENCH_CONFIG = {
+    "TOLERANCE": 0.25,      # 처리량 허용 감소 비율
+    "RSS_TOLERANCE": 0.5,   # 최대 RSS 허용 증가 비율
+    "REPEAT": 3,            # 단계별 반복 횟수 (가장 빠른 회차 사용)
+    "MIN_SECONDS": 1.0,     # 회차마다 단계를 이 시간 이상 되풀이해 평균 (짧은 단계의 측정 잡음 억제)
+}
+
+BASELINE_FILE = os.path.join(SCRIPTS_DIR, "bench_baseline.json")
+
+# 코퍼스 프로필: synthetic_pdf.SYNTHETIC_DEFAULTS 덮어쓰기
+PROFILES = {
+    "quick": {"pages": 20, "images_per_page": 2, "drawings_per_page": 40, "table_ratio": 0.2, "toc_entries": 120},
+    "dense": {"pages": 20, "images_per_page": 4, "image_size": [800, 600], "drawings_per_page": 400,
+              "table_ratio": 0.5, "toc_entries": 400},
+}
+
+# --- Stages ---
+# 각 단계: stage(workload, output_dir) -> {"pages", "items"}
+# workload: {"book": 본문 PDF, "toc": 목차 PDF, "pages", "toc_entries"}
+
+def count_files(root, extensions=(".png", ".jpg", ".jpeg", ".jpx", ".webp")):
+    return sum(1 for _, _, names in os.walk(root) for name in names if name.lower().endswith(extensions))
+
+def stage_calibrate(workload, output_dir):
+    """머신 속도 기준: 본문 PDF 의 모든 페이지를 1배율로 렌더링합니다. (저장소 코드와 무관)"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(workload["book"]) as doc:
+        for page in doc:
+            page.get_pixmap()
+    return {"pages": workload["pages"], "items": 0}
+
+def stage_extract_images(workload, output_dir):
+    from extract_images import extract_images_from_pdf
+
+    stats = extract_images_from_pdf(workload["book"], output_dir)
+    return {"pages": workload["pages"], "items": stats["extracted"]}
+
+def stage_box_extraction(workload, output_dir):
+    from box_extraction import extract_boxes
+
+    extract_boxes(workload["book"], output_dir)
+    return {"pages": workload["pages"], "items": count_files(output_dir)}
+
+def stage_improved_extraction(workload, output_dir):
+    from improved_extraction import extract_advanced
+
+    extract_advanced(workload["book"], output_dir)
+    return {"pages": workload["pages"], "items": count_files(output_dir)}
+
+def stage_local_toc(workload, output_dir):
+    import fitz  # PyMuPDF
+    from local_toc import extract_toc_local
+
+    with fitz.open(workload["toc"]) as doc:
+        items, _, _ = extract_toc_local(doc)
+        pages = len(doc)
+    with open(os.path.join(output_dir, "toc.json"), "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+    return {"pages": pages, "items": len(items)}
+
+def stage_format_toc_ranges(workload, output_dir, books=200):
+    """책 books 권 분량의 목차 항목(섞인 순서)을 범위로 변환합니다."""
+    from parse_pdf_toc import format_toc_ranges
+
+    rng = random.Random(0)
+    entries = [{"title": f"chapter {i}", "page": 5 + i * 7} for i in range(workload["toc_entries"])]
+    items = 0
+    for _ in range(books):
+        shuffled = entries[:]
+        rng.shuffle(shuffled)
+        items += len(format_toc_ranges(shuffled, page_count=entries[-1]["page"] + 20))
+    with open(os.path.join(output_dir, "ranges.json"), "w", encoding="utf-8") as f:
+        json.dump(format_toc_ranges(entries), f, ensure_ascii=False)
+    return {"pages": 0, "items": items}
+
+CALIBRATION_STAGE = "calibrate"
+
+STAGES = {
+    CALIBRATION_STAGE: stage_calibrate,
+    "extract_images": stage_extract_images,
+    "box_extraction": stage_box_extraction,
+    "improved_extraction": stage_improved_extraction,
+    "local_toc": stage_local_toc,
+    "format_toc_ranges": stage_format_toc_ranges,
+}
+
+# --- Runner ---
+
+def dir_bytes(root):
+    return sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(root) for name in names)
+
+def _run_stage_worker(name, workload, output_dir):
+    """
+    새 프로세스에서 단계 하나를 MIN_SECONDS 이상 되풀이합니다. (단계 출력은 버림)
+    n 번째 실행은 output_dir/n 에 쓰며, seconds 는 1회 평균입니다.
+    """
+    loops = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        while loops == 0 or time.perf_counter() - started < BENCH_CONFIG["MIN_SECONDS"]:
+            loop_dir = os.path.join(output_dir, str(loops))
+            os.makedirs(loop_dir)
+            counts = STAGES[name](workload, loop_dir)
+            loops += 1
+        seconds = (time.perf_counter() - started) / loops
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux: KB
+    return {**counts, "seconds": seconds, "loops": loops, "peak_rss_mb": peak_kb / 1024}
+
+def run_stage(name, workload, work_dir, repeat):
+    """단계를 repeat 번 실행하여 가장 빠른 회차를 사용합니다. (RSS 는 회차 중 최댓값)"""
+    runs = []
+    for attempt in range(repeat):
+        output_dir = os.path.join(work_dir, f"{name}_{attempt}")
+        os.makedirs(output_dir)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            run = executor.submit(_run_stage_worker, name, workload, output_dir).result()
+        run["bytes_written"] = dir_bytes(os.path.join(output_dir, "0"))
+        shutil.rmtree(output_dir)
+        runs.append(run)
+
+    best = min(runs, key=lambda run: run["seconds"])
+    seconds = best["seconds"]
+    return {
+        "seconds": round(seconds, 4),
+        "pages": best["pages"],
+        "items": best["items"],
+        "pages_per_sec": round(best["pages"] / seconds, 2) if seconds > 0 else 0,
+        "items_per_sec": round(best["items"] / seconds, 2) if seconds > 0 else 0,
+        "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+        "bytes_written": best["bytes_written"],
+    }
+
+def machine_key():
+    """기준값을 나누는 머신 식별자. 같은 CPU 모델/코어 수/Python 버전이면 같은 머신으로 봅니다."""
+    model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            model = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    return f"{model} x{os.cpu_count()} / Python {platform.python_version()}"
+
+def build_corpus(work_dir, profile):
+    spec = PROFILES[profile]
+    book = os.path.join(work_dir, f"synthetic_{profile}.pdf")
+    toc = os.path.join(work_dir, f"synthetic_{profile}_toc.pdf")
+    spec, info = generate_book(book, spec)
+    generate_toc(toc, spec["toc_entries"], spec["seed"])
+    return {"book": book, "toc": toc, "pages": spec["pages"], "toc_entries": spec["toc_entries"],
+            "images": info["images"], "pdf_bytes": os.path.getsize(book)}
+
+def run_benchmarks(profile="quick", stages=None, repeat=None, work_dir=None):
+    """반환: {"profile", "corpus", "machine", "stages": {name: 측정값}}"""
+    repeat = repeat or BENCH_CONFIG["REPEAT"]
+    stages = [CALIBRATION_STAGE] + [name for name in (stages or STAGES) if name != CALIBRATION_STAGE]
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        workload = build_corpus(work_dir, profile)
+        print(f"Corpus '{profile}': {workload['pages']} pages, {workload['images']} images, "
+              f"{workload['pdf_bytes'] / (1024 * 1024):.1f} MB, {workload['toc_entries']} TOC entries")
+        results = {}
+        for name in stages:
+            results[name] = run_stage(name, workload, work_dir, repeat)
+            r = results[name]
+            r["relative_cost"] = round(r["seconds"] / results[CALIBRATION_STAGE]["seconds"], 3)
+            print(f"  {name:<20} {r['seconds']:8.3f}s  {r['pages_per_sec']:8.1f} pages/s  {r['items_per_sec']:10.1f} items/s  "
+                  f"x{r['relative_cost']:<7.2f} RSS {r['peak_rss_mb']:6.1f} MB  wrote {r['bytes_written'] / 1024:8.0f} KB")
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "profile": profile,
+        "corpus": {key: workload[key] for key in ("pages", "images", "toc_entries", "pdf_bytes")},
+        "machine": {"key": machine_key(), "python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "stages": results,
+    }
+
+# --- Baseline ---
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def update_baseline(report, path=BASELINE_FILE):
+    """프로필/머신 단위로 기준값을 교체합니다. (다른 프로필/머신은 유지)"""
+    baseline = load_baseline(path)
+    machines = baseline.setdefault(report["profile"], {})
+    machines.pop(report["machine"]["key"], None)  # 가장 최근 기준값이 마지막에 오도록
+    machines[report["machine"]["key"]] = report
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    print(f"Baseline '{report['profile']}' for '{report['machine']['key']}' saved to '{path}'")
+
+def compare(report, baseline):
+    """
+    반환: (실패 목록, 경고 목록)
+    이 머신의 기준값이 없으면 가장 최근에 저장된 다른 머신의 기준값과 relative_cost 만 비교합니다.
+    """
+    machines = baseline.get(report["profile"])
+    if not machines or "stages" in machines:  # 없음, 또는 머신별로 나뉘기 전 형식
+        return [], [f"no baseline for profile '{report['profile']}' (run with --update-baseline)"]
+
+    failures, warnings = [], []
+    key = report["machine"]["key"]
+    same_machine = key in machines
+    reference = machines[key] if same_machine else list(machines.values())[-1]
+    if not same_machine:
+        warnings.append(f"no baseline for machine '{key}': comparing relative costs against "
+                        f"'{reference['machine']['key']}' only (run with --update-baseline to record one)")
+
+    for name, current in report["stages"].items():
+        previous = reference["stages"].get(name)
+        if previous is None:
+            warnings.append(f"{name}: no baseline")
+            continue
+        if name == CALIBRATION_STAGE:
+            continue
+        if current["relative_cost"] > previous["relative_cost"] * (1 + BENCH_CONFIG["TOLERANCE"]):
+            failures.append(f"{name}: relative_cost {current['relative_cost']} > baseline {previous['relative_cost']} "
+                            f"(+{(current['relative_cost'] / previous['relative_cost'] - 1) * 100:.0f}%)")
+        if same_machine:
+            for metric in ("pages_per_sec", "items_per_sec"):
+                if previous[metric] and current[metric] < previous[metric] * (1 - BENCH_CONFIG["TOLERANCE"]):
+                    failures.append(f"{name}: {metric} {current[metric]} < baseline {previous[metric]} "
+                                    f"(-{(1 - current[metric] / previous[metric]) * 100:.0f}%)")
+            if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + BENCH_CONFIG["RSS_TOLERANCE"]):
+                failures.append(f"{name}: peak_rss_mb {current['peak_rss_mb']} > baseline {previous['peak_rss_mb']}")
+        if current["bytes_written"] != previous["bytes_written"] or current["items"] != previous["items"]:
+            warnings.append(f"{name}: output changed ({previous['items']} items / {previous['bytes_written']} B -> "
+                            f"{current['items']} items / {current['bytes_written']} B)")
+    return failures, warnings
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="합성 PDF 코퍼스로 추출/목차 단계 벤치마크 및 회귀 검사")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--stages", default=None, help=f"쉼표 구분 단계 (기본값: 전체 {','.join(STAGES)})")
+    parser.add_argument("--repeat", type=int, default=None, help="단계별 반복 횟수 (가장 빠른 회차 사용)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="기준값 JSON")
+    parser.add_argument("--update-baseline", action="store_true", help="이번 결과를 기준값으로 저장")
+    parser.add_argument("--output", default=None, metavar="REPORT_JSON", help="결과를 JSON 으로 저장")
+    parser.add_argument("--work-dir", default=None, help="코퍼스/출력 작업 폴더 (기본값: 임시 폴더, 실행 후 삭제)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    stages = [stage.strip() for stage in args.stages.split(",")] if args.stages else None
+    report = run_benchmarks(args.profile, stages, args.repeat, args.work_dir)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        update_baseline(report, args.baseline)
+    else:
+        failures, warnings = compare(report, load_baseline(args.baseline))
+        for warning in warnings:
+            print(f"WARN  {warning}")
+        for failure in failures:
+            print(f"FAIL  {failure}")
+        if failures:
+            sys.exit(1)
+        print("OK: no regression against baseline")
@@ -1,6 +1,18 @@
 import fitz  # PyMuPDF
 import os
 import sys
+import json
+import argparse
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from extraction_state import ExtractionState, fingerprint_config, fingerprint_page
+from image_index import INDEX_FILENAME, ImageIndex
+from image_store import BlobStore, ImageManifest
+from instrumentation import METRICS, add_arguments as add_metrics_arguments, count, observe, span
+from low_memory import LOW_MEMORY_CONFIG, MemoryGovernor, open_document
+from toc_index import add_arguments as add_scope_arguments, load_toc, select_pages
 
 # === 설정 (Configuration) ===
 # doc/PDF_IMAGE_EXTRACTION_SETTINGS.md 파일을 참고하여 값을 조정하세요.
@@ -10,74 +22,722 @@ CONFIG = {
     "MIN_FILE_SIZE_KB": 10,    # 최소 파일 용량 (KB)
     "ASPECT_RATIO_LIMIT": 4.0, # 가로/세로 비율 제한 (너무 길쭉한 이미지 제외)
 }
+
+# 병렬 모드 설정 (--parallel)
+PARALLEL_CONFIG = {
+    "WORKERS": os.cpu_count() or 4,  # 워커 프로세스 수
+    "PAGES_PER_TASK": 16,            # 워커 하나가 한 번에 처리할 페이지 수 (xref 메모의 공유 범위)
+}
+
+# 원본 스트림을 그대로 돌려주는 인코딩: extract_image 결과 용량 == 스트림 /Length
+PASSTHROUGH_FILTERS = {"DCTDecode"}
+
+SOURCES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "lib", "sources.json")
 # ============================
 
-def extract_images_from_pdf(pdf_path, output_dir="temp_images"):
+def filter_reason(width, height, size_kb=None):
+    """
+    CONFIG 필터(크기 -> 용량 -> 비율)를 적용하여 제외 사유를 반환합니다. 통과하면 None.
+    size_kb 가 None 이면(디코딩 전이라 용량을 모를 때) 용량 필터는 건너뜁니다.
+    """
+    # 1. 크기 필터
+    if width < CONFIG["MIN_WIDTH"] or height < CONFIG["MIN_HEIGHT"]:
+        return "dimension"
+
+    # 2. 용량 필터
+    if size_kb is not None and size_kb < CONFIG["MIN_FILE_SIZE_KB"]:
+        return "file_size"
+
+    # 3. 비율 필터 (너무 길거나 납작한 이미지 제외)
+    ratio = width / height if height > 0 else 0
+    if ratio > CONFIG["ASPECT_RATIO_LIMIT"] or ratio < (1 / CONFIG["ASPECT_RATIO_LIMIT"]):
+        return "aspect_ratio"
+
+    return None
+
+def passes_filters(width, height, size_kb):
+    """CONFIG 필터를 모두 통과하는지 판정합니다."""
+    return filter_reason(width, height, size_kb) is None
+
+def plan_image(doc, img):
+    """
+    get_images(full=True) 튜플과 원본 스트림 길이만으로 이미지를 판정합니다. (디코딩 없음)
+    반환: ("reject" | "accept" | "decode", 사유)
+      - reject: 해상도/비율(또는 정확한 용량)로 확실히 제외
+      - accept: JPEG 처럼 스트림 길이가 곧 결과 용량이어서 디코딩 없이 통과 확정
+      - decode: 용량을 디코딩해야 알 수 있음 (해상도/비율은 통과)
+    """
+    xref, width, height, stream_filter = img[0], img[2], img[3], img[8]
+
+    size_kb = None
+    if stream_filter in PASSTHROUGH_FILTERS:
+        length = doc.xref_get_key(xref, "Length")
+        if length[0] == "int":
+            size_kb = int(length[1]) / 1024
+
+    reason = filter_reason(width, height, size_kb)
+    if reason is not None:
+        return "reject", reason
+    return ("accept", None) if size_kb is not None else ("decode", None)
+
+def plan_document(pdf_path):
+    """
+    문서 전체의 추출 계획(dry-run)을 세웁니다. extract_image 를 호출하지 않습니다.
+    판정은 고유 xref 단위이며, 같은 xref 의 반복 등장(xref_repeats)은 메모로 처리되므로 따로 셉니다.
+      - rejected_by_metadata: 메타데이터만으로 제외 확정 (디코딩 회피)
+      - passthrough: 스트림 길이로 통과 확정, 원본 스트림을 그대로 저장 (디코딩 회피)
+      - needs_decode: 용량 확인을 위해 디코딩 필요
+    """
+    doc = fitz.open(pdf_path)
+    plan = {
+        "pdf": pdf_path,
+        "pages": len(doc),
+        "occurrences": 0,
+        "unique_xrefs": 0,
+        "xref_repeats": 0,
+        "rejected": {"dimension": 0, "file_size": 0, "aspect_ratio": 0},
+        "rejected_by_metadata": 0,
+        "passthrough": 0,
+        "needs_decode": 0,
+        "decodes_avoided": 0,
+    }
+    verdicts = {}
+
+    for page in doc:
+        for img in page.get_images(full=True):
+            plan["occurrences"] += 1
+            xref = img[0]
+            if xref in verdicts:
+                plan["xref_repeats"] += 1
+                continue
+
+            verdict, reason = plan_image(doc, img)
+            verdicts[xref] = verdict
+            plan["unique_xrefs"] += 1
+            if verdict == "reject":
+                plan["rejected"][reason] += 1
+                plan["rejected_by_metadata"] += 1
+            elif verdict == "accept":
+                plan["passthrough"] += 1
+            else:
+                plan["needs_decode"] += 1
+
+    doc.close()
+    plan["decodes_avoided"] = plan["rejected_by_metadata"] + plan["passthrough"]
+    return plan
+
+def write_plan_report(pdf_paths, report_path):
+    """여러 PDF 의 추출 계획을 JSON 리포트로 저장하고 요약을 출력합니다."""
+    plans = [plan_document(pdf_path) for pdf_path in pdf_paths]
+    report = {"config": CONFIG, "plans": plans}
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Filters: Min Size {CONFIG['MIN_WIDTH']}x{CONFIG['MIN_HEIGHT']}, Min KB {CONFIG['MIN_FILE_SIZE_KB']}")
+    for plan in plans:
+        print(f"{plan['pdf']}: {plan['unique_xrefs']} unique images ({plan['xref_repeats']} repeats) - "
+              f"rejected by metadata {plan['rejected_by_metadata']} {plan['rejected']}, "
+              f"passthrough {plan['passthrough']}, needs decode {plan['needs_decode']}")
+    total_unique = sum(plan["unique_xrefs"] for plan in plans)
+    total_avoided = sum(plan["decodes_avoided"] for plan in plans)
+    print(f"Plan saved to '{report_path}'. Decodes avoided: {total_avoided} / {total_unique} unique images "
+          f"(xref repeats not counted)")
+    return report
+
+def extract_page_range(doc, file_name, output_dir, start, end, store=None, xref_cache=None, governor=None):
+    """
+    열린 문서의 [start, end) 페이지에서 이미지를 추출합니다.
+    페이지별 저장 기록과 추출/제외 개수를 반환합니다.
+
+    xref_cache: xref 메모. 같은 메모를 쓰는 동안 같은 xref(공용 로고, 배경 등)는 한 번만 디코딩합니다.
+    직렬 경로는 문서 전체에 메모 하나를 쓰지만, --parallel 은 페이지 범위 작업마다 새 메모를 쓰므로
+    공용 xref 는 작업마다 한 번씩 디코딩됩니다. (PAGES_PER_TASK 가 클수록 반복이 줄어듦)
+    메타데이터(plan_image)만으로 제외가 확정된 이미지는 디코딩하지 않습니다.
+    store: BlobStore 를 넘기면 개별 파일 대신 콘텐츠 주소 저장소에 한 번만 기록합니다.
+    governor: 저메모리 모드의 MemoryGovernor (페이지마다 page_done)
+    """
+    if xref_cache is None:
+        xref_cache = {}
+    stats = {"extracted": 0, "ignored": 0, "decoded": 0, "written": 0, "pages": {}}
+
+    for page_index in range(start, end):
+        with span("extract.page", book=file_name, page=page_index + 1):
+            saved = _extract_page(doc, file_name, output_dir, page_index, store, xref_cache, stats)
+        if saved:
+            stats["pages"][page_index + 1] = saved
+        if governor is not None:
+            governor.page_done()
+
+    return stats
+
+def _extract_page(doc, file_name, output_dir, page_index, store, xref_cache, stats):
+    """extract_page_range 의 페이지 하나. stats 를 갱신하고 페이지의 저장 기록을 반환합니다."""
+    page = doc[page_index]
+    image_list = page.get_images(full=True)
+    saved = []
+    count("images_seen", len(image_list), book=file_name)
+
+    for img_index, img in enumerate(image_list):
+        xref = img[0]
+        cached = xref_cache.get(xref)
+        image_bytes = None
+
+        if cached is None:
+            verdict, reason = plan_image(doc, img)
+            if verdict == "reject":
+                # 메타데이터만으로 제외 확정: extract_image 호출 생략
+                xref_cache[xref] = cached = {"passed": False, "reason": reason, "stage": "plan"}
+            else:
+                cached = xref_cache[xref] = _decode_image(doc, xref, file_name, store, stats)
+                image_bytes = cached.pop("data")
+        elif cached["passed"]:
+            count("images_deduped", book=file_name, kind="xref")
+
+        if not cached["passed"]:
+            stats["ignored"] += 1
+            count("images_filtered", book=file_name, reason=cached["reason"], stage=cached["stage"])
+            continue
+
+        image_filename = f"{file_name}_p{page_index + 1:03d}_{img_index + 1:02d}.{cached['ext']}"
+        record = {
+            "name": image_filename,
+            "index": img_index + 1,
+            "ext": cached["ext"],
+            "width": cached["width"],
+            "height": cached["height"],
+            "size": cached["size"],
+        }
+
+        if store is not None:
+            record["hash"] = cached["hash"]
+        else:
+            image_path = os.path.join(output_dir, image_filename)
+            if image_bytes is not None:
+                with open(image_path, "wb") as f:
+                    f.write(image_bytes)
+                cached["path"] = image_path
+            else:
+                # 이미 디코딩한 xref 는 처음 저장한 파일을 복사 (재디코딩 없음)
+                shutil.copyfile(cached["path"], image_path)
+            stats["written"] += 1
+            count("images_written", book=file_name)
+
+        saved.append(record)
+        stats["extracted"] += 1
+
+    return saved
+
+def _decode_image(doc, xref, file_name, store, stats):
+    """xref 를 디코딩하고 용량 필터를 적용한 xref_cache 항목을 만듭니다. ("data" 에 원본 바이트)"""
+    base_image = doc.extract_image(xref)
+    stats["decoded"] += 1
+    image_bytes = base_image["image"]
+    reason = filter_reason(base_image["width"], base_image["height"], len(image_bytes) / 1024)
+    cached = {
+        "ext": base_image["ext"],
+        "width": base_image["width"],
+        "height": base_image["height"],
+        "size": len(image_bytes),
+        "passed": reason is None,
+        "reason": reason,
+        "stage": "decode",
+        "data": image_bytes,
+    }
+    count("images_decoded", book=file_name, ext=cached["ext"])
+    observe("image_bytes", cached["size"], book=file_name)
+    observe("image_pixels", cached["width"] * cached["height"], book=file_name)
+    if cached["passed"] and store is not None:
+        cached["hash"], written = store.put(image_bytes, cached["ext"])
+        stats["written"] += written
+        if written:
+            count("images_written", book=file_name)
+        else:
+            count("images_deduped", book=file_name, kind="blob")
+    return cached
+
+def _extract_page_range_worker(pdf_path, output_dir, start, end, store_dir=None, metrics=None, memory_limit_mb=None):
+    """
+    워커 프로세스 진입점: 프로세스마다 자체 fitz 핸들을 열어 페이지 범위를 처리합니다.
+    metrics: METRICS.worker_config(). 계측 기록은 결과의 "metrics" 로 돌려줍니다.
+    memory_limit_mb: 저메모리 모드 (워커마다 적용되는 비공유 RSS 상한)
+    """
+    METRICS.configure_worker(metrics)
+    governor = MemoryGovernor(memory_limit_mb) if memory_limit_mb else None
+    doc = open_document(pdf_path, governor) if governor else fitz.open(pdf_path)
+    try:
+        file_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        store = BlobStore(store_dir) if store_dir else None
+        with span("extract.range", book=file_name, start=start + 1, end=end):
+            result = extract_page_range(doc, file_name, output_dir, start, end, store, governor=governor)
+        result["metrics"] = METRICS.drain()
+        if governor is not None:
+            result["memory"] = governor.stats
+        return result
+    finally:
+        doc.close()
+
+def record_manifest(manifest, file_name, pages, only=None):
+    """
+    extract_page_range 의 페이지 기록을 ImageManifest 에 반영합니다.
+    책의 기존 참조를 먼저 지우므로 이제 필터를 통과하지 못하는 이미지는 남지 않습니다.
+    only(페이지 목록)를 주면 그 페이지의 참조만 교체합니다. (ImageIndex.replace_book 과 동일)
+    """
+    manifest.drop_pages(file_name, only)
+    for page_no, records in pages.items():
+        for record in records:
+            manifest.record(file_name, page_no, record["index"], record["hash"], record["ext"],
+                            record["width"], record["height"], record["size"], record.get("chapter"))
+
+def tag_chapters(toc, file_name, pages):
+    """페이지 기록에 목차 챕터 제목("chapter")을 붙입니다. (목차 범위 밖 페이지는 그대로)"""
+    if toc is None:
+        return
+    for page_no, records in pages.items():
+        chapter = toc.resolve(file_name, int(page_no))
+        if chapter:
+            for record in records:
+                record["chapter"] = chapter["title"]
+
+def extract_images_from_pdf(pdf_path, output_dir="temp_images", store_dir=None, memory_limit_mb=None, pages=None, toc=None):
     """
     PDF에서 이미지를 추출하여 저장합니다. (CONFIG 설정 적용)
+    store_dir 를 지정하면 콘텐츠 주소 저장소(blobs/ + manifest.json)에 기록합니다.
+    memory_limit_mb 를 지정하면 저메모리 모드(low_memory.py)로 실행하고, 결과의 "memory" 에 메모리 통계를 남깁니다.
+    pages: 처리할 페이지 목록 (1부터, toc_index.select_pages). None 이면 문서 전체.
+    toc: TocIndex 를 주면 페이지 기록과 manifest 에 챕터 제목을 남깁니다.
     """
-    if not os.path.exists(output_dir):
+    if not store_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    doc = fitz.open(pdf_path)
+    governor = MemoryGovernor(memory_limit_mb) if memory_limit_mb else None
+    doc = open_document(pdf_path, governor) if governor else fitz.open(pdf_path)
     file_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    
-    print(f"Processing: {pdf_path} ({len(doc)} pages)")
+
+    runs = [(0, len(doc))] if pages is None else page_runs(pages)
+    scope = "" if pages is None else f", {len(pages)} selected"
+    print(f"Processing: {pdf_path} ({len(doc)} pages{scope})")
     print(f"Filters: Min Size {CONFIG['MIN_WIDTH']}x{CONFIG['MIN_HEIGHT']}, Min KB {CONFIG['MIN_FILE_SIZE_KB']}")
-    
-    total_images = 0
-    ignored_images = 0
-    
-    for page_index in range(len(doc)):
-        page = doc[page_index]
-        image_list = page.get_images(full=True)
-        
-        if image_list:
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
-                width = base_image["width"]
-                height = base_image["height"]
-                size_kb = len(image_bytes) / 1024
-                
-                # 1. 크기 필터
-                if width < CONFIG["MIN_WIDTH"] or height < CONFIG["MIN_HEIGHT"]:
-                    ignored_images += 1
-                    continue
-                
-                # 2. 용량 필터
-                if size_kb < CONFIG["MIN_FILE_SIZE_KB"]:
-                    ignored_images += 1
-                    continue
-                    
-                # 3. 비율 필터 (너무 길거나 납작한 이미지 제외)
-                ratio = width / height if height > 0 else 0
-                if ratio > CONFIG["ASPECT_RATIO_LIMIT"] or ratio < (1 / CONFIG["ASPECT_RATIO_LIMIT"]):
-                    ignored_images += 1
+
+    store = BlobStore(store_dir) if store_dir else None
+    xref_cache = {}
+    stats = {"extracted": 0, "ignored": 0, "decoded": 0, "written": 0, "pages": {}}
+    with span("extract.document", book=file_name, pages=sum(end - start for start, end in runs)):
+        for start, end in runs:
+            result = extract_page_range(doc, file_name, output_dir, start, end, store, xref_cache, governor)
+            for key in ("extracted", "ignored", "decoded", "written"):
+                stats[key] += result[key]
+            stats["pages"].update(result["pages"])
+    doc.close()
+    tag_chapters(toc, file_name, stats["pages"])
+
+    if store is not None:
+        manifest = ImageManifest(os.path.join(store_dir, "manifest.json"))
+        record_manifest(manifest, file_name, stats["pages"], pages)
+        manifest.save()
+        output_dir = store_dir
+    else:
+        stats["removed"] = remove_stale_files(output_dir, file_name, stats["pages"], pages)
+        if stats["removed"]:
+            print(f"  Removed {stats['removed']} stale files")
+
+    print(f"Done. Extracted {stats['extracted']} images (Ignored {stats['ignored']} small/irrelevant images) to '{output_dir}/'")
+    print(f"  Decoded {stats['decoded']} unique xrefs, wrote {stats['written']} files")
+    if governor is not None:
+        stats["memory"] = governor.summary()
+        print(f"  Low-memory: peak private RSS {stats['memory']['peak_mb']} MB (limit {governor.limit_mb} MB), "
+              f"{stats['memory']['pressure']} pressure events")
+    return stats
+
+def extract_images_incremental(pdf_paths, output_dir="temp_images", state_path="extraction_state.json", checkpoint_every=20,
+                               memory_limit_mb=None):
+    """
+    증분/재개 가능한 추출. 파일 지문이 같은 책은 건너뛰고, 바뀐 책은 페이지 지문을 비교해
+    달라진 페이지만 다시 추출하며, 더 이상 생성되지 않는 출력 파일은 삭제합니다.
+    checkpoint_every 페이지마다 상태를 저장하므로 중단된 실행은 그 지점부터 재개됩니다.
+    memory_limit_mb: 저메모리 모드 (low_memory.py)
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    state = ExtractionState(state_path)
+    config_fingerprint = fingerprint_config(CONFIG)
+    totals = {"books_skipped": 0, "pages_skipped": 0, "pages_extracted": 0, "extracted": 0, "ignored": 0, "removed": 0}
+
+    for pdf_path in pdf_paths:
+        file_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        entry = state.book(file_name)
+        book_fingerprint = f"{state.file_fingerprint(file_name, pdf_path)}:{config_fingerprint}"
+
+        if entry["complete"] and entry["fingerprint"] == book_fingerprint:
+            print(f"Unchanged: {pdf_path} (skipped)")
+            totals["books_skipped"] += 1
+            continue
+
+        # 새 지문으로 진행 중 표시 후 저장 (중단 시 이 책부터 재개)
+        entry["fingerprint"], entry["complete"] = book_fingerprint, False
+        state.save()
+
+        governor = MemoryGovernor(memory_limit_mb) if memory_limit_mb else None
+        doc = open_document(pdf_path, governor) if governor else fitz.open(pdf_path)
+        print(f"Processing: {pdf_path} ({len(doc)} pages, incremental)")
+        xref_cache, stream_digests = {}, {}
+        pages = entry["pages"]
+
+        with span("extract.document", book=file_name, pages=len(doc), incremental=True):
+            for page_index in range(len(doc)):
+                page_key = str(page_index + 1)
+                page_fingerprint = fingerprint_page(doc, doc[page_index], config_fingerprint, stream_digests)
+                previous = pages.get(page_key)
+
+                if previous and previous["fingerprint"] == page_fingerprint and all(
+                        os.path.exists(os.path.join(output_dir, record["name"])) for record in previous["outputs"]):
+                    totals["pages_skipped"] += 1
+                    count("pages_skipped", book=file_name)
+                    if governor is not None:
+                        governor.page_done()
                     continue
-                
-                image_filename = f"{file_name}_p{page_index + 1:03d}_{img_index + 1:02d}.{image_ext}"
-                image_path = os.path.join(output_dir, image_filename)
-                
-                with open(image_path, "wb") as f:
-                    f.write(image_bytes)
-                
-                total_images += 1
 
-    print(f"Done. Extracted {total_images} images (Ignored {ignored_images} small/irrelevant images) to '{output_dir}/'")
+                stats = extract_page_range(doc, file_name, output_dir, page_index, page_index + 1, xref_cache=xref_cache,
+                                           governor=governor)
+                outputs = stats["pages"].get(page_index + 1, [])
+                if previous:
+                    stale = {record["name"] for record in previous["outputs"]} - {record["name"] for record in outputs}
+                    totals["removed"] += remove_outputs(output_dir, stale)
+                pages[page_key] = {"fingerprint": page_fingerprint, "outputs": outputs}
+
+                totals["pages_extracted"] += 1
+                totals["extracted"] += stats["extracted"]
+                totals["ignored"] += stats["ignored"]
+                if totals["pages_extracted"] % checkpoint_every == 0:
+                    state.save()
+
+        # 문서에서 사라진 페이지의 출력 정리
+        for page_key in [key for key in pages if int(key) > len(doc)]:
+            totals["removed"] += remove_outputs(output_dir, [record["name"] for record in pages.pop(page_key)["outputs"]])
+
+        doc.close()
+        if governor is not None:
+            governor.summary()
+        entry["complete"] = True
+        state.save()
+
+    totals["books"] = {
+        name: {page: page_state["outputs"] for page, page_state in state.book(name)["pages"].items() if page_state["outputs"]}
+        for name in (os.path.splitext(os.path.basename(pdf_path))[0] for pdf_path in pdf_paths)
+    }
+    print(f"Done. Re-extracted {totals['pages_extracted']} pages ({totals['extracted']} images, ignored {totals['ignored']}), "
+          f"skipped {totals['pages_skipped']} unchanged pages and {totals['books_skipped']} unchanged books, "
+          f"removed {totals['removed']} stale files")
+    return totals
+
+def remove_stale_files(output_dir, file_name, pages, only=None):
+    """
+    책의 개별 출력 파일({book}_p{page}_{index}.{ext}) 중 이번 추출 결과(pages)에 없는 것을 삭제합니다.
+    only(페이지 목록)를 주면 그 페이지의 파일만 봅니다. 삭제 개수를 반환합니다.
+    """
+    if not os.path.isdir(output_dir):
+        return 0
+    pattern = re.compile(rf"^{re.escape(file_name)}_p(\d+)_\d+\.\w+$")
+    only = None if only is None else set(only)
+    current = {record["name"] for records in pages.values() for record in records}
+    stale = []
+    for name in os.listdir(output_dir):
+        match = pattern.match(name)
+        if match and name not in current and (only is None or int(match.group(1)) in only):
+            stale.append(name)
+    return remove_outputs(output_dir, stale)
+
+def remove_outputs(output_dir, names):
+    """더 이상 생성되지 않는 출력 파일을 삭제하고 삭제 개수를 반환합니다."""
+    removed = 0
+    for name in names:
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return removed
+
+def write_image_index(index_path, books, scopes=None):
+    """
+    추출 결과로 (book, page) -> 이미지 인덱스를 갱신합니다. 이번에 처리한 책만 교체합니다.
+    books: {file_name: {page: [record, ...]}}
+    scopes: {file_name: 페이지 목록} 이 있는 책은 그 페이지만 교체합니다. (챕터 단위 재추출)
+    """
+    index = ImageIndex.load_or_empty(index_path)
+    for file_name, pages in books.items():
+        index.replace_book(file_name, {
+            page: [dict(record, name=index_name(record)) for record in records] for page, records in pages.items()
+        }, (scopes or {}).get(file_name))
+    index.save(index_path)
+    print(f"Image index updated: '{index_path}' ({len(books)} books)")
+
+def resolve_near_duplicates(books, index, blobs):
+    """
+    이미지 기록을 근접 중복 대표 blob 으로 바꿉니다. 대표는 확장자/해상도가 다를 수 있으므로
+    ext, width, height, size 도 대표 blob 의 메타데이터(manifest.blobs)를 씁니다.
+    """
+    def canonical(record):
+        digest = index.resolve(record["hash"])
+        blob = blobs[digest]
+        return dict(record, hash=digest, ext=blob["ext"], width=blob["width"], height=blob["height"], size=blob["size"])
+
+    return {file_name: {page: [canonical(record) for record in records] for page, records in pages.items()}
+            for file_name, pages in books.items()}
+
+def index_name(record):
+    """인덱스에 기록할 이름: 개별 파일은 파일명, 저장소 모드는 blobs/ 상대 경로"""
+    if "hash" in record:
+        return f"blobs/{record['hash'][:2]}/{record['hash']}.{record['ext']}"
+    return record["name"]
+
+def split_page_ranges(page_count, pages_per_task, start=0):
+    """[start, page_count) 를 pages_per_task 크기의 [start, end) 범위 목록으로 나눕니다."""
+    return [(first, min(first + pages_per_task, page_count)) for first in range(start, page_count, pages_per_task)]
+
+def page_runs(pages):
+    """페이지 목록(1부터) -> 연속 구간 [start, end) 목록(0부터). 예: [3, 4, 5, 9] -> [(2, 5), (8, 9)]"""
+    runs = []
+    for page in sorted(pages):
+        if runs and runs[-1][1] == page - 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page - 1, page])
+    return [tuple(run) for run in runs]
+
+def extract_images_parallel(pdf_paths, output_dir="temp_images", workers=None, pages_per_task=None, store_dir=None,
+                            memory_limit_mb=None, scopes=None, toc=None):
+    """
+    여러 PDF를 페이지 범위 단위로 나누어 프로세스 풀에서 동시에 추출합니다.
+    파일명과 필터 결과는 직렬 경로(extract_images_from_pdf)와 동일합니다.
+    memory_limit_mb: 저메모리 모드. 상한은 워커 프로세스마다 적용됩니다.
+    scopes: {pdf_path: 페이지 목록(1부터)} 으로 책별 처리 범위를 제한합니다. (없는 책은 전체)
+    toc: TocIndex 를 주면 페이지 기록과 manifest 에 챕터 제목을 남깁니다.
+    """
+    workers = workers or PARALLEL_CONFIG["WORKERS"]
+    pages_per_task = pages_per_task or PARALLEL_CONFIG["PAGES_PER_TASK"]
+
+    if not store_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # 책별 페이지 수를 먼저 확인하여 작업 목록 생성
+    tasks = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+        pages = (scopes or {}).get(pdf_path)
+        runs = [(0, page_count)] if pages is None else page_runs(pages)
+        print(f"Queued: {pdf_path} ({page_count} pages{'' if pages is None else f', {len(pages)} selected'})")
+        for run_start, run_end in runs:
+            for start, end in split_page_ranges(run_end, pages_per_task, run_start):
+                tasks.append((pdf_path, start, end))
+
+    print(f"Filters: Min Size {CONFIG['MIN_WIDTH']}x{CONFIG['MIN_HEIGHT']}, Min KB {CONFIG['MIN_FILE_SIZE_KB']}")
+    print(f"Running {len(tasks)} page-range tasks on {workers} workers...")
+
+    books = {pdf_path: {"extracted": 0, "ignored": 0, "decoded": 0, "written": 0, "pages": {}} for pdf_path in pdf_paths}
+    remaining = {pdf_path: 0 for pdf_path in pdf_paths}
+    peak_memory = 0.0
+    for pdf_path, _, _ in tasks:
+        remaining[pdf_path] += 1
+
+    with span("extract.batch", books=len(pdf_paths), tasks=len(tasks), workers=workers), \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_extract_page_range_worker, pdf_path, output_dir, start, end, store_dir,
+                            METRICS.worker_config(), memory_limit_mb): pdf_path
+            for pdf_path, start, end in tasks
+        }
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            result = future.result()
+            METRICS.merge(result.pop("metrics"))
+            memory = result.pop("memory", None)
+            if memory is not None:
+                peak_memory = max(peak_memory, memory["peak_mb"])
+            book = books[pdf_path]
+            for key in ("extracted", "ignored", "decoded", "written"):
+                book[key] += result[key]
+            book["pages"].update(result["pages"])
+
+            remaining[pdf_path] -= 1
+            if remaining[pdf_path] == 0:
+                print(f"Done: {pdf_path} - Extracted {book['extracted']} (Ignored {book['ignored']})")
+
+    for pdf_path, book in books.items():
+        tag_chapters(toc, os.path.splitext(os.path.basename(pdf_path))[0], book["pages"])
+    summary = {key: sum(book[key] for book in books.values()) for key in ("extracted", "ignored", "decoded", "written")}
+    summary["books"] = books
+
+    if store_dir:
+        manifest = ImageManifest(os.path.join(store_dir, "manifest.json"))
+        for pdf_path, book in books.items():
+            record_manifest(manifest, os.path.splitext(os.path.basename(pdf_path))[0], book["pages"],
+                            (scopes or {}).get(pdf_path))
+        manifest.save()
+        output_dir = store_dir
+    else:
+        summary["removed"] = sum(
+            remove_stale_files(output_dir, os.path.splitext(os.path.basename(pdf_path))[0], book["pages"],
+                               (scopes or {}).get(pdf_path))
+            for pdf_path, book in books.items())
+        if summary["removed"]:
+            print(f"  Removed {summary['removed']} stale files")
+
+    print(f"Done. Extracted {summary['extracted']} images (Ignored {summary['ignored']} small/irrelevant images) "
+          f"from {len(pdf_paths)} PDFs to '{output_dir}/'")
+    print(f"  Decoded {summary['decoded']} unique xrefs, wrote {summary['written']} files")
+    if memory_limit_mb:
+        print(f"  Low-memory: peak private RSS per worker {peak_memory:.1f} MB (limit {memory_limit_mb} MB)")
+    return summary
+
+def resolve_source_pdfs(pdf_dir, sources_file=SOURCES_FILE):
+    """
+    src/lib/sources.json 의 책 목록(예: "15.pdf")을 로컬 PDF 경로로 변환합니다.
+    '{book}-Main.pdf' 를 우선 찾고, 없으면 '{book}.pdf' 를 사용합니다.
+    """
+    with open(sources_file, "r", encoding="utf-8") as f:
+        sources = json.load(f)
+
+    pdf_paths = []
+    for source in sources:
+        book = os.path.splitext(source["id"])[0]
+        for candidate in (f"{book}-Main.pdf", f"{book}.pdf"):
+            path = os.path.join(pdf_dir, candidate)
+            if os.path.exists(path):
+                pdf_paths.append(path)
+                break
+        else:
+            print(f"Skipping {source['id']}: no PDF found in '{pdf_dir}'")
+    return pdf_paths
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="PDF 이미지 추출 (CONFIG 필터 적용)")
+    parser.add_argument("pdfs", nargs="*", help="추출할 PDF 파일 경로 (기본값: 15-Main.pdf)")
+    parser.add_argument("--output-dir", default="temp_images", help="저장 폴더")
+    parser.add_argument("--parallel", action="store_true", help="페이지 범위 단위 프로세스 풀 병렬 추출")
+    parser.add_argument("--workers", type=int, default=None, help="워커 프로세스 수")
+    parser.add_argument("--pages-per-task", type=int, default=None, help="작업 하나당 페이지 수")
+    parser.add_argument("--sources", metavar="PDF_DIR", default=None,
+                        help="src/lib/sources.json 의 모든 책을 PDF_DIR 에서 찾아 추출")
+    parser.add_argument("--plan", metavar="REPORT_JSON", default=None,
+                        help="추출하지 않고 메타데이터 기반 필터 계획(dry-run)만 REPORT_JSON 에 저장")
+    parser.add_argument("--incremental", metavar="STATE_JSON", default=None,
+                        help="STATE_JSON 의 책/페이지 지문과 비교하여 바뀐 페이지만 다시 추출 (중단 시 재개)")
+    parser.add_argument("--index", nargs="?", const="", default=None, metavar="INDEX_JSON",
+                        help="(book, page) -> 이미지 인덱스 갱신 (기본값: 출력 폴더의 image_index.json)")
+    parser.add_argument("--store", metavar="STORE_DIR", default=None,
+                        help="개별 파일 대신 콘텐츠 주소 저장소(STORE_DIR/blobs + manifest.json)에 기록")
+    parser.add_argument("--near-dup", nargs="?", type=int, const=-1, default=None, metavar="THRESHOLD",
+                        help="--store 와 함께: 지각 해시로 근접 중복 이미지를 대표 blob 으로 묶음 (phash_index.py)")
+    parser.add_argument("--derivatives", action="store_true",
+                        help="추출한 이미지의 WebP 파생본/썸네일 생성, --index 에 variants 로 기록 (image_derivatives.py)")
+    parser.add_argument("--low-memory", nargs="?", type=int, const=LOW_MEMORY_CONFIG["RSS_LIMIT_MB"], default=None,
+                        metavar="RSS_MB",
+                        help="저메모리 모드: PDF 를 mmap 으로 열고 MuPDF 저장소를 주기적으로 비우며 비공유 RSS 를 RSS_MB "
+                             f"(기본 {LOW_MEMORY_CONFIG['RSS_LIMIT_MB']}) 이하로 유지 (low_memory.py)")
+    parser.add_argument("--pack", metavar="PACK_DIR", default=None,
+                        help="추출한 이미지를 책별 팩 파일 하나로 묶고 PACK_DIR/pack_index.json 에 오프셋 기록 (image_pack.py)")
+    add_scope_arguments(parser)
+    add_metrics_arguments(parser, profile=True)
+    args = parser.parse_args(argv)
+    if args.incremental and (args.store or args.parallel):
+        parser.error("--incremental cannot be combined with --store or --parallel (serial loose-file mode only)")
+    if args.near_dup is not None and not args.store:
+        parser.error("--near-dup requires --store (near-duplicates are collapsed inside the content-addressed store)")
+    if (args.chapter or args.pages) and (args.incremental or args.plan or args.pack):
+        parser.error("--chapter/--pages cannot be combined with --incremental, --plan or --pack (whole-book modes)")
+    return args
+
+def resolve_scopes(pdf_paths, toc, chapters, pages):
+    """
+    --chapter/--pages 를 책별 페이지 목록으로 바꿉니다. 반환: {pdf_path: 페이지 목록} (범위 지정이 없으면 빈 dict)
+    """
+    if not chapters and not pages:
+        return {}
+    scopes = {}
+    for pdf_path in pdf_paths:
+        file_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+        scopes[pdf_path] = select_pages(toc, file_name, chapters, pages, page_count)
+        print(f"Scope: {file_name} - {len(scopes[pdf_path])} pages")
+    return scopes
 
 if __name__ == "__main__":
-    # 테스트할 파일 경로
-    target_pdf = "15-Main.pdf"
-    
-    # 명령줄 인수로 파일 경로를 받을 수도 있음
-    if len(sys.argv) > 1:
-        target_pdf = sys.argv[1]
-        
-    if os.path.exists(target_pdf):
-        extract_images_from_pdf(target_pdf)
+    args = parse_args(sys.argv[1:])
+
+    if args.sources:
+        targets = resolve_source_pdfs(args.sources)
     else:
-        print(f"File not found: {target_pdf}")
+        # 테스트할 파일 경로 (명령줄 인수로 파일 경로를 받을 수도 있음)
+        targets = args.pdfs or ["15-Main.pdf"]
+
+    missing = [path for path in targets if not os.path.exists(path)]
+    for path in missing:
+        print(f"File not found: {path}")
+    targets = [path for path in targets if path not in missing]
+
+    if args.metrics:
+        METRICS.configure(args.metrics, args.profile_page)
+
+    toc = load_toc(args.toc) if args.toc or args.chapter else None
+    try:
+        scopes = resolve_scopes(targets, toc, args.chapter, args.pages)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not targets:
         print("Please provide a valid PDF file path.")
+    elif args.plan:
+        write_plan_report(targets, args.plan)
+    else:
+        if args.incremental:
+            books = extract_images_incremental(targets, args.output_dir, args.incremental,
+                                               memory_limit_mb=args.low_memory)["books"]
+        elif args.parallel:
+            summary = extract_images_parallel(targets, args.output_dir, args.workers, args.pages_per_task, args.store,
+                                              args.low_memory, scopes, toc)
+            books = {os.path.splitext(os.path.basename(path))[0]: book["pages"] for path, book in summary["books"].items()}
+        else:
+            books = {
+                os.path.splitext(os.path.basename(target))[0]:
+                    extract_images_from_pdf(target, args.output_dir, args.store, args.low_memory, scopes.get(target), toc)["pages"]
+                for target in targets
+            }
+
+        if args.near_dup is not None:
+            from phash_index import dedupe_store
+
+            with span("extract.near_dup"):
+                index, _ = dedupe_store(args.store, None if args.near_dup < 0 else args.near_dup)
+            books = resolve_near_duplicates(books, index, ImageManifest(os.path.join(args.store, "manifest.json")).blobs)
+
+        if args.derivatives:
+            from image_derivatives import generate_derivatives
+
+            root = args.store or args.output_dir
+            sources = [index_name(record) for pages in books.values() for records in pages.values() for record in records]
+            with span("extract.derivatives", images=len(sources)):
+                derivatives, report = generate_derivatives(root, sources)
+            count("derivatives_written", report["variants"])
+            books = {
+                file_name: {page: [dict(record, variants=derivatives.variants(index_name(record))) for record in records]
+                            for page, records in pages.items()}
+                for file_name, pages in books.items()
+            }
+
+        if args.pack:
+            from image_pack import pack_books
+
+            with span("extract.pack"):
+                summary = pack_books(args.store or args.output_dir, args.pack, books, index_name)
+            print(f"Packed {summary['images']} images into {summary['books']} packs in '{args.pack}'")
+
+        if args.index is not None:
+            index_path = args.index or os.path.join(args.store or args.output_dir, INDEX_FILENAME)
+            with span("extract.index"):
+                write_image_index(index_path, books,
+                                  {os.path.splitext(os.path.basename(path))[0]: pages for path, pages in scopes.items()})
+
+    METRICS.close()
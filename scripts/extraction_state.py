@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+# === 증분 추출 상태 (Incremental Extraction State) ===
+# 책(PDF)별 파일 지문과 페이지별 이미지 지문, 저장된 출력 파일 목록을 기록합니다.
+# 재실행 시 지문이 같은 책/페이지는 건너뛰고, 바뀐 페이지만 다시 추출합니다.
+# ============================
+
+CHUNK_SIZE = 1024 * 1024
+
+def fingerprint_file(path):
+    """PDF 파일 전체의 SHA-256 지문"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_config(config):
+    """필터 설정 지문. 설정이 바뀌면 모든 페이지 지문도 바뀝니다."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def fingerprint_page(doc, page, config_fingerprint, stream_digests):
+    """
+    페이지의 이미지 xref 목록과 각 원본 스트림(디코딩 없이 raw) 내용으로 지문을 만듭니다.
+    stream_digests: 문서 단위 xref -> 스트림 해시 메모
+    """
+    digest = hashlib.sha256(config_fingerprint.encode("utf-8"))
+    for img in page.get_images(full=True):
+        xref = img[0]
+        if xref not in stream_digests:
+            stream_digests[xref] = hashlib.md5(doc.xref_stream_raw(xref) or b"").hexdigest()
+        digest.update(f"{xref}:{stream_digests[xref]};".encode("utf-8"))
+    return digest.hexdigest()
+
+class ExtractionState:
+    """
+    증분 추출 매니페스트. 체크포인트마다 원자적으로 저장되므로,
+    중간에 중단된 실행도 마지막 체크포인트부터 재개할 수 있습니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.books = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.books = json.load(f).get("books", {})
+
+    def book(self, name):
+        return self.books.setdefault(name, {"fingerprint": None, "complete": False, "pages": {}})
+
+    def file_fingerprint(self, name, pdf_path):
+        """
+        크기/수정 시각이 기록과 같으면 저장된 해시를 재사용하고, 다르면 다시 계산합니다.
+        """
+        entry = self.book(name)
+        stat = os.stat(pdf_path)
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime and entry.get("file_hash"):
+            return entry["file_hash"]
+        entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+        entry["file_hash"] = fingerprint_file(pdf_path)
+        return entry["file_hash"]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"books": self.books}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
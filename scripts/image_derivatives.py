@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# === 서빙용 파생 이미지 (WebP/AVIF + 고정 폭 썸네일) ===
+# 추출된 원본(PNG/JPEG)은 채팅 임베드에서도 원본 크기 그대로 내려가므로,
+# 프로세스 풀에서 원본마다 다음 파생본을 만들어 derived/ 아래에 저장합니다.
+#   derived/{원본 경로(확장자 제외)}.{fmt}          원본 해상도
+#   derived/{원본 경로(확장자 제외)}_w{폭}.{fmt}    고정 폭 썸네일 (원본보다 좁은 폭만)
+# 결과는 derivatives.json 에 원본별로 기록하며 (가로, 세로, 용량),
+# extract_images.py --index 가 이를 이미지 인덱스의 variants 로 옮겨 /api/proxy-image 가 골라 서빙합니다.
+# 인코딩에는 Pillow 가 필요합니다. (선택 의존성: pip install Pillow, AVIF 는 Pillow 11.2+ 빌드에 따라 지원)
+# ============================
+
+DERIVATIVE_CONFIG = {
+    "FORMATS": ["webp"],                  # 생성할 형식 ("webp", "avif")
+    "QUALITY": {"webp": 80, "avif": 55},  # 형식별 손실 압축 품질
+    "THUMB_WIDTHS": [320, 640],           # 썸네일 폭 (원본 폭 이상은 건너뜀)
+    "WORKERS": os.cpu_count() or 4,       # 인코딩 프로세스 수
+}
+
+MANIFEST_FILENAME = "derivatives.json"
+MANIFEST_VERSION = 1
+DERIVED_DIR = "derived"
+
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff")
+
+def require_pillow():
+    """Pillow 가 없으면 설치 안내와 함께 ImportError 를 냅니다."""
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise ImportError("image_derivatives.py 는 Pillow 가 필요합니다: pip install Pillow") from e
+    return Image
+
+def supported_formats(formats):
+    """설치된 Pillow 가 인코딩할 수 있는 형식만 남깁니다."""
+    from PIL import features
+
+    return [fmt for fmt in formats if features.check(fmt)]
+
+def variant_name(source, fmt, width=None):
+    """원본 상대 경로 -> 파생본 상대 경로 (항상 '/' 구분)"""
+    stem = os.path.splitext(source.replace(os.sep, "/"))[0]
+    suffix = f"_w{width}" if width else ""
+    return f"{DERIVED_DIR}/{stem}{suffix}.{fmt}"
+
+def _encode(image, fmt, quality):
+    from io import BytesIO
+
+    buffer = BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+def _derive_worker(root, source, formats, widths, quality):
+    """
+    원본 하나의 파생본을 모두 만들고 기록을 반환합니다. (워커 프로세스에서 실행)
+    반환: {"source", "width", "height", "size", "variants": [{"name", "format", "width", "height", "size"}], "seconds"}
+    """
+    Image = require_pillow()
+    started = time.perf_counter()
+    path = os.path.join(root, source)
+    with Image.open(path) as opened:
+        opened.load()
+        image = opened.convert("RGBA" if "A" in opened.getbands() or "transparency" in opened.info else "RGB")
+
+    width, height = image.size
+    variants = []
+    sizes = [(None, image)]
+    for target in sorted(widths):
+        if target < width:
+            resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+            sizes.append((target, resized))
+
+    for fmt in formats:
+        for target, resized in sizes:
+            data = _encode(resized, fmt, quality[fmt])
+            name = variant_name(source, fmt, target)
+            out_path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(data)
+            variants.append({"name": name, "format": fmt, "width": resized.size[0], "height": resized.size[1],
+                             "size": len(data)})
+
+    return {"source": source, "width": width, "height": height, "size": os.path.getsize(path),
+            "variants": variants, "seconds": time.perf_counter() - started}
+
+class DerivativeManifest:
+    """
+    원본 상대 경로 -> 파생본 기록. 원본 용량이 같고 파생본 파일이 모두 남아 있으면 다시 만들지 않습니다.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_FILENAME)
+        self.images = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.images = json.load(f).get("images", {})
+
+    def is_current(self, source, formats, widths):
+        record = self.images.get(source)
+        path = os.path.join(self.root, source)
+        if record is None or not os.path.exists(path) or os.path.getsize(path) != record["size"]:
+            return False
+        expected = {variant_name(source, fmt, width) for fmt in formats
+                    for width in [None] + [w for w in widths if w < record["width"]]}
+        names = {variant["name"] for variant in record["variants"]}
+        return expected <= names and all(os.path.exists(os.path.join(self.root, name)) for name in expected)
+
+    def variants(self, source):
+        """인덱스에 옮길 [{"name", "width", "height", "size"}, ...] (없으면 빈 리스트)"""
+        record = self.images.get(source)
+        if record is None:
+            return []
+        return [{key: variant[key] for key in ("name", "width", "height", "size")} for variant in record["variants"]]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "images": self.images}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+def find_sources(root):
+    """root 아래의 원본 이미지 상대 경로 (derived/ 제외)"""
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not (dirpath == root and d == DERIVED_DIR))
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SOURCE_EXTENSIONS):
+                sources.append(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/"))
+    return sources
+
+def summarize(records, seconds):
+    """
+    생성 결과 요약: 형식별 원본 해상도 압축률과 썸네일 용량, 인코딩 처리량.
+    ratio 는 (원본 용량 합 / 같은 해상도 파생본 용량 합) 입니다.
+    """
+    source_bytes = sum(record["size"] for record in records)
+    formats = {}
+    for record in records:
+        for variant in record["variants"]:
+            stats = formats.setdefault(variant["format"], {"full_bytes": 0, "thumb_bytes": 0, "thumbs": 0})
+            if variant["width"] == record["width"]:
+                stats["full_bytes"] += variant["size"]
+            else:
+                stats["thumb_bytes"] += variant["size"]
+                stats["thumbs"] += 1
+    for stats in formats.values():
+        stats["ratio"] = source_bytes / stats["full_bytes"] if stats["full_bytes"] else 0
+    return {
+        "images": len(records),
+        "variants": sum(len(record["variants"]) for record in records),
+        "source_bytes": source_bytes,
+        "formats": formats,
+        "seconds": seconds,
+        "images_per_sec": len(records) / seconds if seconds > 0 else 0,
+        "mb_per_sec": source_bytes / (1024 * 1024) / seconds if seconds > 0 else 0,
+    }
+
+def print_report(report):
+    print(f"Derivatives: {report['images']} images -> {report['variants']} variants "
+          f"in {report['seconds']:.1f}s ({report['images_per_sec']:.1f} images/s, {report['mb_per_sec']:.2f} MB/s source)")
+    print(f"  Source     : {report['source_bytes'] / 1024:.0f} KB")
+    for fmt, stats in report["formats"].items():
+        average = stats["thumb_bytes"] / stats["thumbs"] / 1024 if stats["thumbs"] else 0
+        print(f"  {fmt:<11}: {stats['full_bytes'] / 1024:.0f} KB full size ({stats['ratio']:.1f}x smaller), "
+              f"{stats['thumbs']} thumbnails avg {average:.1f} KB")
+
+def generate_derivatives(root, sources=None, formats=None, widths=None, workers=None, force=False):
+    """
+    root 아래 원본(sources: root 기준 상대 경로, 기본값은 전체)의 파생본을 프로세스 풀에서 만듭니다.
+    반환: (DerivativeManifest, 요약). 이미 최신인 원본은 건너뛰며 요약에 포함하지 않습니다.
+    """
+    require_pillow()
+    requested = formats or DERIVATIVE_CONFIG["FORMATS"]
+    formats = supported_formats(requested)
+    for fmt in requested:
+        if fmt not in formats:
+            print(f"Skipping format '{fmt}': not supported by the installed Pillow")
+    widths = widths or DERIVATIVE_CONFIG["THUMB_WIDTHS"]
+    workers = workers or DERIVATIVE_CONFIG["WORKERS"]
+
+    manifest = DerivativeManifest(root)
+    sources = find_sources(root) if sources is None else sources
+    pending = [source for source in dict.fromkeys(sources) if force or not manifest.is_current(source, formats, widths)]
+    print(f"Derivatives: {len(pending)} of {len(sources)} images need encoding ({', '.join(formats)}, widths {widths})")
+
+    records = []
+    started = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_derive_worker, root, source, formats, widths, DERIVATIVE_CONFIG["QUALITY"]): source
+                for source in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    print(f"  Failed: {futures[future]} ({e})")
+                    continue
+                manifest.images[record.pop("source")] = record
+                records.append(record)
+        manifest.save()
+
+    report = summarize(records, time.perf_counter() - started)
+    print_report(report)
+    return manifest, report
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="추출 이미지의 WebP/AVIF 파생본과 썸네일 생성")
+    parser.add_argument("root", nargs="?", default="temp_images", help="원본 이미지 폴더 (또는 --store 저장소)")
+    parser.add_argument("--formats", default=None, help="쉼표 구분 형식 (기본값: DERIVATIVE_CONFIG FORMATS)")
+    parser.add_argument("--widths", default=None, help="쉼표 구분 썸네일 폭 (기본값: DERIVATIVE_CONFIG THUMB_WIDTHS)")
+    parser.add_argument("--workers", type=int, default=None, help="인코딩 프로세스 수")
+    parser.add_argument("--force", action="store_true", help="최신 파생본도 다시 생성")
+    parser.add_argument("--report", metavar="REPORT_JSON", default=None, help="요약을 JSON 으로 저장")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    formats = args.formats.split(",") if args.formats else None
+    widths = [int(width) for width in args.widths.split(",")] if args.widths else None
+    _, report = generate_derivatives(args.root, None, formats, widths, args.workers, args.force)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# === 이미지 인덱스 (Book, Page) -> Images ===
+# 서빙 시 버킷 목록 조회(prefix listing) 없이 책/페이지의 이미지를 찾기 위한 인덱스입니다.
+# 형식: {"version": 1, "prefix": "extracted_images/",
+#        "books": {"15": {"114": [[name, width, height, size], ...]}}}
+# 파생본(image_derivatives.py)이 있으면 항목 끝에 [[name, width, height, size], ...] 가 하나 더 붙습니다.
+# name 은 prefix 기준 상대 경로이며, 책 ID 는 "02" -> "2" 처럼 정규화합니다. (src/lib/gcs-info.ts 와 동일)
+# 목차로 챕터를 조회한 추출이면 "chapters": {"15": {"114": "챕터 제목"}} 가 함께 저장됩니다.
+# ============================
+
+INDEX_FILENAME = "image_index.json"
+INDEX_VERSION = 1
+DEFAULT_PREFIX = "extracted_images/"
+
+# extracted_images/{book}/images/p{page}_{index}.{ext}
+TREE_IMAGE_PATTERN = re.compile(r"^p(\d+)_(\d+)\.(jpg|jpeg|png|webp|gif)$", re.IGNORECASE)
+
+def normalize_book_id(book):
+    """'15-Main', '02', '2' -> '15', '2', '2'"""
+    match = re.match(r"\d+", str(book))
+    return str(int(match.group())) if match else str(book)
+
+class ImageIndex:
+    """
+    메모리 상의 (book, page) -> 이미지 목록 맵. 조회는 dict 두 번 (O(1)) 입니다.
+    """
+
+    _loaded = {}
+
+    def __init__(self, books=None, prefix=DEFAULT_PREFIX, chapters=None):
+        self.books = books or {}
+        self.prefix = prefix
+        self.chapters = chapters or {}
+
+    @classmethod
+    def load(cls, path):
+        """인덱스 파일을 한 번만 읽어 프로세스 내에서 재사용합니다."""
+        if path not in cls._loaded:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            cls._loaded[path] = cls(data.get("books", {}), data.get("prefix", DEFAULT_PREFIX), data.get("chapters"))
+        return cls._loaded[path]
+
+    @classmethod
+    def load_or_empty(cls, path, prefix=DEFAULT_PREFIX):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data.get("books", {}), data.get("prefix", prefix), data.get("chapters"))
+        return cls(prefix=prefix)
+
+    def add(self, book, page, name, width, height, size, variants=None):
+        entries = self.books.setdefault(normalize_book_id(book), {}).setdefault(str(page), [])
+        entry = [name, width, height, size]
+        if variants:
+            entry.append([[v["name"], v["width"], v["height"], v["size"]] for v in variants])
+        entries.append(entry)
+
+    def replace_book(self, book, pages, only=None):
+        """
+        한 책의 항목을 통째로 교체합니다. only(페이지 목록)를 주면 그 페이지만 교체합니다.
+        pages: {page: [{"name", "width", "height", "size"}, ...]} (extract_page_range 의 페이지 기록 형식,
+               선택 키 "variants", "chapter")
+        """
+        book_id = normalize_book_id(book)
+        if only is None:
+            self.books[book_id] = {}
+            self.chapters.pop(book_id, None)
+        else:
+            for page in only:
+                self.books.get(book_id, {}).pop(str(page), None)
+                self.chapters.get(book_id, {}).pop(str(page), None)
+        for page, records in sorted(pages.items(), key=lambda item: int(item[0])):
+            for record in records:
+                self.add(book_id, page, record["name"], record["width"], record["height"], record["size"],
+                         record.get("variants"))
+                if record.get("chapter"):
+                    self.chapters.setdefault(book_id, {})[str(page)] = record["chapter"]
+        if only is not None:
+            self.books[book_id] = dict(sorted(self.books.get(book_id, {}).items(), key=lambda item: int(item[0])))
+
+    def lookup(self, book, page):
+        """
+        [{"name", "blob", "width", "height", "size", "variants"}, ...] (이미지 없는 페이지는 빈 리스트)
+        인덱스에 없는 책은 None 입니다. (일부 책만 색인된 경우 호출자가 목록 조회로 대체, src/lib/image-index.ts 와 동일)
+        """
+        pages = self.books.get(normalize_book_id(book))
+        if pages is None:
+            return None
+        entries = pages.get(str(page), [])
+        return [
+            {"name": name, "blob": f"{self.prefix}{name}", "width": width, "height": height, "size": size,
+             "variants": [{"name": v[0], "blob": f"{self.prefix}{v[0]}", "width": v[1], "height": v[2], "size": v[3]}
+                          for v in (rest[0] if rest else [])]}
+            for name, width, height, size, *rest in entries
+        ]
+
+    def blob_names(self):
+        return [f"{self.prefix}{entry[0]}" for pages in self.books.values() for entries in pages.values() for entry in entries]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            data = {"version": INDEX_VERSION, "prefix": self.prefix, "books": self.books}
+            if self.chapters:
+                data["chapters"] = self.chapters
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+def read_image_size(path):
+    """이미지 파일의 (가로, 세로) 픽셀 크기"""
+    import fitz  # PyMuPDF (인덱스 빌드 시에만 필요)
+    pix = fitz.Pixmap(path)
+    return pix.width, pix.height
+
+def build_index_from_tree(root, prefix=DEFAULT_PREFIX):
+    """
+    버킷 구조를 그대로 옮긴 로컬 폴더 (root/{book}/images/p{page}_{index}.{ext}) 로 인덱스를 만듭니다.
+    """
+    index = ImageIndex(prefix=prefix)
+    for book in sorted(os.listdir(root)):
+        image_dir = os.path.join(root, book, "images")
+        if not os.path.isdir(image_dir):
+            continue
+        matches = [(TREE_IMAGE_PATTERN.match(name), name) for name in os.listdir(image_dir)]
+        matches = sorted(((m, n) for m, n in matches if m), key=lambda item: (int(item[0].group(1)), int(item[0].group(2))))
+        for match, name in matches:
+            path = os.path.join(image_dir, name)
+            width, height = read_image_size(path)
+            index.add(book, int(match.group(1)), f"{book}/images/{name}", width, height, os.path.getsize(path))
+    return index
+
+def benchmark(index, lookups=10000, bucket_name=None, remote_lookups=20):
+    """
+    인덱스 조회 지연과 prefix 목록 조회 방식을 비교합니다.
+    - 로컬: 전체 blob 이름에 대한 prefix 스캔 (원격 listing 의 하한선)
+    - 원격: bucket_name 을 주면 실제 GCS list_blobs(prefix=...) 호출 시간
+    """
+    keys = [(book, int(page)) for book, pages in index.books.items() for page in pages]
+    if not keys:
+        print("Index is empty.")
+        return {}
+    samples = [random.choice(keys) for _ in range(lookups)]
+    names = sorted(index.blob_names())
+
+    start = time.perf_counter()
+    for book, page in samples:
+        index.lookup(book, page)
+    index_us = (time.perf_counter() - start) / lookups * 1e6
+
+    scan_samples = samples[:min(lookups, 1000)]
+    start = time.perf_counter()
+    for book, page in scan_samples:
+        page_prefix = f"p{page}_"
+        [name for name in names if name.startswith(f"{index.prefix}{book}/") and page_prefix in name]
+    scan_us = (time.perf_counter() - start) / len(scan_samples) * 1e6
+
+    result = {"keys": len(keys), "blobs": len(names), "index_lookup_us": index_us, "prefix_scan_us": scan_us}
+    print(f"Index: {len(keys)} pages, {len(names)} images")
+    print(f"  Index lookup     : {index_us:.2f} us/lookup")
+    print(f"  Local prefix scan: {scan_us:.2f} us/lookup")
+
+    if bucket_name:
+        from google.cloud import storage
+        bucket = storage.Client().bucket(bucket_name)
+        start = time.perf_counter()
+        for book, page in samples[:remote_lookups]:
+            list(bucket.list_blobs(prefix=f"{index.prefix}{book}/images/p{page}_"))
+        remote_ms = (time.perf_counter() - start) / remote_lookups * 1e3
+        result["gcs_list_ms"] = remote_ms
+        print(f"  GCS list_blobs   : {remote_ms:.2f} ms/lookup")
+    return result
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="(book, page) -> 이미지 인덱스 빌드/벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="로컬 폴더(root/{book}/images/...)에서 인덱스 생성")
+    build.add_argument("root")
+    build.add_argument("--output", default=INDEX_FILENAME)
+    build.add_argument("--prefix", default=DEFAULT_PREFIX)
+
+    bench = sub.add_parser("bench", help="인덱스 조회 vs prefix 목록 조회 지연 비교")
+    bench.add_argument("index")
+    bench.add_argument("--lookups", type=int, default=10000)
+    bench.add_argument("--gcs-bucket", default=None, help="실제 GCS list_blobs 지연도 측정할 버킷")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "build":
+        index = build_index_from_tree(args.root, args.prefix)
+        index.save(args.output)
+        print(f"Index saved to '{args.output}' ({len(index.blob_names())} images)")
+    else:
+        benchmark(ImageIndex.load(args.index), args.lookups, args.gcs_bucket)
@@ -0,0 +1,438 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from image_index import normalize_book_id
+
+# === 책 단위 이미지 팩 (Packed Per-book Image Archive) ===
+# 책 한 권의 이미지를 파일 하나({book}.{sha8}.pack)에 ALIGN 바이트 경계로 이어 붙이고,
+# pack_index.json 에 (book, page, index) -> (offset, length, ext) 를 기록합니다.
+#   형식: {"version": 1, "align": 4096,
+#          "books": {"15": {"pack": "15-Main.1a2b3c4d.pack", "size": 바이트,
+#                           "pages": {"114": [[index, offset, length, ext, width, height], ...]}}}}
+# 페이지의 항목은 index 순서이므로, 목록 위치가 /api/proxy-image 의 index(0부터)와 같습니다.
+# 읽기: 로컬은 mmap 슬라이스(PackReader), 원격은 HTTP Range 요청 한 번(HttpPackReader, src/lib/image-pack.ts).
+# 업로드는 책마다 객체 하나 + pack_index.json 입니다. (upload_to_gcs.py --source PACK_DIR --dest extracted_images/packs/)
+# 팩 이름에 내용 해시(SHA-256 앞 8자리)가 들어가므로 다시 만든 팩은 새 객체가 됩니다. 서버가 아직 들고 있는
+# 이전 pack_index.json 은 이전 팩만 가리키고, upload_to_gcs.py 는 팩을 모두 올린 뒤 pack_index.json 을 올립니다.
+# ============================
+
+PACK_CONFIG = {
+    "ALIGN": 4096,   # 이미지 시작 오프셋 정렬 (페이지 크기: mmap 슬라이스/디스크 블록 경계)
+}
+
+PACK_INDEX_FILENAME = "pack_index.json"
+PACK_VERSION = 1
+
+MIME_TYPES = {"jpeg": "image/jpeg", "jpg": "image/jpeg", "png": "image/png", "webp": "image/webp",
+              "avif": "image/avif", "gif": "image/gif", "jpx": "image/jpx"}
+
+def mime_type(ext):
+    return MIME_TYPES.get(ext.lower(), "application/octet-stream")
+
+class PackWriter:
+    """
+    한 책의 팩 파일을 씁니다. add() 순서대로 이어 붙이고, close() 에서 임시 파일을
+    directory/{name}.{sha8}.pack 으로 옮깁니다 (내용이 같으면 이름도 같음).
+    entries: {page: [[index, offset, length, ext, width, height], ...]}
+    """
+
+    def __init__(self, directory, name, align=None):
+        self.directory = directory
+        self.name = name
+        self.path = None
+        self.align = align or PACK_CONFIG["ALIGN"]
+        self.entries = {}
+        self.size = 0
+        self.padding = 0
+        self._digest = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        self._file = os.fdopen(fd, "wb")
+
+    def _write(self, data):
+        self._file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def add(self, page, index, data, ext, width, height):
+        pad = -self.size % self.align
+        if pad:
+            self._write(b"\0" * pad)
+            self.padding += pad
+        self.entries.setdefault(str(page), []).append([index, self.size, len(data), ext, width, height])
+        self._write(data)
+
+    def close(self):
+        self._file.close()
+        self.path = os.path.join(self.directory, f"{self.name}.{self._digest.hexdigest()[:8]}.pack")
+        os.replace(self._tmp_path, self.path)
+        for entries in self.entries.values():
+            entries.sort(key=lambda entry: entry[0])
+        return {"pack": os.path.basename(self.path), "size": self.size,
+                "pages": dict(sorted(self.entries.items(), key=lambda item: int(item[0])))}
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+def load_pack_index(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": PACK_VERSION, "align": PACK_CONFIG["ALIGN"], "books": {}}
+
+def save_pack_index(path, books):
+    """이번에 쓴 책만 교체하여 pack_index.json 을 저장하고, 교체된 이전 팩 파일을 지웁니다."""
+    index = load_pack_index(path)
+    superseded = [index["books"][book]["pack"] for book, entry in books.items()
+                  if book in index["books"] and index["books"][book]["pack"] != entry["pack"]]
+    index["books"].update(books)
+    index["align"] = PACK_CONFIG["ALIGN"]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    for pack in superseded:
+        pack_path = os.path.join(os.path.dirname(path), pack)
+        if os.path.exists(pack_path):
+            os.remove(pack_path)
+    return index
+
+class PackSink:
+    """
+    파이프라인(pdf_pipeline.py) 싱크: 이미지 항목을 책별 팩 파일로 씁니다. close() 에서 pack_index.json 갱신.
+    실패한 실행(close(ok=False))은 임시 팩을 지우고 인덱스를 건드리지 않습니다.
+    """
+
+    def __init__(self, root, kinds=("image",)):
+        self.root = root
+        self.kinds = set(kinds)
+        self.writers = {}
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, item):
+        if "data" not in item or item["kind"] not in self.kinds:
+            return
+        writer = self.writers.get(item["book"])
+        if writer is None:
+            writer = self.writers[item["book"]] = PackWriter(self.root, item["book"])
+        writer.add(item["page"], item["index"], item["data"], item["ext"], item.get("width"), item.get("height"))
+
+    def close(self, ok=True):
+        if not ok:
+            for writer in self.writers.values():
+                writer.abort()
+            self.writers = {}
+            return
+        books = {normalize_book_id(book): writer.close() for book, writer in self.writers.items()}
+        save_pack_index(os.path.join(self.root, PACK_INDEX_FILENAME), books)
+        self.writers = {}
+
+def pack_books(root, pack_dir, books, name=None):
+    """
+    이미 추출된 이미지(root 기준 상대 경로)를 책별 팩으로 묶습니다.
+    books: {file_name: {page: [record, ...]}} (extract_page_range 의 페이지 기록 형식)
+    name(record): root 기준 상대 경로 (기본값: record["name"])
+    반환: {"books", "images", "bytes", "padding"}
+    """
+    os.makedirs(pack_dir, exist_ok=True)
+    name = name or (lambda record: record["name"])
+    written, summary = {}, {"books": 0, "images": 0, "bytes": 0, "padding": 0}
+    for file_name, pages in books.items():
+        writer = PackWriter(pack_dir, file_name)
+        try:
+            for page, records in sorted(pages.items(), key=lambda item: int(item[0])):
+                for record in records:
+                    with open(os.path.join(root, name(record)), "rb") as f:
+                        writer.add(page, record["index"], f.read(), record["ext"], record["width"], record["height"])
+                    summary["images"] += 1
+        except BaseException:
+            writer.abort()
+            raise
+        written[normalize_book_id(file_name)] = writer.close()
+        summary["books"] += 1
+        summary["bytes"] += writer.size
+        summary["padding"] += writer.padding
+    save_pack_index(os.path.join(pack_dir, PACK_INDEX_FILENAME), written)
+    return summary
+
+# --- Readers ---
+
+class PackReader:
+    """로컬 팩 읽기: 팩 파일을 mmap 하고 이미지를 복사 없이 memoryview 슬라이스로 돌려줍니다."""
+
+    def __init__(self, root):
+        self.root = root
+        self.index = load_pack_index(os.path.join(root, PACK_INDEX_FILENAME))
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def entries(self, book, page):
+        """[[index, offset, length, ext, width, height], ...] (없으면 빈 리스트)"""
+        book = self.index["books"].get(normalize_book_id(book))
+        return book["pages"].get(str(page), []) if book else []
+
+    def _map(self, book_id):
+        with self._lock:
+            mapped = self._maps.get(book_id)
+            if mapped is None:
+                with open(os.path.join(self.root, self.index["books"][book_id]["pack"]), "rb") as f:
+                    mapped = self._maps[book_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return mapped
+
+    def get(self, book, page, position=0):
+        """페이지의 position 번째(0부터) 이미지. 반환: (memoryview, mime) 또는 None"""
+        entries = self.entries(book, page)
+        if position >= len(entries):
+            return None
+        _, offset, length, ext, _, _ = entries[position]
+        return memoryview(self._map(normalize_book_id(book)))[offset:offset + length], mime_type(ext)
+
+class HttpPackReader:
+    """
+    원격 팩 읽기: base_url 아래의 pack_index.json 을 한 번 받고, 이미지는 Range 요청 한 번으로 가져옵니다.
+    (GCS 공개/서명 URL, 또는 Range 를 지원하는 HTTP 서버)
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.timeout = timeout
+        with urllib.request.urlopen(self.base_url + PACK_INDEX_FILENAME, timeout=timeout) as response:
+            self.index = json.loads(response.read().decode("utf-8"))
+
+    def entries(self, book, page):
+        book = self.index["books"].get(normalize_book_id(book))
+        return book["pages"].get(str(page), []) if book else []
+
+    def get(self, book, page, position=0):
+        entries = self.entries(book, page)
+        if position >= len(entries):
+            return None
+        _, offset, length, ext, _, _ = entries[position]
+        pack = self.index["books"][normalize_book_id(book)]["pack"]
+        request = urllib.request.Request(self.base_url + pack, headers={"Range": f"bytes={offset}-{offset + length - 1}"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status != 206:
+                raise IOError(f"Range request not honoured for {pack} (HTTP {response.status})")
+            data = response.read()
+        if len(data) != length:
+            raise IOError(f"Short range read for {pack}: {len(data)} of {length} bytes")
+        return data, mime_type(ext)
+
+LOOSE_NAME = re.compile(r"^(.+)_p(\d+)_(\d+)\.(\w+)$")
+
+def scan_folder(source_dir, sizes=False):
+    """
+    extract_images.py 출력 폴더({book}_p{page}_{index}.{ext})를 pack_books 입력 형식으로 읽습니다.
+    sizes=True 이면 이미지를 열어 해상도를 기록합니다 (PyMuPDF).
+    """
+    if sizes:
+        import fitz  # PyMuPDF
+
+    books = {}
+    for name in sorted(os.listdir(source_dir)):
+        match = LOOSE_NAME.match(name)
+        if not match:
+            continue
+        width = height = None
+        if sizes:
+            try:
+                pix = fitz.Pixmap(os.path.join(source_dir, name))
+                width, height = pix.width, pix.height
+            except Exception:
+                pass
+        books.setdefault(match.group(1), {}).setdefault(int(match.group(2)), []).append(
+            {"name": name, "index": int(match.group(3)), "ext": match.group(4), "width": width, "height": height})
+    return books
+
+# --- Benchmark ---
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """벤치마크용 정적 파일 서버 (단일 Range 요청 지원). SimpleHTTPRequestHandler 는 Range 를 무시합니다."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not header or not header.startswith("bytes=") or not os.path.isfile(path):
+            return super().send_head()
+        start, _, end = header[len("bytes="):].partition("-")
+        size = os.path.getsize(path)
+        start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.range_remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "range_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(remaining))
+
+def _serve(directory):
+    handler = lambda *args, **kwargs: _RangeRequestHandler(*args, directory=directory, **kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+            "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 3)}
+
+def benchmark(source_dir, reads=2000, latency_ms=20, upload_workers=16, seed=0):
+    """
+    source_dir 의 낱개 이미지 파일({book}_p{page}_{index}.{ext}, extract_images.py 출력)과 같은 내용의 팩을 비교합니다.
+      pack    : 팩 생성 시간, 팩/낱개 파일 용량 (정렬 패딩 포함)
+      upload  : LocalBackend(요청당 latency_ms) 로 올릴 객체 수와 시간
+      local   : 무작위 이미지 reads 번 읽기 - 낱개 파일 open/read vs 팩 mmap 슬라이스
+      http    : 로컬 HTTP 서버에서 같은 읽기 - 낱개 파일 GET vs 팩 Range GET
+    """
+    from storage_backends import LocalBackend
+    from upload_to_gcs import run_concurrently
+
+    books = scan_folder(source_dir)
+    loose = [(book, page, position, records[position]["name"])
+             for book, pages in books.items() for page, records in pages.items() for position in range(len(records))]
+    if not loose:
+        raise ValueError(f"No '{{book}}_p{{page}}_{{index}}.{{ext}}' images in '{source_dir}'")
+    loose_bytes = sum(os.path.getsize(os.path.join(source_dir, item[3])) for item in loose)
+    report = {"images": len(loose), "books": len(books), "loose_bytes": loose_bytes}
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pack_")
+    try:
+        pack_dir = os.path.join(work_dir, "packs")
+        started = time.perf_counter()
+        summary = pack_books(source_dir, pack_dir, books)
+        report["pack"] = {"seconds": round(time.perf_counter() - started, 3), "bytes": summary["bytes"],
+                          "padding": summary["padding"], "objects": summary["books"] + 1}
+
+        # 업로드: 낱개 파일 N 개 vs 책마다 팩 1 개 + 색인
+        report["upload"] = {}
+        for label, root, names in (("loose", source_dir, [item[3] for item in loose]),
+                                   ("pack", pack_dir, sorted(os.listdir(pack_dir)))):
+            backend = LocalBackend(os.path.join(work_dir, f"bucket_{label}"), latency_ms=latency_ms)
+            jobs = [(name, os.path.getsize(os.path.join(root, name)), backend.upload, (os.path.join(root, name), name))
+                    for name in names]
+            stats = run_concurrently(backend, "Uploaded", jobs, upload_workers).summary()
+            report["upload"][label] = {"objects": len(jobs), "seconds": round(stats["seconds"], 3)}
+
+        rng = random.Random(seed)
+        sample = [rng.choice(loose) for _ in range(reads)]
+        reader = PackReader(pack_dir)
+
+        def time_reads(read):
+            samples = []
+            for item in sample:
+                started = time.perf_counter()
+                read(item)
+                samples.append(time.perf_counter() - started)
+            return _percentiles(samples)
+
+        def read_loose(item):
+            with open(os.path.join(source_dir, item[3]), "rb") as f:
+                return f.read()
+
+        def read_pack(item):
+            return bytes(reader.get(item[0], item[1], item[2])[0])
+
+        for item in sample[:50]:
+            assert read_loose(item) == read_pack(item), item
+        report["local"] = {"loose": time_reads(read_loose), "pack": time_reads(read_pack)}
+
+        server, base_url = _serve(work_dir)
+        try:
+            shutil.copytree(source_dir, os.path.join(work_dir, "loose"))
+            remote = HttpPackReader(base_url + "packs/")
+
+            def get_loose(item):
+                with urllib.request.urlopen(base_url + "loose/" + item[3]) as response:
+                    return response.read()
+
+            def get_pack(item):
+                return remote.get(item[0], item[1], item[2])[0]
+
+            for item in sample[:50]:
+                assert get_loose(item) == get_pack(item), item
+            report["http"] = {"loose": time_reads(get_loose), "pack": time_reads(get_pack)}
+        finally:
+            server.shutdown()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{report['images']} images in {report['books']} books, loose {loose_bytes / (1024 * 1024):.1f} MB")
+    pack = report["pack"]
+    print(f"  pack   : {pack['objects']} objects, {pack['bytes'] / (1024 * 1024):.1f} MB "
+          f"(padding {pack['padding'] / 1024:.0f} KB), built in {pack['seconds']:.2f}s")
+    for label in ("loose", "pack"):
+        upload = report["upload"][label]
+        print(f"  upload {label:<5}: {upload['objects']:>5} objects in {upload['seconds']:.2f}s "
+              f"({latency_ms:.0f} ms/request, {upload_workers} workers)")
+    for kind in ("local", "http"):
+        for label in ("loose", "pack"):
+            r = report[kind][label]
+            print(f"  {kind:<5} read {label:<5}: p50 {r['p50_ms']:.3f} ms, p95 {r['p95_ms']:.3f} ms")
+    return report
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="책 단위 이미지 팩 생성/조회/벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="extract_images.py 출력 폴더의 낱개 이미지를 책별 팩으로 묶기")
+    build.add_argument("source", help="낱개 이미지 폴더 (예: temp_images)")
+    build.add_argument("--output", default="packs", help="팩 폴더")
+
+    get = sub.add_parser("get", help="팩에서 이미지 하나 꺼내기")
+    get.add_argument("pack_dir", help="팩 폴더 또는 http(s) URL")
+    get.add_argument("book")
+    get.add_argument("page", type=int)
+    get.add_argument("--position", type=int, default=0, help="페이지 안의 순서 (0부터)")
+    get.add_argument("--out", required=True, help="저장할 파일")
+
+    bench = sub.add_parser("bench", help="낱개 파일 vs 팩 (용량, 업로드 객체 수, 로컬/HTTP 읽기 지연)")
+    bench.add_argument("source", help="낱개 이미지 폴더")
+    bench.add_argument("--reads", type=int, default=2000)
+    bench.add_argument("--latency-ms", type=float, default=20, help="업로드 요청당 모의 지연 (ms)")
+    bench.add_argument("--report", default=None, metavar="REPORT_JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "build":
+        summary = pack_books(args.source, args.output, scan_folder(args.source, sizes=True))
+        print(f"Packed {summary['images']} images into {summary['books']} packs in '{args.output}' "
+              f"({summary['bytes'] / (1024 * 1024):.1f} MB, padding {summary['padding'] / 1024:.0f} KB)")
+    elif args.command == "get":
+        reader = HttpPackReader(args.pack_dir) if args.pack_dir.startswith(("http://", "https://")) else PackReader(args.pack_dir)
+        found = reader.get(args.book, args.page, args.position)
+        if found is None:
+            print(f"No image {args.position} on page {args.page} of book {args.book}")
+            sys.exit(1)
+        with open(args.out, "wb") as f:
+            f.write(found[0])
+        print(f"Saved '{args.out}' ({found[1]}, {len(found[0])} bytes)")
+    else:
+        report = benchmark(args.source, args.reads, args.latency_ms)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+# === 콘텐츠 주소 이미지 저장소 (Content-Addressed Image Store) ===
+# blobs/{hash[:2]}/{hash}.{ext} 에 이미지 바이트를 한 번만 저장하고,
+# manifest.json 에 (book, page, index) -> hash 매핑을 기록합니다.
+# ============================
+
+def hash_bytes(data):
+    """이미지 바이트의 SHA-256 해시 (저장소 키)"""
+    return hashlib.sha256(data).hexdigest()
+
+class BlobStore:
+    """
+    hash -> bytes 저장소. 같은 내용은 한 번만 기록됩니다.
+    여러 프로세스가 동시에 같은 blob 을 써도 안전하도록 임시 파일 + os.replace 를 사용합니다.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def path_for(self, digest, ext):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{ext}")
+
+    def put(self, data, ext):
+        """
+        바이트를 저장하고 (hash, 새로 기록했는지 여부) 를 반환합니다.
+        """
+        digest = hash_bytes(data)
+        path = self.path_for(digest, ext)
+        if os.path.exists(path):
+            return digest, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get(self, digest, ext):
+        with open(self.path_for(digest, ext), "rb") as f:
+            return f.read()
+
+class ImageManifest:
+    """
+    (book, page, index) -> hash 매핑과 blob 메타데이터(확장자, 크기, 해상도)를 관리합니다.
+    aliases 는 근접 중복으로 묶인 blob -> 대표 blob 매핑입니다. (phash_index.py)
+    chapters 는 (book, page, index) -> 목차 챕터 제목입니다. (목차로 조회한 추출만)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.images = {}
+        self.blobs = {}
+        self.aliases = {}
+        self.chapters = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.images = data.get("images", {})
+            self.blobs = data.get("blobs", {})
+            self.aliases = data.get("aliases", {})
+            self.chapters = data.get("chapters", {})
+
+    @staticmethod
+    def key(book, page, index):
+        return f"{book}/{page}/{index}"
+
+    def record(self, book, page, index, digest, ext, width, height, size, chapter=None):
+        key = self.key(book, page, index)
+        self.images[key] = digest
+        self.blobs[digest] = {"ext": ext, "width": width, "height": height, "size": size}
+        if chapter:
+            self.chapters[key] = chapter
+        else:
+            self.chapters.pop(key, None)
+
+    def drop_pages(self, book, pages=None):
+        """책의 이미지 참조(와 챕터)를 지웁니다. pages(페이지 목록)를 주면 그 페이지만. 지운 참조 수를 반환합니다."""
+        prefix = f"{book}/"
+        pages = None if pages is None else {str(page) for page in pages}
+        stale = [key for key in self.images
+                 if key.startswith(prefix) and (pages is None or key[len(prefix):].split("/", 1)[0] in pages)]
+        for key in stale:
+            del self.images[key]
+            self.chapters.pop(key, None)
+        return len(stale)
+
+    def lookup(self, book, page, index):
+        return self.images.get(self.key(book, page, index))
+
+    def collapse(self, resolve):
+        """
+        resolve(hash) -> 대표 hash 로 모든 이미지 참조를 바꾸고 별칭을 기록합니다.
+        바뀐 참조 수를 반환합니다.
+        """
+        repointed = 0
+        for key, digest in self.images.items():
+            canonical = resolve(digest)
+            if canonical != digest:
+                self.images[key] = canonical
+                repointed += 1
+        for digest in self.blobs:
+            canonical = resolve(digest)
+            if canonical != digest:
+                self.aliases[digest] = canonical
+            else:
+                self.aliases.pop(digest, None)
+        return repointed
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            data = {"images": self.images, "blobs": self.blobs, "aliases": self.aliases}
+            if self.chapters:
+                data["chapters"] = self.chapters
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        """전체 참조 수, 고유 blob 수, 고유 blob 총 용량"""
+        return {
+            "references": len(self.images),
+            "unique_blobs": len(self.blobs),
+            "unique_bytes": sum(blob["size"] for blob in self.blobs.values()),
+        }
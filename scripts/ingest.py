@@ -0,0 +1,349 @@
+import argparse
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+
+from extract_images import (CONFIG, PARALLEL_CONFIG, SOURCES_FILE, _extract_page_range_worker, index_name,
+                            record_manifest, remove_outputs, resolve_source_pdfs, split_page_ranges, write_image_index)
+from extraction_state import ExtractionState
+from image_index import INDEX_FILENAME
+from image_store import ImageManifest
+from instrumentation import METRICS, add_arguments as add_metrics_arguments, count, event, span
+from low_memory import LOW_MEMORY_CONFIG
+from storage_backends import GCSBackend, LocalBackend
+from upload_to_gcs import BUCKET_NAME, DESTINATION_FOLDER, PROJECT_ID, UPLOAD_CONFIG, run_concurrently
+
+# === 코퍼스 수집 스케줄러 (Corpus Ingest Scheduler) ===
+# src/lib/sources.json 의 모든 책을 한 번에 추출하고 업로드합니다.
+#   1. 책마다 페이지 범위 작업(PAGES_PER_TASK 페이지)으로 나누고, 메타데이터(페이지 수, 이미지 픽셀 수)로 비용을 추정
+#   2. 비용이 큰 작업부터(longest-first) 하나의 프로세스 풀에 넣어 책 크기 차이로 코어가 노는 시간을 줄임
+#   3. 끝난 작업은 상태 파일(ingest_state.json)에 체크포인트 -> 중단 후 재실행하면 남은 작업만 실행
+#   4. 책의 마지막 작업이 끝나는 즉시 그 책의 이미지를 업로드 (코퍼스 전체를 기다리지 않음)
+# 끝나면 전체 시간, 워커별 가동률(작업 시간 / 전체 시간), 책별 완료/업로드 시각을 출력합니다.
+# ============================
+
+INGEST_CONFIG = {
+    "WORKERS": PARALLEL_CONFIG["WORKERS"],
+    "PAGES_PER_TASK": PARALLEL_CONFIG["PAGES_PER_TASK"],
+    "CHECKPOINT_SECONDS": 2.0,   # 완료 작업 체크포인트 최소 간격 (책이 끝날 때는 항상 저장)
+}
+
+# 작업 비용 추정 (상대값): 페이지당 고정 비용 + 이미지 디코딩 비용 (작업 안에서 처음 보는 xref 의 픽셀 수)
+TASK_COST = {
+    "PAGE": 1.0,
+    "MEGAPIXEL": 20.0,
+}
+
+STATE_FILE = "ingest_state.json"
+
+# --- Planning ---
+
+def estimate_task_cost(doc, start, end):
+    """[start, end) 페이지 작업의 상대 비용. get_images 메타데이터만 사용합니다. (디코딩 없음)"""
+    cost = TASK_COST["PAGE"] * (end - start)
+    seen = set()
+    for page_index in range(start, end):
+        for img in doc[page_index].get_images(full=True):
+            if img[0] not in seen:
+                seen.add(img[0])
+                cost += TASK_COST["MEGAPIXEL"] * img[2] * img[3] / 1_000_000
+    return cost
+
+def plan_tasks(pdf_paths, state, pages_per_task, output_dir):
+    """
+    책별 작업 목록을 만듭니다. 지문(파일/설정/작업 크기)이 바뀐 책은 체크포인트를 버리고 이전 출력을 지웁니다.
+    반환: (남은 작업 [{"book", "pdf", "start", "end", "cost"}], 책별 정보 {book: {"pdf", "tasks", "pending"}})
+    """
+    tasks, books = [], {}
+    config_key = json.dumps({"config": CONFIG, "pages_per_task": pages_per_task}, sort_keys=True)
+    for pdf_path in pdf_paths:
+        file_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        entry = state.book(file_name)
+        fingerprint = f"{state.file_fingerprint(file_name, pdf_path)}:{config_key}"
+        if entry["fingerprint"] != fingerprint:
+            stale = [record["name"] for task in entry.get("tasks", {}).values()
+                     for records in task["pages"].values() for record in records]
+            remove_outputs(output_dir, stale)
+            entry.update({"fingerprint": fingerprint, "complete": False, "tasks": {}, "uploaded": False})
+
+        with fitz.open(pdf_path) as doc:
+            ranges = split_page_ranges(len(doc), pages_per_task)
+            pending = [(start, end) for start, end in ranges if f"{start}-{end}" not in entry["tasks"]]
+            for start, end in pending:
+                tasks.append({"book": file_name, "pdf": pdf_path, "start": start, "end": end,
+                              "cost": estimate_task_cost(doc, start, end)})
+        books[file_name] = {"pdf": pdf_path, "tasks": len(ranges), "pending": len(pending)}
+    return tasks, books
+
+def order_tasks(tasks, order="longest"):
+    """longest: 비용이 큰 작업부터 (LPT). book: 책 순서대로, 책 안에서는 페이지 순서대로 (기존 방식)"""
+    if order == "longest":
+        return sorted(tasks, key=lambda task: -task["cost"])
+    return list(tasks)
+
+def simulate_makespan(durations, workers):
+    """작업 시간 목록을 주어진 순서대로 가장 먼저 비는 워커에 배정했을 때의 전체 시간 (리스트 스케줄링)"""
+    finish = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heapreplace(finish, finish[0] + duration)
+    return max(finish)
+
+# --- Upload ---
+
+def make_backend(kind, bucket=BUCKET_NAME, local_root="local_bucket", latency_ms=0):
+    if kind == "local":
+        return LocalBackend(local_root, latency_ms=latency_ms)
+    return GCSBackend(bucket, PROJECT_ID)
+
+def book_files(entry):
+    """책 체크포인트의 출력 이름 목록 (개별 파일명 또는 저장소 상대 경로, 중복 제거)"""
+    names = {index_name(record) for task in entry["tasks"].values() for records in task["pages"].values() for record in records}
+    return sorted(names)
+
+def upload_book(backend, root, file_name, names, destination_folder, workers):
+    """책 하나의 출력 파일을 업로드합니다. 반환: TransferStats.summary()"""
+    jobs = []
+    for name in names:
+        local_path = os.path.join(root, name)
+        jobs.append((name, os.path.getsize(local_path), backend.upload, (local_path, f"{destination_folder}{name}")))
+    with span("ingest.upload", book=file_name, files=len(jobs)):
+        stats = run_concurrently(backend, "Uploaded", jobs, workers)
+    return stats.summary()
+
+# --- Run ---
+
+def _worker_utilization(runs, wall):
+    """작업 실행 기록 [(pid, started, finished)] -> 워커별 {"tasks", "busy_seconds", "utilization"}"""
+    workers = {}
+    for pid, started, finished in runs:
+        worker = workers.setdefault(pid, {"tasks": 0, "busy_seconds": 0.0})
+        worker["tasks"] += 1
+        worker["busy_seconds"] += finished - started
+    for worker in workers.values():
+        worker["busy_seconds"] = round(worker["busy_seconds"], 3)
+        worker["utilization"] = round(worker["busy_seconds"] / wall, 3) if wall > 0 else 0.0
+    return {f"w{i + 1}": worker for i, (_, worker) in enumerate(sorted(workers.items()))}
+
+def _ingest_task_worker(pdf_path, output_dir, start, end, store_dir, metrics, memory_limit_mb):
+    """워커 진입점: extract_images 의 페이지 범위 작업 + 실행 시각/pid (가동률 계산용)"""
+    started = time.time()
+    result = _extract_page_range_worker(pdf_path, output_dir, start, end, store_dir, metrics, memory_limit_mb)
+    result.update({"pid": os.getpid(), "started": started, "finished": time.time()})
+    return result
+
+def ingest(pdf_paths, output_dir="temp_images", state_path=STATE_FILE, workers=None, pages_per_task=None,
+           order="longest", store_dir=None, backend=None, destination_folder=DESTINATION_FOLDER, upload_workers=None,
+           memory_limit_mb=None):
+    """
+    코퍼스 전체를 페이지 범위 작업으로 나누어 하나의 프로세스 풀에서 추출하고, 책이 끝나는 대로 업로드합니다.
+    backend 가 None 이면 업로드하지 않습니다. 반환: 실행 리포트 dict
+    """
+    workers = workers or INGEST_CONFIG["WORKERS"]
+    pages_per_task = pages_per_task or INGEST_CONFIG["PAGES_PER_TASK"]
+    upload_workers = upload_workers or UPLOAD_CONFIG["WORKERS"]
+    root = store_dir or output_dir
+    os.makedirs(root, exist_ok=True)
+
+    state = ExtractionState(state_path)
+    tasks, books = plan_tasks(pdf_paths, state, pages_per_task, output_dir)
+    tasks = order_tasks(tasks, order)
+    state.save()
+    print(f"Ingest: {len(books)} books, {len(tasks)} page-range tasks pending "
+          f"(order {order}, {workers} workers, {pages_per_task} pages/task)")
+
+    report = {"books": {}, "workers": {}, "uploads": {}, "tasks": len(tasks), "order": order}
+    uploader = ThreadPoolExecutor(max_workers=1) if backend is not None else None
+    uploads = {}
+    uploaded_names = set()  # 저장소 모드: 여러 책이 공유하는 blob 은 한 번만 업로드
+    runs = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def finish_book(file_name):
+        """책의 모든 작업 완료: 저장 후 업로드 예약 (lock 안에서 호출)"""
+        entry = state.book(file_name)
+        entry["complete"] = True
+        state.save()
+        report["books"][file_name] = {"done_seconds": round(time.perf_counter() - started, 3)}
+        print(f"Done: {file_name} ({books[file_name]['tasks']} tasks)")
+        if uploader is not None and not entry.get("uploaded"):
+            names = [name for name in book_files(entry) if name not in uploaded_names]
+            uploaded_names.update(names)
+            uploads[file_name] = uploader.submit(upload_book_and_mark, file_name, names)
+
+    def upload_book_and_mark(file_name, names):
+        summary = upload_book(backend, root, file_name, names, destination_folder, upload_workers)
+        with lock:
+            state.book(file_name)["uploaded"] = summary["failed"] == 0
+            state.save()
+        summary["done_seconds"] = round(time.perf_counter() - started, 3)
+        count("ingest_books_uploaded")
+        return summary
+
+    try:
+        with span("ingest.batch", books=len(books), tasks=len(tasks), workers=workers):
+            # 이전 실행에서 추출은 끝났지만 업로드되지 않은 책
+            with lock:
+                for file_name, book in books.items():
+                    entry = state.book(file_name)
+                    if book["pending"] == 0 and not (entry["complete"] and (entry.get("uploaded") or uploader is None)):
+                        finish_book(file_name)
+
+            last_checkpoint = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_ingest_task_worker, task["pdf"], output_dir, task["start"], task["end"], store_dir,
+                                    METRICS.worker_config(), memory_limit_mb): task
+                    for task in tasks
+                }
+                for future in as_completed(futures):
+                    task = futures[future]
+                    result = future.result()
+                    METRICS.merge(result.pop("metrics"))
+                    runs.append((result["pid"], result["started"], result["finished"]))
+                    count("ingest_tasks_done")
+
+                    with lock:
+                        entry = state.book(task["book"])
+                        entry["tasks"][f"{task['start']}-{task['end']}"] = {
+                            "pages": result["pages"],
+                            "extracted": result["extracted"],
+                            "ignored": result["ignored"],
+                            "seconds": round(result["finished"] - result["started"], 3),
+                            "cost": round(task["cost"], 2),
+                        }
+                        books[task["book"]]["pending"] -= 1
+                        if books[task["book"]]["pending"] == 0:
+                            finish_book(task["book"])
+                            last_checkpoint = time.perf_counter()
+                        elif time.perf_counter() - last_checkpoint >= INGEST_CONFIG["CHECKPOINT_SECONDS"]:
+                            state.save()
+                            last_checkpoint = time.perf_counter()
+            extract_seconds = time.perf_counter() - started
+
+            if uploader is not None:
+                for file_name, future in uploads.items():
+                    report["uploads"][file_name] = future.result()
+    finally:
+        if uploader is not None:
+            uploader.shutdown(wait=True)
+        with lock:
+            state.save()
+
+    wall = time.perf_counter() - started
+    report["wall_seconds"] = round(wall, 3)
+    report["extract_seconds"] = round(extract_seconds, 3)
+    report["workers"] = _worker_utilization(runs, extract_seconds)
+
+    if store_dir:
+        manifest = ImageManifest(os.path.join(store_dir, "manifest.json"))
+        for file_name in books:
+            record_manifest(manifest, file_name, pages_of(state.book(file_name)))
+        manifest.save()
+        if backend is not None:
+            backend.upload(os.path.join(store_dir, "manifest.json"), f"{destination_folder}manifest.json")
+
+    print_report(report)
+    event("ingest.summary", wall_seconds=report["wall_seconds"], tasks=len(tasks), books=len(books))
+    report["pages"] = {file_name: pages_of(state.book(file_name)) for file_name in books}
+    return report
+
+def pages_of(entry):
+    """책 체크포인트의 {page: [record, ...]} (작업 단위 기록을 합침, 페이지 번호는 int)"""
+    pages = {}
+    for task in entry["tasks"].values():
+        for page, records in task["pages"].items():
+            pages[int(page)] = records
+    return dict(sorted(pages.items()))
+
+def print_report(report):
+    print("-" * 30)
+    print(f"Wall time: {report['wall_seconds']:.2f}s (extraction {report['extract_seconds']:.2f}s, "
+          f"{report['tasks']} tasks, order {report['order']})")
+    for name, worker in report["workers"].items():
+        print(f"  {name}: {worker['tasks']} tasks, busy {worker['busy_seconds']:.2f}s, "
+              f"utilization {worker['utilization'] * 100:.0f}%")
+    for file_name, book in report["books"].items():
+        upload = report["uploads"].get(file_name)
+        uploaded = f", uploaded {upload['files']} files at {upload['done_seconds']:.2f}s" if upload else ""
+        print(f"  {file_name}: extracted at {book['done_seconds']:.2f}s{uploaded}")
+
+def simulate_from_state(state_path, worker_counts):
+    """
+    체크포인트에 기록된 작업 시간으로 순서별 전체 시간을 비교합니다. (실제로 실행하지 않음)
+    반환: {workers: {"longest": 초, "book": 초, "ideal": 초}}
+    """
+    state = ExtractionState(state_path)
+    tasks = [{"cost": task["seconds"], "book": name, "start": int(key.split("-")[0])}
+             for name, entry in state.books.items() for key, task in entry.get("tasks", {}).items()]
+    tasks.sort(key=lambda task: (task["book"], task["start"]))
+    total = sum(task["cost"] for task in tasks)
+    results = {}
+    for workers in worker_counts:
+        results[workers] = {
+            order: round(simulate_makespan([task["cost"] for task in order_tasks(tasks, order)], workers), 3)
+            for order in ("longest", "book")
+        }
+        results[workers]["ideal"] = round(max(total / workers, max((task["cost"] for task in tasks), default=0)), 3)
+        r = results[workers]
+        print(f"  {workers:>3} workers: longest-first {r['longest']:.2f}s, book order {r['book']:.2f}s, lower bound {r['ideal']:.2f}s")
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="src/lib/sources.json 의 전체 책 추출 + 업로드 (페이지 범위 작업 스케줄링)")
+    parser.add_argument("--pdf-dir", default=".", help="sources.json 의 PDF 를 찾을 폴더")
+    parser.add_argument("--sources-file", default=SOURCES_FILE, help="책 목록 JSON")
+    parser.add_argument("--output-dir", default="temp_images", help="추출 이미지 저장 폴더")
+    parser.add_argument("--store", metavar="STORE_DIR", default=None, help="콘텐츠 주소 저장소에 기록 (extract_images.py --store)")
+    parser.add_argument("--state", default=STATE_FILE, help="작업 체크포인트 JSON")
+    parser.add_argument("--workers", type=int, default=None, help="추출 워커 프로세스 수")
+    parser.add_argument("--pages-per-task", type=int, default=None, help="작업 하나당 페이지 수")
+    parser.add_argument("--order", choices=["longest", "book"], default="longest", help="작업 배정 순서")
+    parser.add_argument("--upload", choices=["gcs", "local"], default=None, help="책이 끝나는 대로 업로드할 저장소")
+    parser.add_argument("--dest", default=DESTINATION_FOLDER, help="저장소 내 대상 폴더")
+    parser.add_argument("--bucket", default=BUCKET_NAME, help="GCS 버킷 이름 (--upload gcs)")
+    parser.add_argument("--local-root", default="local_bucket", help="로컬 백엔드 루트 폴더 (--upload local)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="--upload local 의 요청당 모의 지연 (ms)")
+    parser.add_argument("--upload-workers", type=int, default=None, help="동시 업로드 요청 수")
+    parser.add_argument("--index", nargs="?", const="", default=None, metavar="INDEX_JSON",
+                        help="(book, page) -> 이미지 인덱스 갱신 (기본값: 출력 폴더의 image_index.json)")
+    parser.add_argument("--low-memory", nargs="?", type=int, const=LOW_MEMORY_CONFIG["RSS_LIMIT_MB"], default=None,
+                        metavar="RSS_MB", help="워커마다 저메모리 모드 (low_memory.py)")
+    parser.add_argument("--simulate", metavar="WORKERS", default=None,
+                        help="실행하지 않고 체크포인트의 작업 시간으로 순서별 전체 시간 비교 (쉼표 구분 워커 수)")
+    parser.add_argument("--report", default=None, metavar="REPORT_JSON", help="실행 리포트 저장")
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+
+    if args.simulate:
+        simulate_from_state(args.state, [int(workers) for workers in args.simulate.split(",")])
+        sys.exit(0)
+
+    if args.metrics:
+        METRICS.configure(args.metrics)
+
+    targets = resolve_source_pdfs(args.pdf_dir, args.sources_file)
+    if not targets:
+        print(f"No source PDFs found in '{args.pdf_dir}'.")
+    else:
+        backend = make_backend(args.upload, args.bucket, args.local_root, args.latency_ms) if args.upload else None
+        report = ingest(targets, args.output_dir, args.state, args.workers, args.pages_per_task, args.order, args.store,
+                        backend, args.dest, args.upload_workers, args.low_memory)
+        pages = report.pop("pages")
+
+        if args.index is not None:
+            write_image_index(args.index or os.path.join(args.store or args.output_dir, INDEX_FILENAME), pages)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    METRICS.close()
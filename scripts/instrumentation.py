@@ -0,0 +1,295 @@
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# === 단계별 계측 (Structured Instrumentation) ===
+# 추출/목차/업로드 단계의 시간과 개수를 print 대신 구조화된 기록으로 남깁니다.
+#   span(name, **labels)     구간 시간 (문서/페이지/파일 단위). JSONL 이벤트 + span_seconds 히스토그램
+#   count(name, n, **labels) 카운터 (decoded, filtered, deduped, written ...)
+#   observe(name, v, **labels) 히스토그램 (이미지 바이트/픽셀 등)
+# configure(output_dir) 로 켜면 output_dir/metrics.jsonl 에 이벤트를 스트리밍하고,
+# close() 시 output_dir/metrics.prom (Prometheus 텍스트 형식, node_exporter textfile collector 용) 을 씁니다.
+# close() 는 atexit 에도 등록되므로 예외로 끝난 실행도 기록이 남습니다.
+# 꺼져 있으면(기본값) 모든 호출은 즉시 반환합니다.
+# 프로세스 풀 워커는 worker_config() 를 받아 configure_worker() 로 켜고, 결과와 함께 drain() 을 돌려주면
+# 부모가 merge() 로 합칩니다. profile 대상("BOOK:PAGE")과 일치하는 *.page 구간은 cProfile 로 기록됩니다.
+# ============================
+
+METRICS_CONFIG = {
+    "PREFIX": "bighistory_",
+    "FLUSH_EVERY": 500,                            # 이벤트 버퍼를 JSONL 로 내보내는 간격
+    "HIGH_CARDINALITY": ("file", "uri"),           # 이벤트에만 남기고 Prometheus 집계에서는 버리는 라벨 (숫자 라벨도 동일)
+    "PROFILE_TOP": 40,                             # 프로파일 요약에 남길 함수 수
+}
+
+BUCKETS = {
+    "bytes": [1024 * 4 ** i for i in range(9)],              # 1KB ~ 64MB
+    "pixels": [10_000 * 4 ** i for i in range(8)],           # 0.01MP ~ 164MP
+    "seconds": [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300],
+}
+
+JSONL_FILENAME = "metrics.jsonl"
+PROM_FILENAME = "metrics.prom"
+
+def _buckets_for(name):
+    for unit, buckets in BUCKETS.items():
+        if name.endswith(f"_{unit}"):
+            return buckets
+    return BUCKETS["seconds"]
+
+def _book_key(value):
+    """'15-Main', '015', '15' -> '15' (profile 대상 비교용)"""
+    match = re.match(r"\d+", str(value))
+    return str(int(match.group())) if match else str(value)
+
+class Metrics:
+    """프로세스 단위 계측 레지스트리. 카운터/히스토그램/이벤트 기록은 스레드 안전합니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._atexit = False
+        self.reset()
+
+    def reset(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.events = []
+        self.output_dir = None
+        self.profile = None
+
+    # --- Setup ---
+
+    def configure(self, output_dir, profile=None):
+        """
+        계측을 켭니다. profile: "BOOK:PAGE" (해당 페이지 구간만 cProfile) 또는 None
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.close()
+        self.reset(enabled=True)
+        self.output_dir = output_dir
+        self.profile = self._parse_profile(profile)
+        self._file = open(os.path.join(output_dir, JSONL_FILENAME), "a", encoding="utf-8")
+        if not self._atexit:
+            # 예외나 sys.exit() 로 끝나도 남은 이벤트와 metrics.prom 을 씁니다. (close() 는 두 번 불려도 무해)
+            atexit.register(self.close)
+            self._atexit = True
+
+    def worker_config(self):
+        """워커 프로세스에 넘길 설정 (꺼져 있으면 None)"""
+        if not self.enabled:
+            return None
+        return {"output_dir": self.output_dir, "profile": self.profile}
+
+    def configure_worker(self, config):
+        """워커 프로세스: 이벤트를 파일 대신 버퍼에 모아 drain() 으로 돌려줍니다."""
+        self.reset(enabled=config is not None)
+        self._file = None
+        if config:
+            self.output_dir = config["output_dir"]
+            self.profile = config["profile"]
+
+    @staticmethod
+    def _parse_profile(profile):
+        if not profile:
+            return None
+        book, _, page = str(profile).rpartition(":")
+        return {"book": _book_key(book), "page": int(page)}
+
+    # --- Recording ---
+
+    def span(self, name, **labels):
+        """구간 시간 기록 컨텍스트"""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, labels)
+
+    @contextmanager
+    def _span(self, name, labels):
+        profiler = None
+        if (self.profile and name.endswith(".page") and labels.get("page") == self.profile["page"]
+                and _book_key(labels.get("book")) == self.profile["book"]):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        wall, started = time.time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self._write_profile(profiler, name, labels)
+            self.observe("span_seconds", seconds, span=name, **labels)
+            self._emit({"type": "span", "name": name, "ts": round(wall, 6), "seconds": round(seconds, 6),
+                        "pid": os.getpid(), **labels})
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._aggregate_labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._aggregate_labels(labels))
+        buckets = _buckets_for(name)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def event(self, name, **fields):
+        """구간이 아닌 단발 이벤트 (예: 단계 요약)"""
+        if self.enabled:
+            self._emit({"type": "event", "name": name, "ts": round(time.time(), 6), "pid": os.getpid(), **fields})
+
+    @staticmethod
+    def _aggregate_labels(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items()
+                            if key not in METRICS_CONFIG["HIGH_CARDINALITY"] and not isinstance(value, (int, float))))
+
+    def _emit(self, event):
+        with self._lock:
+            self.events.append(event)
+            if self._file is not None and len(self.events) >= METRICS_CONFIG["FLUSH_EVERY"]:
+                self._flush_events()
+
+    def _flush_events(self):
+        for event in self.events:
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.events = []
+
+    def _write_profile(self, profiler, name, labels):
+        stem = f"profile_{_book_key(labels.get('book'))}_p{labels.get('page')}"
+        path = os.path.join(self.output_dir, f"{stem}.prof")
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(METRICS_CONFIG["PROFILE_TOP"])
+        with open(os.path.join(self.output_dir, f"{stem}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"# {name} {labels}\n{summary.getvalue()}")
+        self._emit({"type": "profile", "name": name, "path": path, **labels})
+
+    # --- Worker merge ---
+
+    def drain(self):
+        """워커: 지금까지의 기록을 넘기고 비웁니다. (꺼져 있으면 None)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            snapshot = {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, list(labels), histogram] for (name, labels), histogram in self.histograms.items()],
+                "events": self.events,
+            }
+            self.counters, self.histograms, self.events = {}, {}, []
+        return snapshot
+
+    def merge(self, snapshot):
+        """부모: 워커의 drain() 결과를 합칩니다."""
+        if not self.enabled or not snapshot:
+            return
+        with self._lock:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, histogram in snapshot["histograms"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                current = self.histograms.get(key)
+                if current is None:
+                    self.histograms[key] = histogram
+                    continue
+                current["counts"] = [a + b for a, b in zip(current["counts"], histogram["counts"])]
+                current["sum"] += histogram["sum"]
+                current["count"] += histogram["count"]
+            self.events.extend(snapshot["events"])
+            if self._file is not None and len(self.events) >= METRICS_CONFIG["FLUSH_EVERY"]:
+                self._flush_events()
+
+    # --- Output ---
+
+    def prometheus_text(self):
+        """Prometheus 텍스트 노출 형식"""
+        prefix = METRICS_CONFIG["PREFIX"]
+        lines = []
+
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def render(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (f'{key}="{escape(value)}"' for key, value in pairs)
+            return "{" + ",".join(escaped) + "}"
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{render(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            metric = f"{prefix}{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{metric}_bucket{render(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{render(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{metric}_sum{render(labels)} {round(histogram['sum'], 6)}")
+            lines.append(f"{metric}_count{render(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """남은 이벤트를 JSONL 로 내보내고 metrics.prom 을 씁니다."""
+        if not self.enabled or self._file is None:
+            return
+        with self._lock:
+            self._flush_events()
+            self._file.close()
+            self._file = None
+        path = os.path.join(self.output_dir, PROM_FILENAME)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(f"{path}.tmp", path)
+        print(f"Metrics saved to '{self.output_dir}' ({JSONL_FILENAME}, {PROM_FILENAME})")
+
+METRICS = Metrics()
+
+span = METRICS.span
+count = METRICS.count
+observe = METRICS.observe
+event = METRICS.event
+
+def add_arguments(parser, profile=False):
+    """--metrics DIR (+ --profile-page BOOK:PAGE) 인자를 추가합니다."""
+    parser.add_argument("--metrics", metavar="DIR", default=None,
+                        help="단계별 계측을 DIR/metrics.jsonl, DIR/metrics.prom 에 기록")
+    if profile:
+        parser.add_argument("--profile-page", metavar="BOOK:PAGE", default=None,
+                            help="--metrics 와 함께: 해당 페이지 처리 구간만 cProfile 로 기록 (예: 15:114)")
@@ -0,0 +1,212 @@
+import re
+import sys
+
+import fitz  # PyMuPDF
+
+# === 로컬 목차 추출 (Local-first TOC Extraction) ===
+# 모델 호출 전에 PyMuPDF 로 목차를 직접 추출해 봅니다.
+# 1) doc.get_toc() 북마크, 2) "제목 ..... 24" / "24 제목" 형태의 텍스트 레이아웃 휴리스틱
+# 결과는 format_toc_ranges 가 사용하는 [{"title", "page"}] 형식이며, 신뢰도(0~1)를 함께 반환합니다.
+# 목차 페이지 찾기(find_toc_pages): 모델에 문서 전체 대신 목차 페이지만 보내도록 (parse_pdf_toc.py --payload)
+#   페이지 점수 = 번호 붙은 줄 비율 / 페이지 번호 증가 비율 / 번호 오른쪽 끝 정렬 비율의 가중 합
+# ============================
+
+LOCAL_TOC_CONFIG = {
+    "CONFIDENCE_THRESHOLD": 0.8,  # 이 값 미만이면 모델(Gemini)로 대체
+    "MIN_ITEMS": 3,               # 항목이 이보다 적으면 신뢰도 0
+    "ROW_TOLERANCE": 3.0,         # 같은 줄로 묶을 세로 위치 차이 (pt)
+    "MAX_PAGE": 2000,             # 페이지 번호로 인정할 최댓값
+    "MIN_OUTLINE_DOC_PAGES": 20,  # 북마크를 신뢰할 최소 문서 페이지 수 (책 본문 PDF)
+}
+
+# 목차 페이지 탐지 / 모델 전송용 축소본 (find_toc_pages, build_toc_payload)
+TOC_PAGE_CONFIG = {
+    "MIN_SCORE": 0.6,             # 이 점수 이상인 페이지를 목차 페이지로 판단
+    "WEIGHTS": (0.4, 0.3, 0.3),   # (번호 붙은 줄 비율, 페이지 증가 비율, 번호 정렬 비율)
+    "ALIGN_TOLERANCE": 6.0,       # 페이지 번호 오른쪽 끝 x 좌표가 중앙값에서 이만큼(pt) 이내면 정렬된 것으로 봄
+    "MAX_GAP": 1,                 # 목차 페이지 사이에 낀 이 개수 이하의 페이지도 포함 (장 제목만 있는 쪽 등)
+    "IMAGE_LONG_SIDE": 1536,      # 이미지 전송 시 긴 변 픽셀 (렌더링 해상도)
+    "JPEG_QUALITY": 80,
+    "PDF_IMAGE_DPI": 150,         # PDF 전송 시 스캔 이미지 다운샘플 목표 DPI
+}
+
+# 제목 뒤의 점선/가운뎃점 등 리더 문자
+LEADER_CHARS = " .·…‥_-–—\t"
+TRAILING_NUMBER = re.compile(r"^(?P<title>.*?\S)[\s.·…‥_\-–—]*(?P<page>\d{1,4})$")
+LEADING_NUMBER = re.compile(r"^(?P<page>\d{1,4})[\s.·…‥_\-–—]+(?P<title>\S.*)$")
+
+def collect_row_spans(page, tolerance):
+    """
+    페이지의 텍스트 span 을 세로 위치 기준으로 한 줄(row)씩 묶습니다.
+    제목과 페이지 번호가 서로 다른 블록에 있어도 같은 줄로 합쳐집니다.
+    반환: 줄마다 x 순서로 정렬된 [(x0, text, x1), ...]
+    """
+    spans = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                text = span["text"].strip()
+                if text:
+                    x0, y0, x1, y1 = span["bbox"]
+                    spans.append(((y0 + y1) / 2, x0, text, x1))
+
+    rows = []
+    for y, x, text, x1 in sorted(spans):
+        if rows and abs(rows[-1]["y"] - y) <= tolerance:
+            rows[-1]["spans"].append((x, text, x1))
+        else:
+            rows.append({"y": y, "spans": [(x, text, x1)]})
+
+    return [sorted(row["spans"]) for row in rows]
+
+def collect_rows(page, tolerance):
+    """페이지의 줄(row) 텍스트 목록 (collect_row_spans 의 span 을 x 순서로 이어 붙임)"""
+    return [" ".join(text for _, text, _ in spans) for spans in collect_row_spans(page, tolerance)]
+
+def match_rows(rows, pattern, max_page):
+    items = []
+    for row in rows:
+        match = pattern.match(row)
+        if not match:
+            continue
+        title = match.group("title").strip(LEADER_CHARS)
+        page = int(match.group("page"))
+        if title and not title.isdigit() and 0 < page <= max_page:
+            items.append({"title": title, "page": page})
+    return items
+
+def score_items(items, candidate_rows):
+    """
+    신뢰도 = 0.5 * (번호가 붙은 줄 비율) + 0.5 * (읽는 순서대로 페이지가 증가하는 비율)
+    """
+    if len(items) < LOCAL_TOC_CONFIG["MIN_ITEMS"] or candidate_rows == 0:
+        return 0.0
+    coverage = min(1.0, len(items) / candidate_rows)
+    ordered = sum(1 for prev, cur in zip(items, items[1:]) if cur["page"] >= prev["page"]) / (len(items) - 1)
+    return round(0.5 * coverage + 0.5 * ordered, 3)
+
+def extract_from_outline(doc):
+    """
+    PDF 북마크(get_toc). 북마크 페이지는 PDF 내부 페이지 번호이므로,
+    목차만 담긴 짧은 PDF(-Content.pdf)에서는 책의 실제 페이지를 가리키지 않아 사용하지 않습니다.
+    """
+    outline = doc.get_toc()
+    if not outline:
+        return [], 0.0
+    items = [{"title": title.strip(), "page": page} for _, title, page in outline if title.strip() and page > 0]
+    if not items or len(doc) < LOCAL_TOC_CONFIG["MIN_OUTLINE_DOC_PAGES"]:
+        return [], 0.0
+    return items, score_items(items, len(items))
+
+def extract_from_layout(doc):
+    """텍스트 레이아웃 휴리스틱: 제목과 줄 끝(또는 줄 앞)의 페이지 번호를 짝지웁니다."""
+    rows = []
+    for page in doc:
+        rows.extend(collect_rows(page, LOCAL_TOC_CONFIG["ROW_TOLERANCE"]))
+
+    # 숫자만 있는 줄(쪽번호 등)과 한 글자짜리 줄은 후보에서 제외
+    candidate_rows = [row for row in rows if len(row) > 1 and not row.isdigit()]
+    best_items, best_score = [], 0.0
+    for pattern in (TRAILING_NUMBER, LEADING_NUMBER):
+        items = match_rows(candidate_rows, pattern, LOCAL_TOC_CONFIG["MAX_PAGE"])
+        score = score_items(items, len(candidate_rows))
+        if score > best_score:
+            best_items, best_score = items, score
+    return best_items, best_score
+
+def extract_toc_local(doc):
+    """
+    로컬 목차 추출. 반환: (items, confidence, method)
+    items 는 [{"title", "page"}] 형식이며 method 는 "outline" / "layout" / None
+    """
+    outline_items, outline_score = extract_from_outline(doc)
+    layout_items, layout_score = extract_from_layout(doc)
+
+    if outline_score >= layout_score and outline_items:
+        return outline_items, outline_score, "outline"
+    if layout_items:
+        return layout_items, layout_score, "layout"
+    return [], 0.0, None
+
+def score_toc_page(page):
+    """
+    페이지가 목차일 가능성 (0~1).
+    번호 붙은 줄 비율(밀도), 읽는 순서대로 페이지 번호가 증가하는 비율, 줄 끝 번호의 오른쪽 정렬 비율을 가중 합산합니다.
+    """
+    rows = collect_row_spans(page, LOCAL_TOC_CONFIG["ROW_TOLERANCE"])
+    texts = [" ".join(text for _, text, _ in spans) for spans in rows]
+    candidates = [(text, spans) for text, spans in zip(texts, rows) if len(text) > 1 and not text.isdigit()]
+    if not candidates:
+        return 0.0
+
+    best = 0.0
+    density_weight, order_weight, align_weight = TOC_PAGE_CONFIG["WEIGHTS"]
+    for pattern in (TRAILING_NUMBER, LEADING_NUMBER):
+        matched = [(item, spans) for text, spans in candidates
+                   for item in match_rows([text], pattern, LOCAL_TOC_CONFIG["MAX_PAGE"])]
+        if len(matched) < LOCAL_TOC_CONFIG["MIN_ITEMS"]:
+            continue
+        density = min(1.0, len(matched) / len(candidates))
+        pages = [item["page"] for item, _ in matched]
+        ordered = sum(1 for prev, cur in zip(pages, pages[1:]) if cur >= prev) / (len(pages) - 1)
+        # 번호 위치: 줄 끝 번호는 마지막 span 의 오른쪽 끝, 줄 앞 번호는 첫 span 의 왼쪽 끝
+        edges = sorted(spans[-1][2] if pattern is TRAILING_NUMBER else spans[0][0] for _, spans in matched)
+        median = edges[len(edges) // 2]
+        aligned = sum(1 for edge in edges if abs(edge - median) <= TOC_PAGE_CONFIG["ALIGN_TOLERANCE"]) / len(edges)
+        best = max(best, density_weight * density + order_weight * ordered + align_weight * aligned)
+    return round(best, 3)
+
+def find_toc_pages(doc, min_score=None):
+    """
+    목차 페이지 번호 목록(0부터)과 페이지별 점수를 반환합니다. 못 찾으면 빈 목록 (스캔본 등 텍스트 없는 PDF).
+    점수가 min_score 이상인 페이지와, 그 사이에 낀 MAX_GAP 쪽 이하의 페이지를 목차로 봅니다.
+    """
+    min_score = TOC_PAGE_CONFIG["MIN_SCORE"] if min_score is None else min_score
+    scores = [score_toc_page(page) for page in doc]
+    hits = [index for index, score in enumerate(scores) if score >= min_score]
+    pages = []
+    for index in hits:
+        if pages and index - pages[-1] - 1 <= TOC_PAGE_CONFIG["MAX_GAP"]:
+            pages.extend(range(pages[-1] + 1, index))
+        pages.append(index)
+    return pages, scores
+
+def build_toc_payload(doc, pages, mode="pdf"):
+    """
+    목차 페이지만 담은 모델 전송용 바이트. 반환: [(bytes, mime_type), ...]
+      pdf  : 해당 페이지만 잘라낸 PDF 하나 (스캔 이미지는 PDF_IMAGE_DPI 로 다운샘플)
+      image: 페이지마다 긴 변 IMAGE_LONG_SIDE 픽셀의 JPEG
+    """
+    if mode == "image":
+        parts = []
+        for index in pages:
+            page = doc[index]
+            zoom = TOC_PAGE_CONFIG["IMAGE_LONG_SIDE"] / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+            parts.append((pix.tobytes("jpeg", jpg_quality=TOC_PAGE_CONFIG["JPEG_QUALITY"]), "image/jpeg"))
+        return parts
+
+    subset = fitz.open()
+    for index in pages:
+        subset.insert_pdf(doc, from_page=index, to_page=index)
+    dpi = TOC_PAGE_CONFIG["PDF_IMAGE_DPI"]
+    subset.rewrite_images(dpi_threshold=dpi + 1, dpi_target=dpi, quality=TOC_PAGE_CONFIG["JPEG_QUALITY"])
+    data = subset.tobytes(garbage=3, deflate=True)
+    subset.close()
+    return [(data, "application/pdf")]
+
+def extract_toc_local_from_bytes(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return extract_toc_local(doc)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python local_toc.py <Content.pdf>")
+    else:
+        with fitz.open(sys.argv[1]) as doc:
+            items, confidence, method = extract_toc_local(doc)
+            toc_pages, scores = find_toc_pages(doc)
+        print(f"Method: {method}, Confidence: {confidence}, Items: {len(items)}")
+        print(f"TOC pages: {[index + 1 for index in toc_pages]} of {len(scores)} (scores: {scores})")
+        for item in items:
+            print(f"  {item['page']:>4} : {item['title']}")
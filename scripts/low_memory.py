@@ -0,0 +1,294 @@
+import argparse
+import contextlib
+import gc
+import json
+import mmap
+import multiprocessing
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from instrumentation import count, event
+
+# === 저메모리 모드 (Bounded-memory Mode) ===
+# 수천 페이지짜리 PDF 를 처리해도 메모리가 페이지 수에 비례해 늘지 않도록 합니다.
+#   open_document(path)  PDF 를 mmap 으로 열어 fitz 에 스트림으로 넘깁니다. (파일을 메모리로 복사하지 않음)
+#   MemoryGovernor       페이지를 처리할 때마다 page_done() 을 호출합니다.
+#                        SHRINK_EVERY 페이지마다 MuPDF 리소스 저장소(기본 최대 256MB)를 비우고,
+#                        비공유 RSS 가 RSS_LIMIT_MB 를 넘으면 저장소 비우기 -> gc -> 압박 처리기(on_pressure) 순으로
+#                        메모리를 돌려받습니다. 압박 처리기는 쓰기 큐가 빌 때까지 추출을 멈추는 등 역압(backpressure)을 겁니다.
+#   SpillSet             중복 제거용 해시 집합. 최근 항목만 메모리에 두고 전체는 SQLite 파일에 둡니다.
+# RSS 상한은 비공유(익명) 메모리 기준입니다. mmap 한 PDF 페이지는 RSS 에 잡히지만 커널이 언제든 회수할 수 있는
+# 페이지 캐시이므로 상한 계산에서 제외하고, 저장소를 비울 때 MADV_DONTNEED 로 함께 내려놓습니다.
+# ============================
+
+LOW_MEMORY_CONFIG = {
+    "RSS_LIMIT_MB": 512,         # 비공유 RSS 상한 (프로세스 단위, --parallel 이면 워커마다)
+    "SHRINK_EVERY": 16,          # MuPDF 저장소를 비우는 페이지 간격 (0 이면 상한을 넘었을 때만)
+    "CHECK_EVERY": 4,            # RSS 를 확인하는 페이지 간격
+    "HASHES_IN_MEMORY": 4096,    # SpillSet 이 메모리에 두는 최근 해시 수
+}
+
+# 벤치마크용 합성 PDF: 페이지 수만 바꾸고 나머지는 고정 (페이지당 이미지 1장, 가벼운 본문)
+BENCH_SPEC = {"images_per_page": 1, "image_size": [260, 240], "noise_ratio": 0.4, "drawings_per_page": 10,
+              "table_ratio": 0.0, "text_lines": 10}
+BENCH_PAGES = [100, 1000, 5000]
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_mb():
+    """
+    반환: (전체 RSS, 비공유 RSS) MB. 비공유 RSS 는 /proc/self/statm 의 resident - shared 입니다.
+    /proc 가 없는 환경에서는 둘 다 최대 RSS(ru_maxrss) 로 대신합니다.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            fields = f.read().split()
+        resident, shared = int(fields[1]) * PAGE_SIZE, int(fields[2]) * PAGE_SIZE
+        return resident / (1024 * 1024), (resident - shared) / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return peak, peak
+
+def private_rss_mb():
+    """비공유 RSS (MB)"""
+    return rss_mb()[1]
+
+def open_document(pdf_path, governor=None):
+    """
+    PDF 를 읽기 전용 mmap 으로 열어 fitz 문서를 반환합니다.
+    문서가 mmap 의 memoryview 를 참조하므로 문서가 살아 있는 동안 매핑도 유지됩니다.
+    governor 를 넘기면 저장소를 비울 때 이미 읽은 매핑 페이지도 RSS 에서 내려놓습니다.
+    """
+    with open(pdf_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if governor is not None:
+        governor.track(mapped)
+    return fitz.open(stream=memoryview(mapped), filetype="pdf")
+
+class MemoryGovernor:
+    """
+    페이지 단위 메모리 관리. 추출 루프는 페이지마다 page_done() 을 호출합니다.
+    on_pressure: RSS 가 상한을 넘었을 때 순서대로 호출할 함수 목록 (하나 호출할 때마다 다시 측정)
+    """
+
+    def __init__(self, limit_mb=None, shrink_every=None, on_pressure=()):
+        self.limit_mb = limit_mb or LOW_MEMORY_CONFIG["RSS_LIMIT_MB"]
+        self.shrink_every = LOW_MEMORY_CONFIG["SHRINK_EVERY"] if shrink_every is None else shrink_every
+        self.on_pressure = list(on_pressure)
+        self._mappings = []
+        self.stats = {"limit_mb": self.limit_mb, "pages": 0, "peak_mb": 0.0, "shrinks": 0,
+                      "pressure": 0, "over_limit": 0, "wait_seconds": 0.0}
+
+    def track(self, mapped):
+        """open_document 의 mmap 을 등록합니다. (문서를 닫은 뒤의 매핑은 건너뜀)"""
+        self._mappings = [m for m in self._mappings if not m.closed] + [mapped]
+
+    def page_done(self):
+        self.stats["pages"] += 1
+        pages = self.stats["pages"]
+        if self.shrink_every and pages % self.shrink_every == 0:
+            self._shrink()
+        if pages % LOW_MEMORY_CONFIG["CHECK_EVERY"] == 0:
+            self.check()
+
+    def _shrink(self):
+        fitz.TOOLS.store_shrink(100)
+        if hasattr(mmap, "MADV_DONTNEED"):
+            for mapped in self._mappings:
+                # 읽기 전용 파일 매핑: 페이지는 페이지 캐시에 남고, 다시 읽으면 그대로 들어옵니다.
+                mapped.madvise(mmap.MADV_DONTNEED)
+        self.stats["shrinks"] += 1
+
+    def check(self):
+        """RSS 를 확인하고, 상한을 넘었으면 메모리를 돌려받습니다. 반환: 현재 비공유 RSS (MB)"""
+        rss = private_rss_mb()
+        self.stats["peak_mb"] = max(self.stats["peak_mb"], rss)
+        if rss <= self.limit_mb:
+            return rss
+
+        self.stats["pressure"] += 1
+        count("memory_pressure")
+        started = time.perf_counter()
+        self._shrink()
+        gc.collect()
+        rss = private_rss_mb()
+        for handler in self.on_pressure:
+            if rss <= self.limit_mb:
+                break
+            handler()
+            rss = private_rss_mb()
+        self.stats["wait_seconds"] += time.perf_counter() - started
+
+        if rss > self.limit_mb:
+            # 돌려받을 메모리가 없음: 계속 진행하되 기록 (상한이 작업에 비해 너무 낮음)
+            self.stats["over_limit"] += 1
+            count("memory_over_limit")
+        return rss
+
+    def summary(self):
+        stats = dict(self.stats, peak_mb=round(self.stats["peak_mb"], 1), wait_seconds=round(self.stats["wait_seconds"], 3))
+        event("memory.summary", **stats)
+        return stats
+
+class SpillSet:
+    """
+    디스크(SQLite)에 넘기는 해시 집합. set 처럼 in / add / len 을 지원합니다.
+    최근 HASHES_IN_MEMORY 개만 메모리(LRU)에 두며, 추가분은 commit() 때 파일에 확정됩니다.
+    (체크포인트와 같은 시점에 commit 하면 재개 시 상태 파일과 어긋나지 않습니다)
+    """
+
+    def __init__(self, path, memory_items=None):
+        self.path = path
+        self.memory_items = memory_items or LOW_MEMORY_CONFIG["HASHES_IN_MEMORY"]
+        self._recent = OrderedDict()
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS hashes (hash TEXT PRIMARY KEY)")
+
+    def __contains__(self, value):
+        if value in self._recent:
+            self._recent.move_to_end(value)
+            return True
+        found = self._db.execute("SELECT 1 FROM hashes WHERE hash = ?", (value,)).fetchone() is not None
+        if found:
+            self._remember(value)
+        return found
+
+    def add(self, value):
+        self._db.execute("INSERT OR IGNORE INTO hashes (hash) VALUES (?)", (value,))
+        self._remember(value)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def _remember(self, value):
+        self._recent[value] = True
+        self._recent.move_to_end(value)
+        if len(self._recent) > self.memory_items:
+            self._recent.popitem(last=False)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self._db.execute("SELECT hash FROM hashes"))
+
+    def clear(self):
+        self._db.execute("DELETE FROM hashes")
+        self._db.commit()
+        self._recent.clear()
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+# --- Benchmark ---
+
+class _RssSampler(threading.Thread):
+    """
+    벤치마크 워커: 일정 간격으로 전체/비공유 RSS 를 재서 최댓값을 기록합니다.
+    (spawn 워커의 ru_maxrss 는 exec 전 부모 복사본의 RSS 까지 포함하므로 쓰지 않습니다)
+    """
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_mb = self.peak_private_mb = 0.0
+        self._stop_event = threading.Event()
+
+    def _sample(self):
+        total, private = rss_mb()
+        self.peak_mb = max(self.peak_mb, total)
+        self.peak_private_mb = max(self.peak_private_mb, private)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._sample()
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self._sample()
+
+def _bench_worker(pdf_path, output_dir, limit_mb):
+    """새 프로세스에서 extract_images_from_pdf 를 실행합니다. limit_mb 가 None 이면 기본 경로."""
+    from extract_images import extract_images_from_pdf
+
+    sampler = _RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = extract_images_from_pdf(pdf_path, output_dir, memory_limit_mb=limit_mb)
+    seconds = time.perf_counter() - started
+    sampler.stop()
+    return {
+        "seconds": round(seconds, 2),
+        "extracted": stats["extracted"],
+        "peak_private_mb": round(sampler.peak_private_mb, 1),
+        "peak_rss_mb": round(sampler.peak_mb, 1),
+        "memory": stats.get("memory"),
+    }
+
+def benchmark(work_dir, page_counts=None, limit_mb=None):
+    """
+    페이지 수별 합성 PDF 로 기본 경로와 저메모리 경로의 최대 메모리를 비교합니다.
+    반환: [{"pages", "pdf_mb", "default": 측정값, "low_memory": 측정값}, ...]
+    """
+    from synthetic_pdf import generate_book
+
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    for pages in page_counts or BENCH_PAGES:
+        pdf_path = os.path.join(work_dir, f"synthetic_{pages}.pdf")
+        if not os.path.exists(pdf_path):
+            print(f"Generating {pdf_path} ({pages} pages)...")
+            generate_book(pdf_path, {**BENCH_SPEC, "pages": pages})
+        row = {"pages": pages, "pdf_mb": round(os.path.getsize(pdf_path) / (1024 * 1024), 1)}
+        for mode, limit in (("default", None), ("low_memory", limit_mb or LOW_MEMORY_CONFIG["RSS_LIMIT_MB"])):
+            output_dir = os.path.join(work_dir, f"out_{pages}_{mode}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                row[mode] = executor.submit(_bench_worker, pdf_path, output_dir, limit).result()
+            shutil.rmtree(output_dir, ignore_errors=True)
+        results.append(row)
+        print(f"  {pages:>6} pages ({row['pdf_mb']:6.1f} MB PDF)  "
+              f"default: private {row['default']['peak_private_mb']:6.1f} MB, RSS {row['default']['peak_rss_mb']:6.1f} MB, "
+              f"{row['default']['seconds']:6.1f}s  |  "
+              f"low-memory: private {row['low_memory']['peak_private_mb']:6.1f} MB, RSS {row['low_memory']['peak_rss_mb']:6.1f} MB, "
+              f"{row['low_memory']['seconds']:6.1f}s")
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="저메모리 모드 벤치마크 (페이지 수별 최대 메모리 비교)")
+    parser.add_argument("--pages", default=",".join(map(str, BENCH_PAGES)), help="쉼표 구분 페이지 수")
+    parser.add_argument("--limit", type=int, default=None, help="저메모리 경로의 RSS 상한 (MB)")
+    parser.add_argument("--work-dir", default=None, help="합성 PDF/출력 작업 폴더 (기본값: 임시 폴더, 실행 후 삭제)")
+    parser.add_argument("--output", default=None, metavar="REPORT_JSON", help="결과를 JSON 으로 저장")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_low_memory_")
+    try:
+        report = benchmark(work_dir, [int(pages) for pages in args.pages.split(",")], args.limit)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
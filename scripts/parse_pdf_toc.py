@@ -1,85 +1,482 @@
-
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
-from google.cloud import storage
+import asyncio
+import argparse
+import hashlib
 import json
 import os
 import re
+import sys
+import time
+from types import SimpleNamespace
+
+from extraction_state import fingerprint_config
+from image_index import normalize_book_id
+from instrumentation import METRICS, add_arguments as add_metrics_arguments, count, span
+from local_toc import (LOCAL_TOC_CONFIG, TOC_PAGE_CONFIG, build_toc_payload, extract_toc_local,
+                       extract_toc_local_from_bytes, find_toc_pages)
+from storage_backends import file_md5_base64
+from toc_index import count_book_pages
+
+# vertexai / google-cloud-storage 는 실제 호출 시점에만 import 합니다.
+# (스텁 모델로 드라이버를 오프라인 테스트할 수 있도록)
 
 # 설정
 PROJECT_ID = "rag-bighistory"  # GCP 프로젝트 ID
 LOCATION = "us-central1"
 BUCKET_NAME = "20set-bighistory-raw"
 OUTPUT_FILE = "toc_analysis_results.json"
+LOCAL_REPORT_FILE = "toc_local_report.json"
+MODEL_REPORT_FILE = "toc_model_report.json"
+MODEL_NAME = "gemini-2.5-pro"
 
-def get_gcs_pdf_files(bucket_name):
-    """GCS 버킷에서 _Content.pdf 로 끝나는 파일 목록을 가져옵니다."""
+# 비동기 배치 설정
+BATCH_CONFIG = {
+    "CONCURRENCY": 4,             # 동시에 진행할 모델 호출 수
+    "REQUESTS_PER_MINUTE": 30,    # 모델 호출 속도 제한
+    "CACHE_DIR": ".toc_cache",    # 응답 캐시 폴더
+    "PAYLOAD": "pdf",             # 모델에 보낼 내용: full(문서 전체) / pdf(목차 페이지만 자른 PDF) / image(목차 페이지 JPEG)
+}
+
+PAYLOAD_MODES = ("full", "pdf", "image")
+
+# 스텁 모델 (--stub): Gemini 입력 토큰 규칙 근사와 모의 지연
+STUB_CONFIG = {
+    "PDF_PAGE_TOKENS": 258,        # PDF 페이지당 토큰
+    "IMAGE_TILE": 768,             # 큰 이미지는 768px 타일 단위로 과금
+    "IMAGE_TILE_TOKENS": 258,      # 타일(또는 384px 이하 작은 이미지)당 토큰
+    "SMALL_IMAGE": 384,
+    "CHARS_PER_TOKEN": 4,          # 프롬프트 텍스트
+    "BASE_LATENCY_S": 0.05,        # 호출당 고정 지연
+    "SECONDS_PER_1K_TOKENS": 0.05, # 입력 토큰 1천 개당 추가 지연
+}
+
+TOC_PROMPT = """
+    You are a helpful assistant that extracts table of contents from a book PDF.
+    
+    Task:
+    1. Look at the provided document image (Table of Contents).
+    2. Extract every chapter title and its starting page number.
+    3. Return the result as a raw JSON list. Do not include markdown formatting (```json ... ```).
+    
+    JSON Format:
+    [
+        {"title": "Chapter Title 1", "page": 5},
+        {"title": "Chapter Title 2", "page": 12}
+    ]
+    
+    Constraint: Include all items like '서문', '추천사', '타임라인' if they appear with page numbers.
+    """
+
+def blob_content_hash(blob):
+    """
+    GCS 객체의 캐시용 내용 해시. md5(base64) 가 기본이며, md5 가 없는 합성(composite) 객체는
+    crc32c, 그것도 없으면 객체 세대(generation)로 대신합니다. (세대는 내용이 바뀔 때마다 바뀜)
+    """
+    if blob.md5_hash:
+        return blob.md5_hash
+    if blob.crc32c:
+        return f"crc32c:{blob.crc32c}"
+    if blob.generation:
+        return f"gs://{blob.bucket.name}/{blob.name}#{blob.generation}"
+    return None
+
+def get_gcs_pdf_blobs(bucket_name):
+    """GCS 버킷에서 -Content.pdf / _Content.pdf 파일의 URI 와 내용 해시(blob_content_hash) 목록을 가져옵니다."""
     try:
+        from google.cloud import storage
+
         storage_client = storage.Client(project=PROJECT_ID)
         bucket = storage_client.bucket(bucket_name)
         blobs = bucket.list_blobs()
-        
+
         pdf_files = []
         for blob in blobs:
             # -Content.pdf (실제 버킷) 또는 _Content.pdf (예시) 모두 지원
             if blob.name.endswith("-Content.pdf") or blob.name.endswith("_Content.pdf"):
-                pdf_files.append(f"gs://{bucket_name}/{blob.name}")
-                
+                pdf_files.append({"uri": f"gs://{bucket_name}/{blob.name}", "content_hash": blob_content_hash(blob)})
+
         return pdf_files
     except Exception as e:
         print(f"Error accessing GCS: {e}")
         return []
 
+def get_gcs_pdf_files(bucket_name):
+    """GCS 버킷에서 _Content.pdf 로 끝나는 파일 목록을 가져옵니다."""
+    return [pdf["uri"] for pdf in get_gcs_pdf_blobs(bucket_name)]
+
+def build_document_part(gcs_uri):
+    """GCS URI에서 직접 Part 생성 (로컬 경로는 바이트를 인라인으로 전송)"""
+    from vertexai.generative_models import Part
+    if not gcs_uri.startswith("gs://"):
+        with open(gcs_uri, "rb") as f:
+            return Part.from_data(data=f.read(), mime_type="application/pdf")
+    return Part.from_uri(uri=gcs_uri, mime_type="application/pdf")
+
+def prepare_payload(pdf_bytes, mode):
+    """
+    모델에 보낼 바이트 목록. mode 가 pdf/image 이면 목차 페이지만 잘라 보내고,
+    full 이거나 목차 페이지를 찾지 못하면(스캔본 등) 문서 전체를 보냅니다. (info["mode"] 가 "full")
+    반환: ([(bytes, mime_type), ...], {"mode", "page_count", "pages_sent", "toc_pages", "bytes"})
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = len(doc)
+        toc_pages = find_toc_pages(doc)[0] if mode != "full" else []
+        if toc_pages:
+            parts = build_toc_payload(doc, toc_pages, mode)
+        else:
+            mode = "full"
+            parts = [(pdf_bytes, "application/pdf")]
+    info = {"mode": mode, "page_count": page_count, "pages_sent": len(toc_pages) or page_count,
+            "toc_pages": [index + 1 for index in toc_pages], "bytes": sum(len(data) for data, _ in parts)}
+    return parts, info
+
+def payload_config_fingerprint():
+    """목차 페이지 검출/잘라내기 설정 지문 (pdf/image 응답 캐시 키에 포함, 설정이 바뀌면 다시 호출)"""
+    detection = {key: LOCAL_TOC_CONFIG[key] for key in ("ROW_TOLERANCE", "MIN_ITEMS", "MAX_PAGE")}
+    return fingerprint_config({"toc_page": TOC_PAGE_CONFIG, "detection": detection})
+
+def vertex_part(data, mime_type):
+    from vertexai.generative_models import Part
+    return Part.from_data(data=data, mime_type=mime_type)
+
+class InlinePart:
+    """스텁 모델용 인라인 파트 (vertexai Part.from_data 와 같은 data / mime_type)"""
+
+    def __init__(self, data, mime_type):
+        self.data = data
+        self.mime_type = mime_type
+
+def payload_document_factory(mode, part_factory=None, pdf_loader=None, payloads=None):
+    """
+    run_toc_batch 의 document_factory.
+    mode 가 full 이고 part_factory 가 없으면 기존 build_document_part (gs:// 는 from_uri, 내려받지 않음).
+    그 외에는 PDF 를 받아 prepare_payload 결과를 인라인 파트 목록으로 만듭니다.
+    목차 페이지를 찾지 못해 문서 전체를 보내야 하면, part_factory 가 없을 때(Vertex AI) build_document_part 로
+    돌아갑니다. 큰 스캔본 PDF 를 인라인 요청 한도를 넘겨 보내지 않도록 gs:// 는 from_uri 로 참조합니다.
+    payloads: {uri: prepare_payload 정보} 를 기록할 dict
+    """
+    if mode == "full" and part_factory is None:
+        return build_document_part
+    by_reference = part_factory is None
+    part_factory = part_factory or vertex_part
+    pdf_loader = pdf_loader or load_pdf_bytes
+
+    def factory(uri):
+        with span("toc.payload", uri=uri, mode=mode):
+            parts, info = prepare_payload(pdf_loader(uri), mode)
+        if payloads is not None:
+            payloads[uri] = info
+        if info["mode"] == "full" and by_reference:
+            return build_document_part(uri)
+        return [part_factory(data, mime_type) for data, mime_type in parts]
+    return factory
+
+class StubModel:
+    """
+    오프라인 테스트용 모델: generate_content(contents, generation_config) 만 흉내냅니다.
+    - usage_metadata.prompt_token_count: STUB_CONFIG 의 Gemini 과금 규칙 근사
+    - 지연: BASE_LATENCY_S + 입력 토큰 1천 개당 SECONDS_PER_1K_TOKENS (time.sleep)
+    - 응답: PDF 파트는 local_toc 로 읽은 목차, 이미지 파트만 받으면 answer (기본 빈 목록)
+    """
+
+    def __init__(self, answer=None, sleep=True):
+        self.answer = answer or []
+        self.sleep = sleep
+
+    @staticmethod
+    def count_tokens(contents):
+        import fitz  # PyMuPDF
+
+        tokens = 0
+        for part in contents:
+            if isinstance(part, str):
+                tokens += len(part) // STUB_CONFIG["CHARS_PER_TOKEN"]
+            elif part.mime_type == "application/pdf":
+                with fitz.open(stream=part.data, filetype="pdf") as doc:
+                    tokens += len(doc) * STUB_CONFIG["PDF_PAGE_TOKENS"]
+            else:
+                pix = fitz.Pixmap(part.data)
+                if max(pix.width, pix.height) <= STUB_CONFIG["SMALL_IMAGE"]:
+                    tiles = 1
+                else:
+                    tile = STUB_CONFIG["IMAGE_TILE"]
+                    tiles = -(-pix.width // tile) * -(-pix.height // tile)
+                tokens += tiles * STUB_CONFIG["IMAGE_TILE_TOKENS"]
+        return tokens
+
+    def generate_content(self, contents, generation_config=None):
+        import fitz  # PyMuPDF
+
+        tokens = self.count_tokens(contents)
+        if self.sleep:
+            time.sleep(STUB_CONFIG["BASE_LATENCY_S"] + tokens / 1000 * STUB_CONFIG["SECONDS_PER_1K_TOKENS"])
+        items = []
+        for part in contents:
+            if not isinstance(part, str) and part.mime_type == "application/pdf":
+                with fitz.open(stream=part.data, filetype="pdf") as doc:
+                    items.extend(extract_toc_local(doc)[0])
+        text = json.dumps(items or self.answer, ensure_ascii=False)
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=tokens, candidates_token_count=len(text) // STUB_CONFIG["CHARS_PER_TOKEN"]))
+
+def parse_toc_response(raw_response):
+    """모델 응답 텍스트를 [{title, page}] 리스트로 파싱합니다."""
+    raw_response = raw_response.strip()
+
+    if raw_response.startswith("```json"):
+        raw_response = raw_response[7:-3]
+    elif raw_response.startswith("```"): # 가끔 언어 지정 없이 백틱만 올 때 처리
+        raw_response = raw_response[3:-3]
+
+    return json.loads(raw_response)
+
 def parse_toc_pdf_from_gcs(gcs_uri, model):
     """
     GCS URI에 있는 PDF를 Gemini로 분석합니다.
     """
     print(f"Processing: {gcs_uri}...")
-    
-    prompt = """
-    You are a helpful assistant that extracts table of contents from a book PDF.
-    
-    Task:
-    1. Look at the provided document image (Table of Contents).
-    2. Extract every chapter title and its starting page number.
-    3. Return the result as a raw JSON list. Do not include markdown formatting (```json ... ```).
-    
-    JSON Format:
-    [
-        {"title": "Chapter Title 1", "page": 5},
-        {"title": "Chapter Title 2", "page": 12}
-    ]
-    
-    Constraint: Include all items like '서문', '추천사', '타임라인' if they appear with page numbers.
-    """
-    
+
     try:
-        # GCS URI에서 직접 Part 생성
-        document = Part.from_uri(uri=gcs_uri, mime_type="application/pdf")
+        document = build_document_part(gcs_uri)
 
         # 모델 호출
         responses = model.generate_content(
-            [document, prompt],
+            [document, TOC_PROMPT],
             generation_config={"response_mime_type": "application/json"}
         )
         
-        raw_response = responses.text.strip()
-        
-        # JSON 파싱
-        if raw_response.startswith("```json"):
-            raw_response = raw_response[7:-3]
-        elif raw_response.startswith("```"): # 가끔 언어 지정 없이 백틱만 올 때 처리
-            raw_response = raw_response[3:-3]
-            
-        toc_data = json.loads(raw_response)
-        return toc_data
+        return parse_toc_response(responses.text)
     except Exception as e:
         print(f"Failed to process {gcs_uri}: {e}")
         return []
 
-def format_toc_ranges(toc_data):
+class ResponseCache:
+    """
+    모델 응답 디스크 캐시. 키 = sha256(PDF 내용 해시 + 프롬프트 + 모델 이름)
+    PDF 나 프롬프트, 모델이 바뀌지 않은 책은 모델을 다시 호출하지 않습니다.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(content_hash, prompt, model_name):
+        return hashlib.sha256(f"{content_hash}\n{prompt}\n{model_name}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["response"]
+
+    def put(self, key, source, response_text):
+        tmp_path = f"{self._path(key)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "response": response_text}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+
+class RateLimiter:
+    """요청 사이 최소 간격을 보장하는 비동기 속도 제한기 (requests_per_minute)"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def generate_content_async(model, contents):
+    """
+    모델 호출. generate_content_async 가 있으면 사용하고, 없으면(스텁 등) 스레드에서 동기 호출합니다.
+    """
+    generation_config = {"response_mime_type": "application/json"}
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(contents, generation_config=generation_config)
+    return await asyncio.to_thread(model.generate_content, contents, generation_config=generation_config)
+
+def usage_tokens(response):
+    """응답의 (입력 토큰, 출력 토큰). usage_metadata 가 없으면 (None, None)"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+
+async def parse_toc_async(target, model, model_name, cache, semaphore, limiter, stats, document_factory, payload="full"):
+    """
+    책 하나의 목차를 분석합니다. 캐시에 있으면 모델을 호출하지 않습니다.
+    target: {"uri", "content_hash"}
+    모델을 호출하면 stats["per_book"][uri] 에 입력/출력 토큰과 지연(초)을 기록합니다.
+    """
+    uri = target["uri"]
+    # 문서 전체(full) 키는 이전 캐시와 호환되도록 그대로 둡니다.
+    content_key = target.get("content_hash") or uri
+    if payload != "full":
+        content_key = f"{content_key}:{payload}:{payload_config_fingerprint()}"
+    key = ResponseCache.key(content_key, TOC_PROMPT, model_name) if cache else None
+
+    try:
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            stats["cache_hits"] += 1
+            count("toc_cache_hits")
+            return uri, parse_toc_response(cached)
+
+        async with semaphore:
+            await limiter.wait()
+            print(f"Processing: {uri}...")
+            stats["model_calls"] += 1
+            count("toc_model_calls", model=model_name)
+            parts = await asyncio.to_thread(document_factory, uri)
+            started = time.perf_counter()
+            with span("toc.model", uri=uri, model=model_name, payload=payload):
+                response = await generate_content_async(model, (parts if isinstance(parts, list) else [parts]) + [TOC_PROMPT])
+            latency = time.perf_counter() - started
+
+        input_tokens, output_tokens = usage_tokens(response)
+        stats["per_book"][uri] = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                  "latency_s": round(latency, 3)}
+        if input_tokens is not None:
+            stats["input_tokens"] += input_tokens
+            count("toc_input_tokens", input_tokens, model=model_name, payload=payload)
+        toc_data = parse_toc_response(response.text)
+        if cache:
+            cache.put(key, uri, response.text)
+        return uri, toc_data
+    except Exception as e:
+        stats["failed"] += 1
+        count("toc_failures")
+        print(f"Failed to process {uri}: {e}")
+        return uri, []
+
+async def run_toc_batch(targets, model, model_name=MODEL_NAME, concurrency=None, requests_per_minute=None,
+                        cache=None, document_factory=build_document_part, payload="full"):
+    """
+    여러 목차 PDF 를 동시성 제한/속도 제한 하에 병렬로 분석합니다.
+    payload: document_factory 가 보내는 내용 (캐시 키와 계측 라벨에 사용, payload_document_factory 참고)
+    반환: ({uri: toc_data}, 통계) - 통계의 per_book 은 책별 토큰/지연
+    """
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONFIG["CONCURRENCY"])
+    limiter = RateLimiter(requests_per_minute if requests_per_minute is not None else BATCH_CONFIG["REQUESTS_PER_MINUTE"])
+    stats = {"books": len(targets), "cache_hits": 0, "model_calls": 0, "failed": 0, "input_tokens": 0, "per_book": {}}
+
+    results = await asyncio.gather(*[
+        parse_toc_async(target, model, model_name, cache, semaphore, limiter, stats, document_factory, payload)
+        for target in targets
+    ])
+    return dict(results), stats
+
+def run_payload_batch(targets, model, model_name, payload, args, cache=None, part_factory=None):
+    """payload 방식으로 배치를 실행하고 책별 통계에 보낸 페이지/바이트를 합칩니다."""
+    payloads = {}
+    factory = payload_document_factory(payload, part_factory, payloads=payloads)
+    with span("toc.batch", books=len(targets), payload=payload):
+        results, stats = asyncio.run(run_toc_batch(targets, model, model_name, args.concurrency, args.rpm, cache,
+                                                   factory, payload))
+    for uri, info in payloads.items():
+        stats["per_book"].setdefault(uri, {}).update(info)
+    return results, stats
+
+def compare_payloads(targets, model, model_name, payload, args, part_factory=None):
+    """
+    같은 책들을 문서 전체(full)와 payload 로 각각 호출하여 (캐시 없이) 책별 입력 토큰/지연을 비교합니다.
+    """
+    report = {"payload": payload, "per_book": {}}
+    totals = {}
+    for mode in ("full", payload):
+        results, stats = run_payload_batch(targets, model, model_name, mode, args, None, part_factory)
+        totals[mode] = {"input_tokens": stats["input_tokens"],
+                        "latency_s": round(sum(book.get("latency_s", 0) for book in stats["per_book"].values()), 3),
+                        "failed": stats["failed"]}
+        for uri, book in stats["per_book"].items():
+            report["per_book"].setdefault(uri, {})[mode] = dict(book, items=len(results.get(uri) or []))
+    report["totals"] = totals
+
+    print(f"{'book':<28} {'full tokens':>11} {payload + ' tokens':>12} {'full s':>7} {payload + ' s':>8}  pages sent")
+    for uri, book in report["per_book"].items():
+        before, after = book.get("full", {}), book.get(payload, {})
+        print(f"{os.path.basename(uri):<28} {before.get('input_tokens') or 0:>11} {after.get('input_tokens') or 0:>12} "
+              f"{before.get('latency_s', 0):>7.2f} {after.get('latency_s', 0):>8.2f}  "
+              f"{after.get('pages_sent', '?')}/{after.get('page_count', '?')} {after.get('toc_pages', '')}")
+    print(f"Total input tokens: full {totals['full']['input_tokens']} -> {payload} {totals[payload]['input_tokens']}, "
+          f"model time {totals['full']['latency_s']:.2f}s -> {totals[payload]['latency_s']:.2f}s")
+    return report
+
+def load_gcs_pdf_bytes(gcs_uri):
+    """gs://bucket/name 의 PDF 바이트를 내려받습니다."""
+    from google.cloud import storage
+
+    bucket_name, blob_name = gcs_uri[len("gs://"):].split("/", 1)
+    return storage.Client(project=PROJECT_ID).bucket(bucket_name).blob(blob_name).download_as_bytes()
+
+def get_local_pdf_files(pdf_dir):
+    """
+    로컬 폴더의 -Content.pdf / _Content.pdf 목록 (GCS 목록과 같은 형식)
+    내용 해시는 GCS md5_hash 와 같은 base64 md5 이므로, 같은 PDF 는 로컬/GCS 어디서 읽어도 캐시 키가 같습니다.
+    """
+    pdf_files = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.endswith("-Content.pdf") or name.endswith("_Content.pdf"):
+            path = os.path.join(pdf_dir, name)
+            pdf_files.append({"uri": path, "content_hash": file_md5_base64(path)})
+    return pdf_files
+
+def load_pdf_bytes(uri):
+    if uri.startswith("gs://"):
+        return load_gcs_pdf_bytes(uri)
+    with open(uri, "rb") as f:
+        return f.read()
+
+def resolve_toc_local_first(targets, threshold=None, pdf_loader=load_pdf_bytes):
+    """
+    PyMuPDF 로 목차를 먼저 추출하고, 신뢰도가 threshold 미만인 책만 모델 대상으로 남깁니다.
+    반환: ({uri: toc_data} 로컬 결과, 모델로 보낼 targets, 리포트)
+    """
+    threshold = LOCAL_TOC_CONFIG["CONFIDENCE_THRESHOLD"] if threshold is None else threshold
+    local_results, fallback, books = {}, [], {}
+
+    for target in targets:
+        uri = target["uri"]
+        try:
+            with span("toc.local", uri=uri):
+                items, confidence, method = extract_toc_local_from_bytes(pdf_loader(uri))
+        except Exception as e:
+            print(f"Local TOC extraction failed for {uri}: {e}")
+            items, confidence, method = [], 0.0, None
+
+        accepted = bool(items) and confidence >= threshold
+        count("toc_local_books", method=method or "none", result="local" if accepted else "fallback")
+        books[uri] = {"method": method, "confidence": confidence, "items": len(items), "local": accepted}
+        if accepted:
+            local_results[uri] = items
+        else:
+            fallback.append(target)
+        print(f"{'Local ' if accepted else 'Fallback'}: {uri} (method={method}, confidence={confidence}, items={len(items)})")
+
+    report = {
+        "threshold": threshold,
+        "books": len(targets),
+        "resolved_locally": len(local_results),
+        "model_fallback": len(fallback),
+        "per_book": books,
+    }
+    return local_results, fallback, report
+
+def format_toc_ranges(toc_data, page_count=None):
     """
     시작 페이지 정보를 바탕으로 페이지 범위를 계산합니다.
+    page_count(본문 PDF 페이지 수)를 주면 마지막 챕터의 끝 페이지로 사용합니다.
     """
     formatted_output = []
     
@@ -95,7 +492,7 @@ def format_toc_ranges(toc_data):
         if i < len(sorted_toc) - 1:
             end_page = sorted_toc[i+1]['page'] - 1
         else:
-            end_page = start_page + 10 # 기본값 (마지막 챕터)
+            end_page = max(start_page, page_count) if page_count else start_page + 10 # 기본값 (마지막 챕터)
             
         formatted_output.append({
             "title": title,
@@ -106,27 +503,23 @@ def format_toc_ranges(toc_data):
         
     return formatted_output
 
-def main():
-    print(f"Initializing Vertex AI (Project: {PROJECT_ID})...")
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-    
-    model = GenerativeModel("gemini-2.5-pro")
-    
-    print(f"Scanning bucket '{BUCKET_NAME}' for TOC files...")
-    target_files = get_gcs_pdf_files(BUCKET_NAME)
-    
-    print(f"Found {len(target_files)} TOC files.")
-    
+def build_results(toc_by_uri, page_counts=None):
+    """
+    분석 결과를 toc_analysis_results.json 형식으로 변환합니다.
+    page_counts: {정규화된 책 ID: 본문 PDF 페이지 수} (toc_index.count_book_pages). 있으면 마지막 챕터의 끝 페이지로 사용합니다.
+    """
+    page_counts = page_counts or {}
     all_results = {}
     
-    for file_uri in target_files:
-        toc_data = parse_toc_pdf_from_gcs(file_uri, model)
+    for file_uri, toc_data in toc_by_uri.items():
         if toc_data:
-            formatted = format_toc_ranges(toc_data)
-            
             # 파일명에서 책 ID 추출 (예: 01_Content.pdf -> 01)
             filename = file_uri.split('/')[-1]
             book_id = filename.split('_')[0]
+
+            with span("toc.format", uri=file_uri, items=len(toc_data)):
+                formatted = format_toc_ranges(toc_data, page_counts.get(normalize_book_id(book_id)))
+            
             
             all_results[book_id] = {
                 "filename": filename,
@@ -140,11 +533,96 @@ def main():
                 print(f"  - {item['range_text']}")
             if len(formatted) > 3: print("  - ...")
     
+    return all_results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="목차 PDF 분석 (Gemini, 비동기 배치 + 응답 캐시)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONFIG["CONCURRENCY"], help="동시 모델 호출 수")
+    parser.add_argument("--rpm", type=float, default=BATCH_CONFIG["REQUESTS_PER_MINUTE"], help="분당 모델 호출 제한")
+    parser.add_argument("--cache-dir", default=BATCH_CONFIG["CACHE_DIR"], help="응답 캐시 폴더")
+    parser.add_argument("--no-cache", action="store_true", help="캐시를 사용하지 않고 모두 다시 호출")
+    parser.add_argument("--local-first", action="store_true",
+                        help="PyMuPDF 로 먼저 추출하고 신뢰도가 낮은 책만 모델로 분석")
+    parser.add_argument("--threshold", type=float, default=LOCAL_TOC_CONFIG["CONFIDENCE_THRESHOLD"],
+                        help="--local-first 신뢰도 기준 (0~1)")
+    parser.add_argument("--local-dir", default=None, help="GCS 대신 로컬 폴더의 목차 PDF 사용")
+    parser.add_argument("--pdf-dir", default=None,
+                        help="본문 PDF 폴더 ('{book}-Main.pdf'). 마지막 챕터의 끝 페이지를 실제 페이지 수로 기록 (없으면 시작+10)")
+    parser.add_argument("--payload", choices=PAYLOAD_MODES, default=BATCH_CONFIG["PAYLOAD"],
+                        help="모델에 보낼 내용: full(문서 전체), pdf(목차 페이지만 자른 PDF), image(목차 페이지 JPEG). "
+                             "목차 페이지를 찾지 못한 책은 문서 전체")
+    parser.add_argument("--stub", action="store_true", help="Vertex AI 대신 오프라인 스텁 모델 (토큰/지연 근사)")
+    parser.add_argument("--compare", action="store_true",
+                        help="full 과 --payload 를 각각 호출하여 책별 입력 토큰/지연 비교 (캐시 미사용, 결과 파일은 쓰지 않음)")
+    parser.add_argument("--model-report", default=MODEL_REPORT_FILE, help="책별 토큰/지연 리포트 저장 경로")
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.metrics:
+        METRICS.configure(args.metrics)
+
+    if args.local_dir:
+        print(f"Scanning '{args.local_dir}' for TOC files...")
+        target_files = get_local_pdf_files(args.local_dir)
+    else:
+        print(f"Scanning bucket '{BUCKET_NAME}' for TOC files...")
+        target_files = get_gcs_pdf_blobs(BUCKET_NAME)
+
+    print(f"Found {len(target_files)} TOC files.")
+
+    local_results, model_targets = {}, target_files
+    if args.local_first:
+        local_results, model_targets, report = resolve_toc_local_first(target_files, args.threshold)
+        with open(LOCAL_REPORT_FILE, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Local TOC: {report['resolved_locally']}/{report['books']} books avoided a model call "
+              f"(report saved to {LOCAL_REPORT_FILE})")
+
+    stats = {"model_calls": 0, "cache_hits": 0, "failed": 0}
+    model_results = {}
+    if model_targets:
+        if args.stub:
+            model, model_name, part_factory = StubModel(), "stub", InlinePart
+        else:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+
+            print(f"Initializing Vertex AI (Project: {PROJECT_ID})...")
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+
+            model, model_name, part_factory = GenerativeModel(MODEL_NAME), MODEL_NAME, None
+
+        if args.compare:
+            report = compare_payloads(model_targets, model, model_name, args.payload, args, part_factory)
+            with open(args.model_report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Comparison saved to {args.model_report}")
+            METRICS.close()
+            return
+
+        cache = None if args.no_cache else ResponseCache(args.cache_dir)
+        model_results, stats = run_payload_batch(model_targets, model, model_name, args.payload, args, cache, part_factory)
+        if stats["per_book"]:
+            with open(args.model_report, 'w', encoding='utf-8') as f:
+                json.dump({"payload": args.payload, "model": model_name, "per_book": stats["per_book"]},
+                          f, ensure_ascii=False, indent=2)
+
+    # 원래 순서 유지
+    toc_by_uri = {target["uri"]: local_results.get(target["uri"]) or model_results.get(target["uri"], [])
+                  for target in target_files}
+    all_results = build_results(toc_by_uri, count_book_pages(args.pdf_dir) if args.pdf_dir else None)
+
     # 결과 저장
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         json.dump(all_results, f, ensure_ascii=False, indent=2)
         
     print(f"\nProcessing Complete. Results saved to {OUTPUT_FILE}")
+    print(f"Model calls: {stats['model_calls']}, cache hits: {stats['cache_hits']}, failed: {stats['failed']}")
+    if stats.get("per_book"):
+        print(f"Input tokens: {stats['input_tokens']} (per-book tokens/latency saved to {args.model_report})")
+    METRICS.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from instrumentation import count, observe, span
+from low_memory import MemoryGovernor, open_document
+
+# === 단일 패스 스트리밍 추출 파이프라인 (Single-pass Extraction Pipeline) ===
+# 문서를 한 번만 열고 페이지를 한 번만 순회하면서, 여러 단계(stage)가 같은 파싱 결과를
+# 공유하여 이미지/박스/표/텍스트 항목(item)을 만들어 냅니다.
+#
+#   PDF -> PageContext -> stages (제너레이터) -> filters -> 제한된 큐 -> sinks (쓰기 스레드)
+#
+# - stage : stage(ctx) -> item 제너레이터. ctx 는 페이지의 get_drawings/get_images/display list 등을
+#           처음 요청될 때 한 번만 계산해 단계들이 공유합니다.
+#           (박스 단계는 experiments/pdf_extraction/box_extraction.py 의 box_stage)
+# - filter: filter(item) -> bool. False 면 버립니다. (모든 단계의 항목에 순서대로 적용)
+# - sink  : write(item) / close(ok). 큐 반대편의 쓰기 스레드에서 호출됩니다.
+#           ok 가 False 면 실행이 도중에 실패한 것이므로, 싱크는 기존 출력을 바꾸지 말고 임시 결과를 버립니다.
+# 항목은 dict 이며 공통 키는 "kind", "book", "page", "index" 입니다.
+# 바이트 출력이 있는 항목은 "data" 와 "ext" 를 가집니다.
+# fitz 객체는 스레드 안전하지 않으므로 렌더링/인코딩은 모두 단계(메인 스레드)에서 끝내고,
+# 큐에는 순수 바이트/값만 넣습니다. 큐 크기(QUEUE_SIZE)가 메모리 상한이 됩니다.
+# memory_limit_mb 를 주면 저메모리 모드(low_memory.py): RSS 가 상한을 넘을 때 이미지 메모를 비우고
+# 쓰기 큐가 빌 때까지 추출을 멈춥니다.
+# ============================
+
+PIPELINE_CONFIG = {
+    "QUEUE_SIZE": 64,    # 쓰기 대기 중인 항목 수 상한 (가득 차면 추출이 대기)
+    "ZOOM": 2,           # 박스/표 스냅샷 배율
+    "IMAGE_CACHE": 32,   # 최근 디코딩한 xref 메모 개수 (공용 로고/배경 재디코딩 방지, 메모리 상한)
+}
+
+class PageContext:
+    """
+    한 페이지의 파싱 결과를 단계 간에 공유합니다. 모든 값은 처음 요청될 때 계산됩니다.
+    image_cache 는 문서 단위 xref -> extract_image 결과의 LRU 메모입니다.
+    """
+
+    def __init__(self, doc, page_index, book, image_cache):
+        self.doc = doc
+        self.page = doc[page_index]
+        self.page_no = page_index + 1
+        self.book = book
+        self._image_cache = image_cache
+        self._cache = {}
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def images(self):
+        return self._get("images", lambda: self.page.get_images(full=True))
+
+    @property
+    def drawings(self):
+        return self._get("drawings", self.page.get_drawings)
+
+    @property
+    def text(self):
+        return self._get("text", self.page.get_text)
+
+    @property
+    def display_list(self):
+        return self._get("display_list", self.page.get_displaylist)
+
+    def extract_image(self, xref):
+        """extract_image 결과. 최근 IMAGE_CACHE 개 xref 는 다시 디코딩하지 않습니다."""
+        cache = self._image_cache
+        if xref in cache:
+            cache.move_to_end(xref)
+            return cache[xref]
+        base_image = cache[xref] = self.doc.extract_image(xref)
+        if len(cache) > PIPELINE_CONFIG["IMAGE_CACHE"]:
+            cache.popitem(last=False)
+        return base_image
+
+    def render_png(self, clip, zoom=None):
+        """페이지의 clip 영역을 PNG 바이트로 렌더링합니다. (공유 display list 사용)"""
+        zoom = zoom or PIPELINE_CONFIG["ZOOM"]
+        return self.display_list.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip).tobytes("png")
+
+    def item(self, kind, index, **fields):
+        return {"kind": kind, "book": self.book, "page": self.page_no, "index": index, **fields}
+
+# --- Stages ---
+
+def image_stage(prefilter=None):
+    """
+    페이지의 이미지 (get_images 순서, index 는 1부터).
+    prefilter(doc, img) 가 False 를 반환하면 디코딩하지 않고 건너뜁니다. (메타데이터 필터)
+    """
+    def stage(ctx):
+        for index, img in enumerate(ctx.images, start=1):
+            if prefilter is not None and not prefilter(ctx.doc, img):
+                continue
+            base_image = ctx.extract_image(img[0])
+            yield ctx.item("image", index, xref=img[0], data=base_image["image"], ext=base_image["ext"],
+                           width=base_image["width"], height=base_image["height"])
+    return stage
+
+def text_stage(ctx):
+    """페이지 텍스트 (페이지당 항목 하나)"""
+    yield ctx.item("text", 1, text=ctx.text)
+
+def table_stage(classifier=None):
+    """
+    find_tables() 로 찾은 표의 스냅샷(PNG).
+    classifier(page, drawings) -> (bool, signals) 를 넘기면 후보 페이지에서만 find_tables 를 실행합니다.
+    (drawings 는 단계 간에 공유되는 get_drawings 결과)
+    """
+    def stage(ctx):
+        if classifier is not None and not classifier(ctx.page, ctx.drawings)[0]:
+            return
+        for index, table in enumerate(ctx.page.find_tables().tables, start=1):
+            bbox = fitz.Rect(table.bbox)
+            yield ctx.item("table", index, bbox=list(bbox), data=ctx.render_png(bbox), ext="png")
+    return stage
+
+# --- Filters ---
+
+def kind_filter(kind, predicate):
+    """kind 항목에만 predicate 를 적용하는 필터"""
+    return lambda item: item["kind"] != kind or predicate(item)
+
+def dedup_filter(kind="image"):
+    """같은 바이트의 kind 항목은 처음 한 번만 통과시킵니다. (실행 단위 MD5)"""
+    seen = set()
+
+    def keep(item):
+        if item["kind"] != kind:
+            return True
+        digest = hashlib.md5(item["data"]).hexdigest()
+        if digest in seen:
+            return False
+        seen.add(digest)
+        return True
+    return keep
+
+# --- Sinks ---
+
+class DirectorySink:
+    """
+    바이트 항목을 폴더에 파일로 씁니다.
+    name(item) 으로 파일명을 정하며, kinds 를 지정하면 해당 종류만 씁니다.
+    """
+
+    def __init__(self, root, name=None, kinds=None):
+        self.root = root
+        self.name = name or (lambda item: f"{item['book']}_p{item['page']:03d}_{item['kind']}_{item['index']:02d}.{item['ext']}")
+        self.kinds = set(kinds) if kinds else None
+        self.written = []
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, item):
+        if "data" not in item or (self.kinds and item["kind"] not in self.kinds):
+            return
+        path = os.path.join(self.root, self.name(item))
+        with open(path, "wb") as f:
+            f.write(item["data"])
+        self.written.append(path)
+
+    def close(self, ok=True):
+        pass
+
+class JsonlSink:
+    """
+    항목 메타데이터(바이트 제외)를 JSON Lines 로 기록합니다. 텍스트 항목은 본문도 포함됩니다.
+    book 을 주면 기존 파일에 병합합니다: 그 책의 기존 기록을 교체하고 다른 책의 기록은 유지하며,
+    only(페이지 목록, 1부터)를 주면 그 페이지의 기록만 교체합니다. (ImageIndex.replace_book 과 동일)
+    기록은 path.tmp 에 모았다가 성공한 실행에서만 path 에 반영합니다.
+    """
+
+    def __init__(self, path, kinds=None, book=None, only=None):
+        self.path = path
+        self.kinds = set(kinds) if kinds else None
+        self.book = book
+        self.only = None if only is None else set(only)
+        self.file = open(f"{path}.tmp", "w", encoding="utf-8")
+
+    def write(self, item):
+        if self.kinds and item["kind"] not in self.kinds:
+            return
+        record = {key: value for key, value in item.items() if key != "data"}
+        if "data" in item:
+            record["size"] = len(item["data"])
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _replaced(self, record):
+        return record.get("book") == self.book and (self.only is None or record.get("page") in self.only)
+
+    def close(self, ok=True):
+        self.file.close()
+        if not ok:
+            os.remove(f"{self.path}.tmp")
+            return
+        if self.book is None:
+            os.replace(f"{self.path}.tmp", self.path)
+            return
+
+        lines = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if not self._replaced(record):
+                        lines.append(((record.get("book", ""), record.get("page", 0)), line))
+        with open(f"{self.path}.tmp", "r", encoding="utf-8") as f:
+            lines.extend(((self.book, json.loads(line)["page"]), line) for line in f)
+        # 책/페이지 순서 (같은 페이지 안에서는 기록 순서 유지)
+        lines.sort(key=lambda entry: entry[0])
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(line for _, line in lines)
+        os.replace(f"{self.path}.tmp", self.path)
+
+class CallbackSink:
+    """항목마다 함수를 호출합니다. (진행 상황 출력, 통계 수집 등)"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, item):
+        self.callback(item)
+
+    def close(self, ok=True):
+        pass
+
+# --- Pipeline ---
+
+class Pipeline:
+    """
+    stages -> filters -> 제한된 큐 -> sinks.
+    추출(메인 스레드)과 쓰기(쓰기 스레드)가 겹쳐 진행되며, 대기 항목 수는 queue_size 를 넘지 않습니다.
+    """
+
+    _DONE = object()
+
+    def __init__(self, stages, filters=(), sinks=(), queue_size=None, memory_limit_mb=None):
+        self.stages = list(stages)
+        self.filters = list(filters)
+        self.sinks = list(sinks)
+        self.queue_size = queue_size or PIPELINE_CONFIG["QUEUE_SIZE"]
+        self.memory_limit_mb = memory_limit_mb
+
+    def _write_loop(self, items, stats, errors):
+        while True:
+            item = items.get()
+            if item is Pipeline._DONE:
+                items.task_done()
+                return
+            try:
+                for sink in self.sinks:
+                    sink.write(item)
+                stats["written"][item["kind"]] = stats["written"].get(item["kind"], 0) + 1
+                count("items_written", book=item["book"], kind=item["kind"])
+                if "data" in item:
+                    observe("item_bytes", len(item["data"]), kind=item["kind"])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                items.task_done()
+
+    def _run_page(self, ctx, items, stats):
+        for stage in self.stages:
+            for item in stage(ctx):
+                kind = item["kind"]
+                stats["produced"][kind] = stats["produced"].get(kind, 0) + 1
+                count("items_produced", book=ctx.book, kind=kind)
+                if not all(keep(item) for keep in self.filters):
+                    stats["filtered"][kind] = stats["filtered"].get(kind, 0) + 1
+                    count("items_filtered", book=ctx.book, kind=kind)
+                    continue
+                items.put(item)
+                stats["max_queue"] = max(stats["max_queue"], items.qsize())
+
+    def run(self, pdf_path, pages=None, book=None):
+        """
+        PDF 를 한 번 순회합니다. pages 로 처리할 페이지 인덱스(0부터)를 제한할 수 있습니다.
+        반환: {"pages", "produced", "filtered", "written", "max_queue", "seconds"} (종류별 개수)
+        저메모리 모드면 "memory" (MemoryGovernor 통계) 도 포함됩니다.
+        """
+        book = book or os.path.splitext(os.path.basename(pdf_path))[0]
+        stats = {"pages": 0, "produced": {}, "filtered": {}, "written": {}, "max_queue": 0, "seconds": 0.0}
+        items = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        writer = threading.Thread(target=self._write_loop, args=(items, stats, errors), daemon=True)
+        writer.start()
+        started = time.perf_counter()
+        ok = False
+        image_cache = OrderedDict()
+        governor = None
+        if self.memory_limit_mb:
+            # 역압: 디코딩 메모를 비우고, 쓰기 스레드가 큐의 바이트를 모두 내보낼 때까지 대기
+            governor = MemoryGovernor(self.memory_limit_mb, on_pressure=[image_cache.clear, items.join])
+
+        try:
+            with (open_document(pdf_path, governor) if governor else fitz.open(pdf_path)) as doc, \
+                    span("pipeline.document", book=book):
+                for page_index in (range(len(doc)) if pages is None else pages):
+                    with span("pipeline.page", book=book, page=page_index + 1):
+                        self._run_page(PageContext(doc, page_index, book, image_cache), items, stats)
+                    stats["pages"] += 1
+                    if governor is not None:
+                        governor.page_done()
+            ok = True
+        finally:
+            items.put(Pipeline._DONE)
+            writer.join()
+            for sink in self.sinks:
+                sink.close(ok and not errors)
+
+        if errors:
+            raise errors[0]
+        stats["seconds"] = time.perf_counter() - started
+        if governor is not None:
+            stats["memory"] = governor.summary()
+        return stats
@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from image_store import BlobStore, ImageManifest
+
+# === 지각 해시 근접 중복 인덱스 (Perceptual-hash Near-duplicate Index) ===
+# 콘텐츠 주소 저장소(--store)의 blob 마다 64비트 지각 해시(dHash/pHash)를 계산하여
+# 책 전체에 걸친 영구 인덱스(phash_index.json)에 기록합니다.
+# 해밍 거리 THRESHOLD 이내의 이미지(재인코딩/리사이즈된 같은 사진)는 하나의 대표 blob(canonical)과
+# 별칭(alias)으로 묶이며, 대표는 해상도가 가장 큰 blob 입니다.
+# 거리 검색은 다중 인덱스 해싱(조각별 정확 일치 -> 거리 확인)으로 수행합니다.
+# ============================
+
+PHASH_CONFIG = {
+    "ALGORITHM": "dhash",            # "dhash" (밝기 기울기) 또는 "phash" (DCT 저주파)
+    "THRESHOLD": 4,                  # 근접 중복으로 볼 최대 해밍 거리 (64비트 중)
+    "WORKERS": os.cpu_count() or 4,  # 해시 계산 프로세스 수
+}
+
+INDEX_FILENAME = "phash_index.json"
+INDEX_VERSION = 1
+
+# --- Hashing ---
+
+def load_gray(data, min_side=64):
+    """
+    이미지 바이트를 회색조 NumPy 배열(float32)로 디코딩합니다. 반환: (배열, 원본 가로, 원본 세로)
+    큰 이미지는 짧은 변이 min_side 이상으로 남는 범위에서 먼저 절반씩 축소합니다. (PyMuPDF shrink)
+    """
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(data)
+    width, height = pix.width, pix.height
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace is None or pix.colorspace.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    factor = 0
+    while min(pix.width, pix.height) >> (factor + 1) >= min_side:
+        factor += 1
+    if factor:
+        pix.shrink(factor)
+    gray = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)[:, :, 0]
+    return gray.astype(np.float32), width, height
+
+def resize_area(gray, height, width):
+    """구간 평균(area) 축소. 원본이 더 작은 축은 최근접 샘플링합니다."""
+    def reduce(array, size, axis):
+        length = array.shape[axis]
+        if length < size:
+            return np.take(array, (np.arange(size) * length) // size, axis=axis)
+        edges = (np.arange(size + 1) * length) // size
+        sums = np.add.reduceat(array, edges[:-1], axis=axis)
+        counts = np.diff(edges).reshape([-1 if i == axis else 1 for i in range(array.ndim)])
+        return sums / counts
+    return reduce(reduce(gray, height, 0), width, 1)
+
+def bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(gray):
+    """8x9 축소 후 가로 방향 밝기 기울기의 부호 (64비트)"""
+    small = resize_area(gray, 8, 9)
+    return bits_to_int(small[:, 1:] > small[:, :-1])
+
+_DCT_MATRICES = {}
+
+def _dct_matrix(n):
+    if n not in _DCT_MATRICES:
+        k = np.arange(n).reshape(-1, 1)
+        matrix = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n)) * np.sqrt(2 / n)
+        matrix[0] /= np.sqrt(2)
+        _DCT_MATRICES[n] = matrix
+    return _DCT_MATRICES[n]
+
+def phash(gray):
+    """32x32 축소 -> 2D DCT -> 저주파 8x8 계수의 중앙값 대비 부호 (64비트, DC 제외 중앙값)"""
+    small = resize_area(gray, 32, 32)
+    matrix = _dct_matrix(32)
+    low = (matrix @ small @ matrix.T)[:8, :8]
+    return bits_to_int(low > np.median(low.ravel()[1:]))
+
+HASHERS = {"dhash": dhash, "phash": phash}
+
+def hash_image(data, algorithm=None):
+    """이미지 바이트 -> (64비트 해시, 가로, 세로)"""
+    gray, width, height = load_gray(data)
+    return HASHERS[algorithm or PHASH_CONFIG["ALGORITHM"]](gray), width, height
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+# --- Multi-index hashing ---
+
+class MultiIndexHash:
+    """
+    해밍 거리 반경 검색용 다중 인덱스 해싱.
+    64비트를 radius + 1 개의 조각으로 나누면, 거리 radius 이내의 두 해시는 (비둘기집 원리로)
+    적어도 한 조각이 정확히 같습니다. 조각별 해시 테이블에서 후보를 모은 뒤 실제 거리를 확인합니다.
+    radius 보다 큰 반경의 질의는 선형 탐색으로 처리합니다.
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        chunks = radius + 1
+        bounds = [(64 * i) // chunks for i in range(chunks + 1)]
+        self.slices = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.slices]
+        self.values = []
+        self.keys = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value, key):
+        position = len(self.values)
+        self.values.append(value)
+        self.keys.append(key)
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def query(self, value, radius=None):
+        """반경 radius 이내의 [(거리, key)] (거리 오름차순)와 거리를 계산한 후보 수"""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            results = [(hamming(value, other), key) for other, key in zip(self.values, self.keys)]
+            return sorted(result for result in results if result[0] <= radius), len(self.values)
+
+        seen = set()
+        results = []
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            for position in table.get((value >> shift) & mask, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                distance = hamming(value, self.values[position])
+                if distance <= radius:
+                    results.append((distance, self.keys[position]))
+        results.sort()
+        return results, len(seen)
+
+# --- Persistent index ---
+
+class PerceptualIndex:
+    """
+    blob hash -> {"phash", "area"} 와 별칭 -> 대표 매핑을 관리합니다.
+    형식: {"version", "algorithm", "threshold", "entries": {blob: {"phash": hex, "area"}}, "canonical": {alias: blob}}
+    검색 테이블은 저장하지 않고 로드할 때 entries 순서대로 다시 만듭니다.
+    """
+
+    def __init__(self, path, algorithm=None, threshold=None):
+        self.path = path
+        self.algorithm = algorithm or PHASH_CONFIG["ALGORITHM"]
+        self.threshold = threshold
+        self.entries = {}
+        self.canonical = {}
+        entries = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("algorithm", self.algorithm) != self.algorithm:
+                raise ValueError(f"{path} was built with {data['algorithm']}, not {self.algorithm}")
+            if self.threshold is None:
+                self.threshold = data.get("threshold")
+            self.canonical = data.get("canonical", {})
+            entries = data.get("entries", {})
+        if self.threshold is None:
+            self.threshold = PHASH_CONFIG["THRESHOLD"]
+
+        self.table = MultiIndexHash(self.threshold)
+        for key, entry in entries.items():
+            self.entries[key] = {"phash": int(entry["phash"], 16), "area": entry["area"]}
+            self.table.add(self.entries[key]["phash"], key)
+
+    def resolve(self, key):
+        """key 의 대표 blob (별칭이 아니면 자기 자신)"""
+        return self.canonical.get(key, key)
+
+    def aliases(self, canonical):
+        return sorted(alias for alias, target in self.canonical.items() if target == canonical)
+
+    def query(self, value, threshold=None):
+        """해시가 threshold 이내인 [(거리, blob)]"""
+        return self.table.query(value, threshold)[0]
+
+    def add(self, key, value, area):
+        """
+        blob 을 등록하고 대표 blob 을 반환합니다.
+        가장 가까운 기존 blob 의 그룹에 합류하며, 새 blob 의 해상도가 더 크면 그룹의 대표가 됩니다.
+        대표와의 거리도 threshold 이내여야 하므로 비슷한 이미지가 사슬처럼 이어져 묶이지 않습니다.
+        대표를 바꿀 때는 기존 대표와 모든 별칭이 새 blob 과도 threshold 이내인지 다시 확인하고,
+        하나라도 벗어나면 대표를 바꾸지 않고 별칭으로 합류합니다.
+        """
+        if key in self.entries:
+            return self.resolve(key)
+
+        canonical = None
+        for _, match in self.query(value):
+            candidate = self.resolve(match)
+            if hamming(value, self.entries[candidate]["phash"]) <= self.threshold:
+                canonical = candidate
+                break
+        self.entries[key] = {"phash": value, "area": area}
+        self.table.add(value, key)
+        if canonical is None:
+            return key
+
+        members = [canonical] + self.aliases(canonical)
+        if area > self.entries[canonical]["area"] and all(
+                hamming(value, self.entries[member]["phash"]) <= self.threshold for member in members):
+            for alias in members[1:]:
+                self.canonical[alias] = key
+            self.canonical[canonical] = key
+            return key
+        self.canonical[key] = canonical
+        return canonical
+
+    def save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "algorithm": self.algorithm,
+            "threshold": self.threshold,
+            "entries": {key: {"phash": f"{entry['phash']:016x}", "area": entry["area"]} for key, entry in self.entries.items()},
+            "canonical": self.canonical,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        return {"blobs": len(self.entries), "canonical": len(self.entries) - len(self.canonical), "aliases": len(self.canonical)}
+
+# --- Store integration ---
+
+def _hash_blob_worker(path, algorithm):
+    with open(path, "rb") as f:
+        data = f.read()
+    value, width, height = hash_image(data, algorithm)
+    return value, width * height, len(data)
+
+def index_store(store_dir, index, workers=None):
+    """
+    저장소 manifest 의 blob 중 인덱스에 없는 것을 해시하여 등록합니다.
+    해시 계산은 프로세스 풀에서 병렬로, 등록은 manifest 순서대로 수행하므로 결과가 결정적입니다.
+    반환: {"hashed", "bytes", "seconds", "images_per_sec", "mb_per_sec"}
+    """
+    store = BlobStore(store_dir)
+    manifest = ImageManifest(os.path.join(store_dir, "manifest.json"))
+    pending = [(digest, blob) for digest, blob in manifest.blobs.items() if digest not in index.entries]
+
+    started = time.perf_counter()
+    total_bytes = 0
+    paths = [store.path_for(digest, blob["ext"]) for digest, blob in pending]
+    with ProcessPoolExecutor(max_workers=workers or PHASH_CONFIG["WORKERS"]) as executor:
+        results = executor.map(_hash_blob_worker, paths, [index.algorithm] * len(paths), chunksize=16)
+        for (digest, _), (value, area, size) in zip(pending, results):
+            index.add(digest, value, area)
+            total_bytes += size
+    elapsed = time.perf_counter() - started
+
+    return {
+        "hashed": len(pending),
+        "bytes": total_bytes,
+        "seconds": elapsed,
+        "images_per_sec": len(pending) / elapsed if elapsed > 0 else 0,
+        "mb_per_sec": total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0,
+    }
+
+def collapse_store(store_dir, index, prune=False):
+    """
+    manifest 의 이미지 참조를 대표 blob 으로 바꾸고 별칭을 manifest.aliases 에 기록합니다.
+    prune=True 면 더 이상 참조되지 않는 별칭 blob 파일과 메타데이터를 삭제합니다.
+    """
+    store = BlobStore(store_dir)
+    manifest = ImageManifest(os.path.join(store_dir, "manifest.json"))
+    repointed = manifest.collapse(index.resolve)
+
+    pruned = 0
+    pruned_bytes = 0
+    if prune:
+        referenced = set(manifest.images.values())
+        for digest in [digest for digest in manifest.blobs if digest not in referenced and digest in manifest.aliases]:
+            blob = manifest.blobs.pop(digest)
+            path = store.path_for(digest, blob["ext"])
+            if os.path.exists(path):
+                os.remove(path)
+                pruned += 1
+                pruned_bytes += blob["size"]
+    manifest.save()
+    return {"repointed": repointed, "pruned": pruned, "pruned_bytes": pruned_bytes}
+
+def dedupe_store(store_dir, threshold=None, algorithm=None, prune=False, workers=None):
+    """index_store + collapse_store. 인덱스는 STORE_DIR/phash_index.json 에 누적됩니다."""
+    index = PerceptualIndex(os.path.join(store_dir, INDEX_FILENAME), algorithm, threshold)
+    stats = index_store(store_dir, index, workers)
+    index.save()
+    stats.update(collapse_store(store_dir, index, prune))
+    summary = index.summary()
+    print(f"Perceptual index ({index.algorithm}, threshold {index.threshold}): {summary['blobs']} blobs, "
+          f"{summary['canonical']} canonical, {summary['aliases']} aliases")
+    print(f"  Hashed {stats['hashed']} new blobs in {stats['seconds']:.2f}s "
+          f"({stats['images_per_sec']:.1f} images/s, {stats['mb_per_sec']:.2f} MB/s)")
+    print(f"  Repointed {stats['repointed']} image references, pruned {stats['pruned']} blobs "
+          f"({stats['pruned_bytes'] / (1024 * 1024):.1f} MB)")
+    return index, stats
+
+def benchmark(index, queries=1000, threshold=None, synthetic=0):
+    """
+    다중 인덱스 해싱 반경 검색 vs 선형 탐색 (인덱스의 실제 해시에 무작위 비트 뒤집기를 더한 질의)
+    synthetic > 0 이면 무작위 64비트 해시 synthetic 개를 더해 큰 코퍼스에서의 확장성을 측정합니다.
+    """
+    threshold = index.threshold if threshold is None else threshold
+    for i in range(synthetic):
+        value = random.getrandbits(64)
+        index.entries[f"synthetic-{i}"] = {"phash": value, "area": 0}
+        index.table.add(value, f"synthetic-{i}")
+    values = [entry["phash"] for entry in index.entries.values()]
+    if not values:
+        print("Index is empty.")
+        return None
+    keys = list(index.entries)
+    samples = []
+    for _ in range(queries):
+        value = random.choice(values)
+        for bit in random.sample(range(64), random.randint(0, threshold)):
+            value ^= 1 << bit
+        samples.append(value)
+
+    start = time.perf_counter()
+    checked = 0
+    for value in samples:
+        checked += index.table.query(value, threshold)[1]
+    index_us = (time.perf_counter() - start) / queries * 1e6
+
+    start = time.perf_counter()
+    for value in samples:
+        [key for key, other in zip(keys, values) if hamming(value, other) <= threshold]
+    linear_us = (time.perf_counter() - start) / queries * 1e6
+
+    print(f"{len(values)} hashes, {queries} queries, threshold {threshold}")
+    print(f"  multi-index : {index_us:.1f} us/query (checks {checked / queries:.1f} candidates)")
+    print(f"  linear scan : {linear_us:.1f} us/query")
+    return {"index_us": index_us, "linear_us": linear_us, "candidates": checked / queries}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="지각 해시 근접 중복 인덱스")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    dedupe = sub.add_parser("dedupe", help="저장소 blob 을 해시하고 근접 중복을 대표 blob 으로 묶기")
+    dedupe.add_argument("store_dir")
+    dedupe.add_argument("--threshold", type=int, default=None)
+    dedupe.add_argument("--algorithm", choices=sorted(HASHERS), default=None)
+    dedupe.add_argument("--prune", action="store_true", help="별칭 blob 파일 삭제")
+    dedupe.add_argument("--workers", type=int, default=None)
+
+    query = sub.add_parser("query", help="이미지 파일과 가까운 blob 찾기")
+    query.add_argument("store_dir")
+    query.add_argument("image")
+    query.add_argument("--threshold", type=int, default=None)
+
+    bench = sub.add_parser("bench", help="다중 인덱스 해싱 vs 선형 탐색 벤치마크")
+    bench.add_argument("store_dir")
+    bench.add_argument("--queries", type=int, default=1000)
+    bench.add_argument("--threshold", type=int, default=None)
+    bench.add_argument("--synthetic", type=int, default=0, help="무작위 해시 N 개를 추가해 측정")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "dedupe":
+        dedupe_store(args.store_dir, args.threshold, args.algorithm, args.prune, args.workers)
+    else:
+        index = PerceptualIndex(os.path.join(args.store_dir, INDEX_FILENAME))
+        if args.command == "query":
+            with open(args.image, "rb") as f:
+                value, _, _ = hash_image(f.read(), index.algorithm)
+            for distance, key in index.query(value, args.threshold):
+                print(f"  {distance:>2}  {key}  (canonical {index.resolve(key)})")
+        else:
+            benchmark(index, args.queries, args.threshold, args.synthetic)
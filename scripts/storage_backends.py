@@ -0,0 +1,148 @@
+import abc
+import base64
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+# === 저장소 백엔드 (Storage Backends) ===
+# 업로드 엔진(upload_to_gcs.py)이 사용하는 공통 인터페이스입니다.
+# GCSBackend 는 실제 버킷, LocalBackend 는 로컬 폴더를 버킷처럼 다루어
+# 네트워크 없이 게시(publish) 과정을 테스트/벤치마크할 수 있게 합니다.
+# ============================
+
+CHUNK_SIZE = 1024 * 1024
+
+def file_md5_base64(path):
+    """GCS 의 md5_hash 와 같은 형식(base64)의 로컬 파일 MD5"""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+def file_crc32c_base64(path):
+    """GCS 의 crc32c 와 같은 형식(base64)의 로컬 파일 CRC32C. google-crc32c 가 없으면 None"""
+    try:
+        import google_crc32c
+    except ImportError:
+        return None
+    checksum = google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("ascii")
+
+class StorageBackend(abc.ABC):
+    """
+    객체 저장소 인터페이스. 모든 메서드는 여러 스레드에서 동시에 호출될 수 있습니다.
+    """
+
+    # 재시도할 일시적 오류 타입
+    transient_errors = (ConnectionError, TimeoutError)
+
+    def list(self, prefix):
+        """prefix 아래 객체 이름 목록"""
+        return sorted(self.list_objects(prefix))
+
+    @abc.abstractmethod
+    def list_objects(self, prefix):
+        """
+        prefix 아래 객체 메타데이터 {name: {"size", "md5", "crc32c"}} (체크섬은 base64, 없으면 None)
+        """
+
+    @abc.abstractmethod
+    def upload(self, local_path, name):
+        """로컬 파일을 name 으로 올립니다. (같은 이름은 덮어씀)"""
+
+    @abc.abstractmethod
+    def delete(self, name):
+        """name 객체를 지웁니다."""
+
+    @abc.abstractmethod
+    def url(self, name):
+        """로그 출력용 위치 문자열"""
+
+class GCSBackend(StorageBackend):
+    """
+    Google Cloud Storage 버킷. 스레드마다 별도의 클라이언트를 사용합니다.
+    """
+
+    def __init__(self, bucket_name, project_id=None):
+        from google.api_core import exceptions as gcs_exceptions
+
+        self.bucket_name = bucket_name
+        self.project_id = project_id
+        self._local = threading.local()
+        self.transient_errors = StorageBackend.transient_errors + (
+            gcs_exceptions.TooManyRequests,
+            gcs_exceptions.InternalServerError,
+            gcs_exceptions.BadGateway,
+            gcs_exceptions.ServiceUnavailable,
+            gcs_exceptions.GatewayTimeout,
+        )
+
+    @property
+    def bucket(self):
+        if not hasattr(self._local, "bucket"):
+            from google.cloud import storage
+            self._local.bucket = storage.Client(project=self.project_id).bucket(self.bucket_name)
+        return self._local.bucket
+
+    def list_objects(self, prefix):
+        # 합성(composite) 객체는 md5_hash 가 없으므로 crc32c 도 함께 보관
+        return {
+            blob.name: {"size": blob.size, "md5": blob.md5_hash, "crc32c": blob.crc32c}
+            for blob in self.bucket.list_blobs(prefix=prefix)
+        }
+
+    def upload(self, local_path, name):
+        self.bucket.blob(name).upload_from_filename(local_path)
+
+    def delete(self, name):
+        self.bucket.blob(name).delete()
+
+    def url(self, name):
+        return f"gs://{self.bucket_name}/{name}"
+
+class LocalBackend(StorageBackend):
+    """
+    로컬 폴더를 버킷처럼 사용합니다. latency_ms 로 요청당 네트워크 지연을 흉내낼 수 있습니다.
+    """
+
+    def __init__(self, root, latency_ms=0):
+        self.root = root
+        self.latency = latency_ms / 1000
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def list_objects(self, prefix):
+        self._wait()
+        objects = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    objects[name] = {"size": os.path.getsize(path), "md5": file_md5_base64(path), "crc32c": None}
+        return objects
+
+    def upload(self, local_path, name):
+        self._wait()
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(local_path, path)
+
+    def delete(self, name):
+        self._wait()
+        os.remove(self._path(name))
+
+    def url(self, name):
+        return f"file://{os.path.abspath(self._path(name))}"
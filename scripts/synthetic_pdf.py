@@ -0,0 +1,150 @@
+import argparse
+import json
+import sys
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# === 합성 PDF 코퍼스 생성기 (Synthetic PDF Corpus) ===
+# 벤치마크(bench_pipeline.py)용 PDF 를 PyMuPDF 로 만듭니다. 같은 사양(spec)과 seed 는 항상 같은 PDF 를 만듭니다.
+#   본문 PDF : 페이지 수, 페이지당 이미지 수/크기, 그림(사각형 경로) 밀도, 표가 들어간 페이지 비율, 텍스트 줄 수
+#   목차 PDF : "제목 ..... 24" 형식의 목차 항목 (local_toc.py 레이아웃 휴리스틱 대상)
+#              filler_pages 를 주면 앞뒤에 표지(스캔 이미지)/본문 산문 페이지를 붙입니다. (목차 페이지 탐지 대상)
+# 이미지는 잡음(압축 안 됨, 큰 파일)과 단색 블록(작은 파일)을 섞고, 페이지마다 작은 로고를 공유하여
+# 추출 필터(크기/용량)와 xref 재사용 경로도 함께 거치게 합니다.
+# ============================
+
+SYNTHETIC_DEFAULTS = {
+    "pages": 20,
+    "images_per_page": 2,
+    "image_size": [400, 300],   # 이미지 가로/세로 픽셀
+    "noise_ratio": 0.5,         # 잡음 이미지 비율 (나머지는 단색 블록 + 줄무늬)
+    "jpeg_ratio": 0.5,          # JPEG 로 넣을 비율 (나머지는 PNG)
+    "drawings_per_page": 40,    # 사각형 경로 수 (박스 추출 부하)
+    "table_ratio": 0.2,         # 괘선 표가 들어간 페이지 비율
+    "text_lines": 30,           # 페이지당 텍스트 줄 수
+    "toc_entries": 0,           # 0 보다 크면 목차 PDF 도 생성
+    "seed": 0,
+}
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+WORDS = ["빅뱅", "우주", "은하", "원소", "생명", "인류", "농업", "문명", "에너지", "복잡성",
+         "Big", "History", "threshold", "energy", "star", "planet"]
+
+def make_image(rng, width, height, noise, jpeg):
+    """잡음 또는 단색+줄무늬 RGB 이미지를 PNG/JPEG 바이트로 만듭니다."""
+    if noise:
+        samples = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    else:
+        samples = np.empty((height, width, 3), dtype=np.uint8)
+        samples[:] = rng.integers(0, 256, size=3, dtype=np.uint8)
+        samples[::8] = 255 - samples[::8]
+    pix = fitz.Pixmap(fitz.csRGB, width, height, samples.tobytes(), False)
+    return pix.tobytes("jpeg") if jpeg else pix.tobytes("png")
+
+def draw_boxes(page, rng, count):
+    """격자형 패널(중첩 박스)과 임의 크기 사각형을 count 개 그립니다. 경로 하나에 사각형 하나."""
+    shape = page.new_shape()
+    for i in range(count):
+        if i % 4 == 0:
+            col, row = (i // 4) % 2, (i // 8) % 4
+            x0, y0 = 40 + col * 270, 40 + row * 195
+            rect = fitz.Rect(x0, y0, x0 + 250, y0 + 180)
+        else:
+            x0, y0 = rng.uniform(10, 480), rng.uniform(10, 720)
+            w, h = rng.uniform(5, 575 - x0), rng.uniform(5, 822 - y0)
+            rect = fitz.Rect(x0, y0, x0 + w, y0 + h)
+        shape.draw_rect(rect)
+        shape.finish(color=(0.2, 0.3, 0.6), width=0.5)
+    shape.commit()
+
+def draw_table(page, rng, rows=6, cols=4):
+    """괘선 표 (가로/세로 선 + 칸마다 숫자)"""
+    x0, y0 = 60, 560
+    cell_w, cell_h = 110, 24
+    for r in range(rows + 1):
+        page.draw_line((x0, y0 + r * cell_h), (x0 + cols * cell_w, y0 + r * cell_h), width=0.5)
+    for c in range(cols + 1):
+        page.draw_line((x0 + c * cell_w, y0), (x0 + c * cell_w, y0 + rows * cell_h), width=0.5)
+    for r in range(rows):
+        for c in range(cols):
+            page.insert_text((x0 + c * cell_w + 5, y0 + r * cell_h + 16), f"{rng.integers(0, 10000)}", fontsize=9)
+
+def write_text(page, rng, lines):
+    text = "\n".join(" ".join(WORDS[i] for i in rng.integers(0, len(WORDS), size=10)) for _ in range(lines))
+    page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontname="korea", fontsize=9)
+
+def generate_book(path, spec=None):
+    """
+    본문 PDF 를 만듭니다. spec 은 SYNTHETIC_DEFAULTS 의 일부 키만 덮어써도 됩니다.
+    반환: 실제 사용한 spec 과 {"images": 페이지에 넣은 이미지 수 (로고 제외)}
+    """
+    spec = {**SYNTHETIC_DEFAULTS, **(spec or {})}
+    rng = np.random.default_rng(spec["seed"])
+    width, height = spec["image_size"]
+    logo = make_image(rng, 64, 64, noise=False, jpeg=False)
+
+    doc = fitz.open()
+    images = 0
+    for page_no in range(spec["pages"]):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        write_text(page, rng, spec["text_lines"])
+        page.insert_image(fitz.Rect(10, 10, 40, 40), stream=logo)
+        for i in range(spec["images_per_page"]):
+            data = make_image(rng, width, height, rng.random() < spec["noise_ratio"], rng.random() < spec["jpeg_ratio"])
+            y = 60 + (i % 4) * 120
+            page.insert_image(fitz.Rect(320, y, 540, y + 110), stream=data)
+            images += 1
+        draw_boxes(page, rng, spec["drawings_per_page"])
+        if rng.random() < spec["table_ratio"]:
+            draw_table(page, rng)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return spec, {"images": images}
+
+def generate_toc(path, entries, seed=0, filler_pages=0):
+    """
+    목차 PDF: 페이지당 35줄의 "N장 제목 ..... 쪽" 항목 (쪽 번호는 증가 순서)
+    filler_pages: 목차 앞(절반)과 뒤에 붙일 목차 아닌 페이지 수. 앞쪽 첫 장은 표지 이미지입니다.
+    """
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    page_no = 5
+    for start in range(0, entries, 35):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for row, entry in enumerate(range(start, min(start + 35, entries))):
+            page_no += int(rng.integers(1, 12))
+            title = f"{entry + 1}장 " + " ".join(WORDS[i] for i in rng.integers(0, 10, size=3))
+            y = 60 + row * 21
+            page.insert_text((60, y), title, fontname="korea", fontsize=10)
+            page.insert_text((500, y), str(page_no), fontsize=10)
+
+    front = (filler_pages + 1) // 2
+    for i in range(filler_pages):
+        page = doc.new_page(pno=i if i < front else -1, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        if i == 0:
+            page.insert_image(page.rect, stream=make_image(rng, 600, 850, noise=True, jpeg=True))
+            continue
+        write_text(page, rng, 30)
+        page.insert_text((PAGE_WIDTH / 2, PAGE_HEIGHT - 20), str(i + 1), fontsize=9)
+    doc.save(path)
+    doc.close()
+    return page_no
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="벤치마크용 합성 PDF 생성")
+    parser.add_argument("output", help="생성할 본문 PDF 경로")
+    parser.add_argument("--spec", default=None, help='SYNTHETIC_DEFAULTS 덮어쓰기 (JSON, 예: \'{"pages": 100}\')')
+    parser.add_argument("--toc", default=None, metavar="TOC_PDF", help="목차 PDF 도 생성 (spec 의 toc_entries, 기본 60)")
+    parser.add_argument("--toc-filler", type=int, default=0, metavar="PAGES",
+                        help="--toc 와 함께: 목차 앞뒤에 붙일 표지/산문 페이지 수")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    spec, info = generate_book(args.output, json.loads(args.spec) if args.spec else None)
+    print(f"Saved '{args.output}': {spec['pages']} pages, {info['images']} images, "
+          f"{spec['drawings_per_page']} drawings/page")
+    if args.toc:
+        generate_toc(args.toc, spec["toc_entries"] or 60, spec["seed"], args.toc_filler)
+        print(f"Saved '{args.toc}': {spec['toc_entries'] or 60} TOC entries")
@@ -0,0 +1,379 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from image_index import normalize_book_id
+from pdf_pipeline import Pipeline, text_stage
+from toc_index import load_toc
+
+# === 로컬 페이지 텍스트 청크 + BM25 역색인 (Offline Text Retrieval) ===
+# 1) extract: 책의 페이지 텍스트를 파이프라인(pdf_pipeline.text_stage)으로 한 번 훑어
+#    페이지 단위 청크를 JSON Lines 로 스트리밍 기록합니다.
+#    {"id", "book", "page", "chapter", "text"} (chapter 는 toc_index.py 구간 인덱스로 조회)
+# 2) build: 청크를 토큰화하여 디스크 역색인(폴더)을 만듭니다. 모든 배열은 .npy 이며
+#    질의 시 np.load(mmap_mode="r") 로 메모리 매핑하므로 색인 전체를 읽어 들이지 않습니다.
+#      terms.npy    정렬된 용어 해시 (uint64)      postings 구간: starts/counts
+#      doc_ids.npy  포스팅 문서 번호 (uint32)      tfs.npy 용어 빈도 (uint16)
+#      doc_lens.npy 문서 길이 (토큰 수)             chunk_offsets.npy JSONL 내 청크 위치
+#      meta.json    문서 수, 평균 길이, 책/페이지/챕터 목록
+# 한국어는 띄어쓰기 단위 어절에 조사가 붙으므로 한글 토큰은 문자 n-gram(기본 2)으로 나눕니다.
+# ============================
+
+TEXT_CONFIG = {
+    "NGRAM": 2,        # 한글 토큰 문자 n-gram 크기
+    "K1": 1.2,         # BM25 용어 빈도 포화
+    "B": 0.75,         # BM25 문서 길이 정규화
+    "MIN_CHARS": 20,   # 이보다 짧은 페이지 텍스트는 청크로 만들지 않음 (빈 페이지/쪽번호만 있는 페이지)
+    "TOP_K": 10,
+}
+
+CHUNKS_FILE = "text_chunks.jsonl"
+INDEX_DIR = "text_index"
+INDEX_VERSION = 1
+
+WORD_PATTERN = re.compile(r"\w+")
+HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+# --- Tokenizer ---
+
+def tokenize(text, ngram=None):
+    """
+    NFKC + 소문자 정규화 후 단어 단위로 나눕니다.
+    한글이 들어간 단어는 문자 n-gram 으로, 나머지(영문/숫자)는 단어 그대로 토큰이 됩니다.
+    """
+    ngram = ngram or TEXT_CONFIG["NGRAM"]
+    tokens = []
+    for word in WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if HANGUL_PATTERN.search(word) and len(word) > ngram:
+            tokens.extend(word[i:i + ngram] for i in range(len(word) - ngram + 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+def term_hash(term):
+    """용어 -> 64비트 해시 (색인의 정렬 키)"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+# --- Chunk extraction ---
+
+class ChunkSink:
+    """
+    파이프라인의 텍스트 항목을 페이지 청크 JSONL 로 기록합니다. (쓰기 스레드에서 호출)
+    toc 가 있으면 (book, page) 의 챕터 제목을 붙입니다.
+    """
+
+    def __init__(self, file, toc=None):
+        self.file = file
+        self.toc = toc
+        self.written = 0
+
+    def write(self, item):
+        if item["kind"] != "text" or len(item["text"].strip()) < TEXT_CONFIG["MIN_CHARS"]:
+            return
+        book = normalize_book_id(item["book"])
+        chapter = self.toc.resolve(book, item["page"]) if self.toc else None
+        record = {"id": f"{book}:{item['page']}", "book": book, "page": item["page"],
+                  "chapter": chapter["title"] if chapter else None, "text": item["text"]}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.written += 1
+
+    def close(self, ok=True):
+        self.file.flush()
+
+def extract_chunks(pdf_paths, output_path=CHUNKS_FILE, toc_path=None):
+    """PDF 들의 페이지 텍스트를 청크 JSONL 로 씁니다. 반환: 기록한 청크 수"""
+    toc = load_toc(toc_path)
+    if toc is None:
+        print("No TOC found: chunks are written without chapter titles")
+
+    started = time.perf_counter()
+    total = 0
+    with open(f"{output_path}.tmp", "w", encoding="utf-8") as f:
+        for pdf_path in pdf_paths:
+            sink = ChunkSink(f, toc)
+            stats = Pipeline(stages=[text_stage], sinks=[sink]).run(pdf_path)
+            print(f"  {os.path.basename(pdf_path)}: {stats['pages']} pages -> {sink.written} chunks")
+            total += sink.written
+    os.replace(f"{output_path}.tmp", output_path)  # 도중에 실패하면 기존 청크 파일을 유지
+    print(f"Chunks saved to '{output_path}' ({total} chunks in {time.perf_counter() - started:.1f}s)")
+    return total
+
+def read_chunks(path):
+    """(바이트 위치, 청크) 를 순서대로 돌려줍니다."""
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            yield offset, json.loads(line)
+            offset += len(line)
+
+# --- Index ---
+
+def build_index(chunks_path=CHUNKS_FILE, index_dir=INDEX_DIR):
+    """청크 JSONL -> 디스크 역색인 폴더. 반환: meta"""
+    started = time.perf_counter()
+    term_ids = {}
+    posting_terms, posting_docs, posting_tfs = [], [], []
+    doc_lens, offsets, docs = [], [], []
+
+    for doc_id, (offset, chunk) in enumerate(read_chunks(chunks_path)):
+        counts = Counter(tokenize(chunk["text"]))
+        for term, tf in counts.items():
+            posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+            posting_docs.append(doc_id)
+            posting_tfs.append(min(tf, 65535))
+        doc_lens.append(sum(counts.values()))
+        offsets.append(offset)
+        docs.append([chunk["book"], chunk["page"], chunk["chapter"]])
+
+    hashes = np.fromiter((term_hash(term) for term in term_ids), dtype=np.uint64, count=len(term_ids))
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("term hash collision; rebuild with a different hash")
+
+    # 용어 해시 순으로 정렬하고 같은 용어 안에서는 문서 번호 순서를 유지합니다.
+    posting_keys = hashes[np.asarray(posting_terms, dtype=np.int64)]
+    order = np.argsort(posting_keys, kind="stable")
+    terms, starts, counts = np.unique(posting_keys[order], return_index=True, return_counts=True)
+
+    os.makedirs(index_dir, exist_ok=True)
+    arrays = {
+        "terms": terms,
+        "starts": starts.astype(np.uint64),
+        "counts": counts.astype(np.uint32),
+        "doc_ids": np.asarray(posting_docs, dtype=np.uint32)[order],
+        "tfs": np.asarray(posting_tfs, dtype=np.uint16)[order],
+        "doc_lens": np.asarray(doc_lens, dtype=np.uint32),
+        "chunk_offsets": np.asarray(offsets, dtype=np.uint64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "chunks": os.path.abspath(chunks_path),
+        "ngram": TEXT_CONFIG["NGRAM"],
+        "docs": len(docs),
+        "terms": len(terms),
+        "postings": len(posting_docs),
+        "avg_len": float(np.mean(doc_lens)) if doc_lens else 0.0,
+        "doc_meta": docs,
+    }
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+
+    size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in [f"{key}.npy" for key in arrays] + ["meta.json"])
+    print(f"Index saved to '{index_dir}': {meta['docs']} chunks, {meta['terms']} terms, {meta['postings']} postings, "
+          f"{size / 1024:.0f} KB in {time.perf_counter() - started:.1f}s")
+    return meta
+
+class TextIndex:
+    """
+    메모리 매핑된 BM25 역색인. 질의는 용어마다 searchsorted 한 번 + 포스팅 구간 벡터 연산입니다.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+        self.terms, self.starts, self.counts = load("terms"), load("starts"), load("counts")
+        self.doc_ids, self.tfs = load("doc_ids"), load("tfs")
+        self.doc_lens, self.chunk_offsets = load("doc_lens"), load("chunk_offsets")
+        self.docs = self.meta["doc_meta"]
+        self._norm = None
+        self._books = None
+
+    def _length_norm(self):
+        """문서별 k1 * (1 - b + b * len / avg_len) (첫 질의 때 한 번 계산)"""
+        if self._norm is None:
+            avg_len = self.meta["avg_len"] or 1.0
+            lens = np.asarray(self.doc_lens, dtype=np.float32)
+            self._norm = TEXT_CONFIG["K1"] * (1 - TEXT_CONFIG["B"] + TEXT_CONFIG["B"] * lens / avg_len)
+        return self._norm
+
+    def postings(self, term):
+        """용어의 (문서 번호 배열, 빈도 배열). 없으면 빈 배열"""
+        key = np.uint64(term_hash(term))
+        i = int(np.searchsorted(self.terms, key))
+        if i >= len(self.terms) or self.terms[i] != key:
+            return self.doc_ids[:0], self.tfs[:0]
+        start = int(self.starts[i])
+        end = start + int(self.counts[i])
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def scores(self, query):
+        """전체 문서의 BM25 점수 배열 (float32)"""
+        n_docs = self.meta["docs"]
+        norm = self._length_norm()
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term, query_tf in Counter(tokenize(query, self.meta["ngram"])).items():
+            docs, tfs = self.postings(term)
+            if len(docs) == 0:
+                continue
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            tfs = tfs.astype(np.float32)
+            scores[docs] += query_tf * idf * tfs * (TEXT_CONFIG["K1"] + 1) / (tfs + norm[docs])
+        return scores
+
+    def search(self, query, top_k=None, book=None):
+        """
+        상위 top_k 청크 [{"doc", "score", "book", "page", "chapter"}, ...] (점수 내림차순)
+        book 을 주면 해당 책으로 미리 거릅니다.
+        """
+        top_k = top_k or TEXT_CONFIG["TOP_K"]
+        scores = self.scores(query)
+        if book is not None:
+            if self._books is None:
+                self._books = np.asarray([doc[0] for doc in self.docs])
+            scores[self._books != normalize_book_id(book)] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            {"doc": int(i), "score": float(scores[i]), "book": self.docs[i][0], "page": self.docs[i][1],
+             "chapter": self.docs[i][2]}
+            for i in candidates
+        ]
+
+    def chunk(self, doc):
+        """청크 JSONL 에서 문서 하나를 읽습니다. (본문 확인용)"""
+        with open(self.meta["chunks"], "rb") as f:
+            f.seek(int(self.chunk_offsets[doc]))
+            return json.loads(f.readline())
+
+# --- Benchmark ---
+
+def make_synthetic_chunks(path, docs=20000, seed=0):
+    """무작위 한글 음절 단어로 된 청크 JSONL (책 25권, 페이지 텍스트 약 300단어)"""
+    rng = random.Random(seed)
+    syllables = [chr(0xAC00 + i) for i in range(0, 11172, 7)]
+    vocabulary = ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(30000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # Zipf 분포
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in range(docs):
+            words = rng.choices(vocabulary, weights=weights, k=300)
+            record = {"id": f"{doc % 25 + 1}:{doc // 25 + 1}", "book": str(doc % 25 + 1), "page": doc // 25 + 1,
+                      "chapter": None, "text": " ".join(words)}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def sample_queries(chunks_path, count, seed=0):
+    """청크 본문에서 2~4 단어 구를 뽑아 질의로 씁니다."""
+    rng = random.Random(seed)
+    texts = [chunk["text"] for _, chunk in read_chunks(chunks_path)]
+    queries = []
+    while texts and len(queries) < count:
+        words = rng.choice(texts).split()
+        if len(words) >= 4:
+            start = rng.randrange(len(words) - 3)
+            queries.append(" ".join(words[start:start + rng.randint(2, 4)]))
+    return queries
+
+def scan_search(chunks, query, top_k):
+    """비교용: 청크 전체를 토큰화 없이 부분 문자열 출현 수로 훑는 선형 탐색"""
+    words = query.split()
+    scores = [(sum(text.count(word) for word in words), i) for i, text in enumerate(chunks)]
+    return sorted((item for item in scores if item[0] > 0), reverse=True)[:top_k]
+
+def benchmark(index_dir=INDEX_DIR, queries=200, top_k=None):
+    """질의 지연 (p50/p95, 첫 질의 포함 콜드 오픈) vs 선형 탐색"""
+    top_k = top_k or TEXT_CONFIG["TOP_K"]
+    started = time.perf_counter()
+    index = TextIndex(index_dir)
+    index.search("워밍업", top_k)
+    open_ms = (time.perf_counter() - started) * 1e3
+
+    samples = sample_queries(index.meta["chunks"], queries)
+    latencies = []
+    for query in samples:
+        start = time.perf_counter()
+        index.search(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    latencies.sort()
+
+    chunks = [chunk["text"] for _, chunk in read_chunks(index.meta["chunks"])]
+    scan_samples = samples[:min(len(samples), 20)]
+    start = time.perf_counter()
+    for query in scan_samples:
+        scan_search(chunks, query, top_k)
+    scan_ms = (time.perf_counter() - start) / max(len(scan_samples), 1) * 1e3
+
+    result = {
+        "docs": index.meta["docs"],
+        "terms": index.meta["terms"],
+        "open_ms": open_ms,
+        "p50_ms": latencies[len(latencies) // 2] if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        "scan_ms": scan_ms,
+    }
+    print(f"Index: {result['docs']} chunks, {result['terms']} terms (open + first query {open_ms:.1f} ms)")
+    print(f"  BM25 top-{top_k}  : p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms ({len(samples)} queries)")
+    print(f"  Linear scan  : {scan_ms:.2f} ms/query")
+    return result
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="페이지 텍스트 청크 + BM25 역색인 (오프라인 검색)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    extract = sub.add_parser("extract", help="PDF 페이지 텍스트 -> 청크 JSONL")
+    extract.add_argument("pdfs", nargs="*")
+    extract.add_argument("--sources", metavar="PDF_DIR", default=None,
+                         help="src/lib/sources.json 의 모든 책을 PDF_DIR 에서 찾아 추출")
+    extract.add_argument("--toc", default=None, help="toc_index.json 또는 toc_analysis_results.json")
+    extract.add_argument("--output", default=CHUNKS_FILE)
+
+    build = sub.add_parser("build", help="청크 JSONL -> 역색인 폴더")
+    build.add_argument("chunks", nargs="?", default=CHUNKS_FILE)
+    build.add_argument("--output", default=INDEX_DIR)
+
+    query = sub.add_parser("query", help="상위 k 청크 검색")
+    query.add_argument("query")
+    query.add_argument("--index", default=INDEX_DIR)
+    query.add_argument("--top-k", type=int, default=None)
+    query.add_argument("--book", default=None)
+
+    bench = sub.add_parser("bench", help="질의 지연 벤치마크")
+    bench.add_argument("--index", default=INDEX_DIR)
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--synthetic", type=int, default=0, metavar="DOCS",
+                       help="--index 폴더에 무작위 한글 청크 DOCS 개로 색인을 새로 만들어 측정")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "extract":
+        if args.sources:
+            from extract_images import resolve_source_pdfs
+            targets = resolve_source_pdfs(args.sources)
+        else:
+            targets = args.pdfs
+        for path in targets:
+            if not os.path.exists(path):
+                print(f"File not found: {path}")
+        targets = [path for path in targets if os.path.exists(path)]
+        if targets:
+            extract_chunks(targets, args.output, args.toc)
+        else:
+            print("Please provide a valid PDF file path.")
+    elif args.command == "build":
+        build_index(args.chunks, args.output)
+    elif args.command == "query":
+        index = TextIndex(args.index)
+        for hit in index.search(args.query, args.top_k, args.book):
+            preview = index.chunk(hit["doc"])["text"][:80].replace("\n", " ")
+            print(f"{hit['score']:7.2f}  book {hit['book']} p.{hit['page']} [{hit['chapter']}] {preview}")
+    else:
+        if args.synthetic:
+            os.makedirs(args.index, exist_ok=True)
+            chunks_path = os.path.join(args.index, "synthetic_chunks.jsonl")
+            make_synthetic_chunks(chunks_path, args.synthetic)
+            build_index(chunks_path, args.index)
+        benchmark(args.index, args.queries)
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from bisect import bisect_right
+
+from image_index import normalize_book_id
+
+# === 페이지 -> 챕터 구간 인덱스 (Page -> Chapter Interval Index) ===
+# toc_analysis_results.json 을 책별 정렬된 시작 페이지 배열로 컴파일하여
+# (book, page) 가 속한 챕터를 이진 탐색(bisect)으로 찾습니다.
+# 형식: {"version": 1, "books": {"1": {"starts": [...], "ends": [...], "titles": [...]}}}
+# 추출 범위 지정: 추출기의 --chapter TITLE / --pages 12-30,45 를 처리할 페이지 목록으로 바꿉니다. (select_pages)
+# ============================
+
+TOC_FILE = "toc_analysis_results.json"
+INDEX_FILE = "toc_index.json"
+INDEX_VERSION = 1
+
+class TocIndex:
+    """
+    책별 구간 배열. starts/ends 는 array('i'), 조회는 O(log n) 입니다.
+    """
+
+    def __init__(self):
+        self.books = {}
+
+    def add_book(self, book, chapters, page_count=None):
+        """
+        chapters: [{"title", "start_page", "end_page"}] (format_toc_ranges 결과)
+        page_count 가 있으면 마지막 챕터의 끝 페이지를 문서 끝으로 설정합니다.
+        """
+        chapters = sorted(chapters, key=lambda chapter: chapter["start_page"])
+        starts = array("i", (chapter["start_page"] for chapter in chapters))
+        ends = array("i")
+        for i, chapter in enumerate(chapters):
+            if i < len(chapters) - 1:
+                ends.append(max(chapter["start_page"], chapters[i + 1]["start_page"] - 1))
+            elif page_count:
+                ends.append(max(chapter["start_page"], page_count))
+            else:
+                ends.append(chapter["end_page"])
+        self.books[normalize_book_id(book)] = (starts, ends, [chapter["title"] for chapter in chapters])
+
+    def resolve(self, book, page):
+        """{"title", "start_page", "end_page"} 또는 None (목차 범위 밖)"""
+        entry = self.books.get(normalize_book_id(book))
+        if entry is None:
+            return None
+        starts, ends, titles = entry
+        i = bisect_right(starts, page) - 1
+        if i < 0 or page > ends[i]:
+            return None
+        return {"title": titles[i], "start_page": starts[i], "end_page": ends[i]}
+
+    def chapters(self, book):
+        """[{"title", "start_page", "end_page"}, ...] (시작 페이지 순, 없으면 빈 리스트)"""
+        entry = self.books.get(normalize_book_id(book))
+        if entry is None:
+            return []
+        starts, ends, titles = entry
+        return [{"title": title, "start_page": start, "end_page": end} for start, end, title in zip(starts, ends, titles)]
+
+    def find_chapter(self, book, query):
+        """
+        제목으로 챕터를 찾습니다. 정확히 같은 제목을 우선하고, 없으면 공백/대소문자를 무시한 부분 일치가
+        하나뿐일 때 그 챕터를 돌려줍니다. 없거나 여러 개가 걸리면 ValueError.
+        """
+        chapters = self.chapters(book)
+        if not chapters:
+            raise ValueError(f"No TOC entries for book '{book}'")
+        exact = [chapter for chapter in chapters if chapter["title"] == query]
+        if exact:
+            return exact[0]
+        folded = "".join(query.split()).casefold()
+        partial = [chapter for chapter in chapters if folded in "".join(chapter["title"].split()).casefold()]
+        if len(partial) == 1:
+            return partial[0]
+        if not partial:
+            raise ValueError(f"No chapter matching '{query}' in book '{book}'")
+        raise ValueError(f"'{query}' matches {len(partial)} chapters in book '{book}': "
+                         + ", ".join(chapter["title"] for chapter in partial[:5]))
+
+    def resolve_many(self, hits):
+        """
+        여러 (book, page) 를 한 번에 조회합니다. 책 ID 정규화와 배열 조회를 책별로 한 번만 수행합니다.
+        반환: hits 와 같은 순서의 결과 리스트
+        """
+        results = [None] * len(hits)
+        by_book = {}
+        for position, (book, page) in enumerate(hits):
+            by_book.setdefault(book, []).append((position, page))
+
+        for book, positions in by_book.items():
+            entry = self.books.get(normalize_book_id(book))
+            if entry is None:
+                continue
+            starts, ends, titles = entry
+            for position, page in positions:
+                i = bisect_right(starts, page) - 1
+                if i >= 0 and page <= ends[i]:
+                    results[position] = {"title": titles[i], "start_page": starts[i], "end_page": ends[i]}
+        return results
+
+    def to_json(self):
+        return {
+            "version": INDEX_VERSION,
+            "books": {
+                book: {"starts": list(starts), "ends": list(ends), "titles": titles}
+                for book, (starts, ends, titles) in self.books.items()
+            },
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        for book, entry in data["books"].items():
+            index.books[book] = (array("i", entry["starts"]), array("i", entry["ends"]), entry["titles"])
+        return index
+
+def load_toc(path=None):
+    """
+    챕터 조회용 구간 인덱스. path 는 toc_index.json 또는 toc_analysis_results.json 이며,
+    없으면 현재 폴더의 toc_index.json -> toc_analysis_results.json 순으로 찾습니다. (없으면 None)
+    """
+    for candidate in ([path] if path else [INDEX_FILE, TOC_FILE]):
+        if os.path.exists(candidate):
+            with open(candidate, "r", encoding="utf-8") as f:
+                compiled = "books" in json.load(f)
+            return TocIndex.load(candidate) if compiled else build_toc_index(candidate)
+    return None
+
+def parse_page_ranges(text):
+    """'12-30,45' -> [12, 13, ..., 30, 45] (1부터, 정렬, 중복 제거)"""
+    pages = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        first, last = int(first), int(last or first)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}'")
+        pages.update(range(first, last + 1))
+    return sorted(pages)
+
+def select_pages(toc, book, chapters=(), pages=None, page_count=None):
+    """
+    챕터 제목(chapters)과 페이지 범위 문자열(pages)을 합친 처리 대상 페이지 목록 (1부터, 정렬).
+    page_count 를 넘는 페이지는 버립니다. 둘 다 비어 있으면 None (문서 전체).
+    """
+    if not chapters and not pages:
+        return None
+    selected = set(parse_page_ranges(pages)) if pages else set()
+    for query in chapters:
+        if toc is None:
+            raise ValueError("--chapter needs a TOC (toc_index.json or toc_analysis_results.json)")
+        chapter = toc.find_chapter(book, query)
+        selected.update(range(chapter["start_page"], chapter["end_page"] + 1))
+    return sorted(page for page in selected if page_count is None or page <= page_count)
+
+def add_arguments(parser):
+    """추출기 공통 범위 옵션: --chapter (반복 가능), --pages, --toc"""
+    parser.add_argument("--chapter", action="append", default=[], metavar="TITLE",
+                        help="목차의 챕터 제목(부분 일치)에 해당하는 페이지만 처리 (여러 번 지정 가능)")
+    parser.add_argument("--pages", default=None, metavar="RANGES", help="처리할 페이지 범위 (예: 12-30,45, 1부터)")
+    parser.add_argument("--toc", default=None, metavar="TOC_JSON",
+                        help="챕터 조회용 toc_index.json 또는 toc_analysis_results.json (기본값: 현재 폴더에서 찾기). "
+                             "지정하면 출력에 챕터 제목을 기록")
+
+def count_book_pages(pdf_dir):
+    """PDF 폴더의 '{book}-Main.pdf' (또는 '{book}.pdf') 페이지 수 {정규화된 책 ID: 페이지 수}"""
+    import fitz  # PyMuPDF (페이지 수 확인 시에만 필요)
+
+    page_counts = {}
+    for name in sorted(os.listdir(pdf_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() != ".pdf" or not stem[:2].isdigit() or "Content" in stem:
+            continue
+        with fitz.open(os.path.join(pdf_dir, name)) as doc:
+            page_counts.setdefault(normalize_book_id(stem), len(doc))
+    return page_counts
+
+def build_toc_index(toc_path=TOC_FILE, page_counts=None):
+    """toc_analysis_results.json 에서 구간 인덱스를 만듭니다."""
+    with open(toc_path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+
+    page_counts = page_counts or {}
+    index = TocIndex()
+    for book, entry in results.items():
+        index.add_book(book, entry["toc"], page_counts.get(normalize_book_id(book)))
+    return index
+
+def linear_resolve(results, book, page):
+    """비교용: toc_analysis_results.json 을 선형 탐색"""
+    for key, entry in results.items():
+        if normalize_book_id(key) != normalize_book_id(book):
+            continue
+        for chapter in entry["toc"]:
+            if chapter["start_page"] <= page <= chapter["end_page"]:
+                return chapter["title"]
+    return None
+
+def benchmark(index, toc_path=TOC_FILE, hits=100000):
+    """배치 조회(resolve_many) vs 단건 조회(resolve) vs JSON 선형 탐색"""
+    with open(toc_path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+
+    books = list(index.books)
+    samples = []
+    for _ in range(hits):
+        book = random.choice(books)
+        samples.append((book, random.randint(1, index.books[book][1][-1])))
+
+    start = time.perf_counter()
+    index.resolve_many(samples)
+    batch_us = (time.perf_counter() - start) / hits * 1e6
+
+    start = time.perf_counter()
+    for book, page in samples:
+        index.resolve(book, page)
+    single_us = (time.perf_counter() - start) / hits * 1e6
+
+    linear_samples = samples[:min(hits, 10000)]
+    start = time.perf_counter()
+    for book, page in linear_samples:
+        linear_resolve(results, book, page)
+    linear_us = (time.perf_counter() - start) / len(linear_samples) * 1e6
+
+    print(f"{len(books)} books, {hits} hits")
+    print(f"  resolve_many : {batch_us:.3f} us/hit")
+    print(f"  resolve      : {single_us:.3f} us/hit")
+    print(f"  linear scan  : {linear_us:.3f} us/hit")
+    return {"batch_us": batch_us, "single_us": single_us, "linear_us": linear_us}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="페이지 -> 챕터 구간 인덱스")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="toc_analysis_results.json 에서 인덱스 생성")
+    build.add_argument("--toc", default=TOC_FILE)
+    build.add_argument("--pdf-dir", default=None, help="실제 끝 페이지 계산용 본문 PDF 폴더")
+    build.add_argument("--output", default=INDEX_FILE)
+
+    lookup = sub.add_parser("lookup", help="(book, page) 조회")
+    lookup.add_argument("book")
+    lookup.add_argument("page", type=int)
+    lookup.add_argument("--index", default=INDEX_FILE)
+
+    bench = sub.add_parser("bench", help="배치 조회 vs 선형 탐색 벤치마크")
+    bench.add_argument("--toc", default=TOC_FILE)
+    bench.add_argument("--hits", type=int, default=100000)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "build":
+        page_counts = count_book_pages(args.pdf_dir) if args.pdf_dir else None
+        index = build_toc_index(args.toc, page_counts)
+        index.save(args.output)
+        print(f"Index saved to '{args.output}' ({len(index.books)} books)")
+    elif args.command == "lookup":
+        print(TocIndex.load(args.index).resolve(args.book, args.page))
+    else:
+        benchmark(build_toc_index(args.toc), args.toc, args.hits)
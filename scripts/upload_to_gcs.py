@@ -1,7 +1,13 @@
-
-from google.cloud import storage
 import os
 import sys
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from instrumentation import METRICS, add_arguments as add_metrics_arguments, count, observe, span
+from storage_backends import GCSBackend, LocalBackend, file_crc32c_base64, file_md5_base64
 
 # 설정
 PROJECT_ID = "rag-bighistory"  # GCP 프로젝트 ID
@@ -9,56 +15,299 @@ BUCKET_NAME = "20set-bighistory-raw" # 기존 버킷 사용
 SOURCE_DIR = "temp_images"
 DESTINATION_FOLDER = "extracted_images/" # 버킷 내 저장 폴더
 
-def upload_directory_to_gcs(bucket_name, source_directory, destination_blob_folder):
+# 동시 업로드 설정
+UPLOAD_CONFIG = {
+    "WORKERS": 16,         # 동시 요청 수 (업로드/삭제)
+    "MAX_RETRIES": 5,      # 일시적 오류 시 재시도 횟수
+    "BACKOFF_BASE": 0.5,   # 재시도 대기 시간 기본값 (초, 지수 증가)
+    "BACKOFF_MAX": 30.0,   # 재시도 대기 시간 상한 (초)
+    "PROGRESS_EVERY": 50,  # 진행 상황 출력 간격 (파일 수)
+}
+
+# 색인(카탈로그) 파일: 가리키는 객체가 모두 올라간 뒤 마지막에 업로드
+CATALOG_FILES = ("image_index.json", "pack_index.json")
+
+class TransferStats:
+    """스레드 안전한 전송 통계 (건수, 바이트, 재시도, 실패, 처리량)"""
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.retries = 0
+        self.failed = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, size=0):
+        count("transfer_files", op=self.label.lower())
+        if size:
+            count("transfer_bytes", size, op=self.label.lower())
+            observe("transfer_file_bytes", size, op=self.label.lower())
+        with self._lock:
+            self.done += 1
+            self.bytes += size
+            if self.done % UPLOAD_CONFIG["PROGRESS_EVERY"] == 0:
+                print(f"{self.label} {self.done}/{self.total} files...")
+
+    def record_retry(self):
+        count("transfer_retries", op=self.label.lower())
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self, name, error):
+        count("transfer_failures", op=self.label.lower(), error=type(error).__name__)
+        with self._lock:
+            self.failed.append((name, str(error)))
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "files": self.done,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "failed": len(self.failed),
+            "seconds": elapsed,
+            "files_per_sec": self.done / elapsed if elapsed > 0 else 0,
+            "mb_per_sec": self.bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0,
+        }
+
+    def report(self):
+        summary = self.summary()
+        print(f"{self.label} {summary['files']}/{self.total} files, {summary['bytes'] / (1024 * 1024):.1f} MB "
+              f"in {summary['seconds']:.1f}s ({summary['files_per_sec']:.1f} files/s, {summary['mb_per_sec']:.2f} MB/s), "
+              f"retries {summary['retries']}, failed {summary['failed']}")
+        for name, error in self.failed[:10]:
+            print(f"  Failed: {name} ({error})")
+
+def call_with_retry(backend, stats, fn, *args):
+    """일시적 오류는 지수 백오프(+지터)로 재시도합니다."""
+    for attempt in range(UPLOAD_CONFIG["MAX_RETRIES"] + 1):
+        try:
+            with span("transfer.file", op=stats.label.lower(), file=args[-1], attempt=attempt):
+                return fn(*args)
+        except backend.transient_errors:
+            if attempt == UPLOAD_CONFIG["MAX_RETRIES"]:
+                raise
+            stats.record_retry()
+            delay = min(UPLOAD_CONFIG["BACKOFF_MAX"], UPLOAD_CONFIG["BACKOFF_BASE"] * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+def run_concurrently(backend, label, jobs, workers):
+    """
+    (name, size, fn, args) 작업 목록을 제한된 스레드 풀에서 실행합니다.
+    """
+    stats = TransferStats(label, len(jobs))
+    if not jobs:
+        return stats
+
+    with span("transfer.batch", op=label.lower(), files=len(jobs), workers=workers), \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(call_with_retry, backend, stats, fn, *args): (name, size) for name, size, fn, args in jobs}
+        for future in as_completed(futures):
+            name, size = futures[future]
+            try:
+                future.result()
+                stats.record(size)
+            except Exception as e:
+                stats.record_failure(name, e)
+
+    stats.report()
+    return stats
+
+def upload_catalogs_last(backend, jobs, workers):
+    """
+    업로드 작업 중 색인 파일(CATALOG_FILES)은 나머지 객체가 모두 올라간 뒤에 올립니다.
+    서버가 새 색인을 읽는 시점에는 색인이 가리키는 객체가 이미 있습니다.
+    객체 업로드가 하나라도 실패하면 색인은 올리지 않습니다 (이전 색인이 계속 서빙됨).
+    """
+    objects, catalogs = [], []
+    for job in jobs:
+        (catalogs if job[0].rsplit("/", 1)[-1] in CATALOG_FILES else objects).append(job)
+
+    stats = run_concurrently(backend, "Uploaded", objects, workers)
+    if not catalogs:
+        return stats
+    if stats.failed:
+        print(f"Skipped {len(catalogs)} catalog files ({', '.join(job[0] for job in catalogs)}): "
+              f"{len(stats.failed)} uploads failed")
+        return stats
+
+    catalog_stats = run_concurrently(backend, "Uploaded", catalogs, workers)
+    stats.total += catalog_stats.total
+    stats.done += catalog_stats.done
+    stats.bytes += catalog_stats.bytes
+    stats.failed.extend(catalog_stats.failed)
+    return stats
+
+def list_local_files(source_directory):
+    """
+    업로드 대상 로컬 파일 목록 [(상대 경로, 전체 경로)] (하위 폴더 포함, .DS_Store 등 숨김 파일 제외)
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(source_directory):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            local_path = os.path.join(dirpath, filename)
+            files.append((os.path.relpath(local_path, source_directory).replace(os.sep, "/"), local_path))
+    return files
+
+def upload_directory(backend, source_directory, destination_folder, workers=None):
+    """
+    로컬 폴더의 모든 파일을 저장소의 특정 폴더로 업로드합니다. (기존 파일 삭제 후 업로드)
+    """
+    workers = workers or UPLOAD_CONFIG["WORKERS"]
+
+    # 1. 기존 파일 삭제 (Clean Upload)
+    existing = backend.list(destination_folder)
+    if existing:
+        print(f"Cleaning up {len(existing)} existing files in '{backend.url(destination_folder)}'...")
+        run_concurrently(backend, "Deleted", [(name, 0, backend.delete, (name,)) for name in existing], workers)
+        print("Cleanup complete.")
+
+    # 2. 동시 업로드
+    files = list_local_files(source_directory)
+    print(f"Found {len(files)} files in '{source_directory}'. Uploading to {backend.url(destination_folder)} ({workers} workers)...")
+    jobs = [
+        (relative_path, os.path.getsize(local_path), backend.upload, (local_path, f"{destination_folder}{relative_path}"))
+        for relative_path, local_path in files
+    ]
+    stats = upload_catalogs_last(backend, jobs, workers)
+
+    print(f"Upload Complete! Total {stats.done} files uploaded.")
+    print(f"Sample URL: {backend.url(destination_folder + (files[0][0] if files else ''))}")
+    return stats
+
+def is_unchanged(local_path, size, remote):
+    """크기가 같고 체크섬(MD5, 없으면 CRC32C)이 일치하면 변경 없음으로 판정합니다."""
+    if remote["size"] != size:
+        return False
+    if remote.get("md5"):
+        return remote["md5"] == file_md5_base64(local_path)
+    if remote.get("crc32c"):
+        return remote["crc32c"] == file_crc32c_base64(local_path)
+    return False
+
+def plan_sync(backend, source_directory, destination_folder):
+    """
+    로컬 폴더와 원격 목록을 비교하여 업로드(신규/변경)와 삭제(원격에만 있음) 계획을 세웁니다.
+    """
+    remote = backend.list_objects(destination_folder)
+    plan = {"new": [], "changed": [], "delete": [], "unchanged": 0, "upload_bytes": 0}
+    local_names = set()
+
+    for relative_path, local_path in list_local_files(source_directory):
+        name = f"{destination_folder}{relative_path}"
+        local_names.add(name)
+        size = os.path.getsize(local_path)
+
+        if name not in remote:
+            plan["new"].append((name, local_path, size))
+        elif not is_unchanged(local_path, size, remote[name]):
+            plan["changed"].append((name, local_path, size))
+        else:
+            plan["unchanged"] += 1
+            continue
+        plan["upload_bytes"] += size
+
+    plan["delete"] = sorted(name for name in remote if name not in local_names)
+    return plan
+
+def print_sync_plan(plan, limit=20):
+    print(f"Sync plan: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+          f"{len(plan['delete'])} stale, {plan['unchanged']} unchanged "
+          f"({plan['upload_bytes'] / 1024:.1f} KB to upload)")
+    for label, key in (("+", "new"), ("~", "changed")):
+        for name, _, size in plan[key][:limit]:
+            print(f"  {label} {name} ({size / 1024:.1f} KB)")
+    for name in plan["delete"][:limit]:
+        print(f"  - {name}")
+
+def sync_directory(backend, source_directory, destination_folder, workers=None, dry_run=False):
+    """
+    변경분만 동기화합니다. 신규/변경 파일을 먼저 업로드하고, 오래된 파일은 마지막에 삭제하므로
+    게시 중에도 서빙 중인 파일이 비지 않습니다. 업로드가 하나라도 실패하면 삭제 단계는 건너뜁니다.
+    """
+    workers = workers or UPLOAD_CONFIG["WORKERS"]
+    plan = plan_sync(backend, source_directory, destination_folder)
+    print_sync_plan(plan)
+    if dry_run:
+        print("Dry run: nothing transferred.")
+        return plan
+
+    uploads = plan["new"] + plan["changed"]
+    stats = upload_catalogs_last(backend, [(name, size, backend.upload, (path, name)) for name, path, size in uploads], workers)
+    if stats.failed:
+        print(f"Sync incomplete: {len(stats.failed)} uploads failed, skipped deleting {len(plan['delete'])} stale files. "
+              f"Re-run to retry.")
+        return plan
+    run_concurrently(backend, "Deleted", [(name, 0, backend.delete, (name,)) for name in plan["delete"]], workers)
+    print("Sync Complete!")
+    return plan
+
+def upload_directory_to_gcs(bucket_name, source_directory, destination_blob_folder, workers=None):
     """
     로컬 폴더의 모든 파일을 GCS 버킷의 특정 폴더로 업로드합니다.
     """
     try:
-        storage_client = storage.Client(project=PROJECT_ID)
-        bucket = storage_client.bucket(bucket_name)
-
-        # 1. 기존 파일 삭제 (Clean Upload)
-        blobs = list(bucket.list_blobs(prefix=destination_blob_folder))
-        if blobs:
-            print(f"Cleaning up {len(blobs)} existing files in 'gs://{bucket_name}/{destination_blob_folder}'...")
-            for blob in blobs:
-                blob.delete()
-            print("Cleanup complete.")
-
-        files = os.listdir(source_directory)
-        print(f"Found {len(files)} files in '{source_directory}'. Uploading to gs://{bucket_name}/{destination_blob_folder}...")
-
-        count = 0
-        for filename in files:
-            local_path = os.path.join(source_directory, filename)
-            
-            # 파일만 업로드
-            if os.path.isfile(local_path):
-                # .DS_Store 등 시스템 파일 제외
-                if filename.startswith("."):
-                    continue
-                    
-                blob_path = f"{destination_blob_folder}{filename}"
-                blob = bucket.blob(blob_path)
-                
-                # 이미 존재하는지 체크 (선택 사항: 덮어쓰기 방지하려면 사용)
-                # if blob.exists():
-                #     print(f"Skipping {filename} (already exists)")
-                #     continue
-                
-                blob.upload_from_filename(local_path)
-                count += 1
-                if count % 10 == 0:
-                    print(f"Uploaded {count} files...")
-
-        print(f"Upload Complete! Total {count} files uploaded.")
-        print(f"Sample URL: gs://{bucket_name}/{destination_blob_folder}{files[0] if files else ''}")
-        
+        return upload_directory(GCSBackend(bucket_name, PROJECT_ID), source_directory, destination_blob_folder, workers)
     except Exception as e:
         print(f"Error checking GCS: {e}")
 
+def benchmark_upload(source_directory, latency_ms=50, worker_counts=(1, 4, 16, 32)):
+    """
+    LocalBackend(요청당 latency_ms 지연)로 동시성 수준별 업로드 처리량을 오프라인 측정합니다.
+    """
+    import tempfile
+
+    results = {}
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as root:
+            backend = LocalBackend(root, latency_ms=latency_ms)
+            print(f"--- {workers} workers (simulated latency {latency_ms} ms) ---")
+            results[workers] = upload_directory(backend, source_directory, DESTINATION_FOLDER, workers).summary()
+
+    print("Benchmark Summary:")
+    for workers, summary in results.items():
+        print(f"  {workers:>3} workers: {summary['seconds']:.2f}s, {summary['files_per_sec']:.1f} files/s")
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="추출 이미지 업로드 (GCS 또는 로컬 백엔드)")
+    parser.add_argument("--source", default=SOURCE_DIR, help="업로드할 로컬 폴더")
+    parser.add_argument("--dest", default=DESTINATION_FOLDER, help="저장소 내 대상 폴더")
+    parser.add_argument("--backend", choices=["gcs", "local"], default="gcs")
+    parser.add_argument("--bucket", default=BUCKET_NAME, help="GCS 버킷 이름 (--backend gcs)")
+    parser.add_argument("--local-root", default="local_bucket", help="로컬 백엔드 루트 폴더 (--backend local)")
+    parser.add_argument("--workers", type=int, default=None, help="동시 요청 수")
+    parser.add_argument("--sync", action="store_true", help="전체 삭제 후 재업로드 대신 변경분만 동기화")
+    parser.add_argument("--dry-run", action="store_true", help="동기화 계획만 출력하고 전송하지 않음 (--sync 포함)")
+    parser.add_argument("--bench", action="store_true", help="로컬 백엔드로 동시성별 업로드 처리량 측정")
+    parser.add_argument("--latency-ms", type=float, default=50, help="--bench 시 요청당 모의 지연 (ms)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    # --dry-run 은 동기화 계획 출력이므로 삭제 후 재업로드 경로로 가지 않도록 --sync 를 함께 켭니다
+    args.sync = args.sync or args.dry_run
+    return args
+
 if __name__ == "__main__":
-    if os.path.exists(SOURCE_DIR):
-        upload_directory_to_gcs(BUCKET_NAME, SOURCE_DIR, DESTINATION_FOLDER)
+    args = parse_args(sys.argv[1:])
+    if args.metrics:
+        METRICS.configure(args.metrics)
+
+    if not os.path.exists(args.source):
+        print(f"Source directory '{args.source}' not found. Run extract_images.py first.")
+    elif args.bench:
+        benchmark_upload(args.source, args.latency_ms)
+    elif args.sync:
+        backend = LocalBackend(args.local_root) if args.backend == "local" else GCSBackend(args.bucket, PROJECT_ID)
+        sync_directory(backend, args.source, args.dest, args.workers, args.dry_run)
+    elif args.backend == "local":
+        upload_directory(LocalBackend(args.local_root), args.source, args.dest, args.workers)
     else:
-        print(f"Source directory '{SOURCE_DIR}' not found. Run extract_images.py first.")
+        upload_directory_to_gcs(args.bucket, args.source, args.dest, args.workers)
+
+    METRICS.close()
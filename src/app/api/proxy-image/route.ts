@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { getMatchingImages } from '@/lib/gcs-info';
+import { getMatchingImages, getPackedImage } from '@/lib/gcs-info';
 
 export const dynamic = 'force-dynamic';
 
@@ -8,6 +8,8 @@ export async function GET(req: NextRequest) {
     const bookId = searchParams.get('bookId');
     const page = searchParams.get('page');
     const index = parseInt(searchParams.get('index') || '0', 10);
+    // Optional display width: serves a fixed-width thumbnail derivative when one is indexed
+    const width = parseInt(searchParams.get('w') || '', 10);
 
     if (!bookId || !page) {
         return new NextResponse('Missing bookId or page', { status: 400 });
@@ -19,8 +21,26 @@ export async function GET(req: NextRequest) {
             return new NextResponse('Invalid page number', { status: 400 });
         }
 
+        // Full-size originals packed per book: one range read, served directly (no redirect round trip)
+        if (isNaN(width) || width <= 0) {
+            const packed = await getPackedImage(bookId, pageNum, index);
+            if (packed) {
+                return new NextResponse(new Uint8Array(packed.data), {
+                    headers: {
+                        'Content-Type': packed.contentType,
+                        'Content-Length': String(packed.data.length),
+                        // The URL is not versioned: a republished pack changes these bytes once the catalog reloads
+                        'Cache-Control': 'public, max-age=300',
+                    },
+                });
+            }
+        }
+
         // Fetch Signed URLs (using our robust cached credentials)
-        const imageUrls = await getMatchingImages(bookId, pageNum);
+        const imageUrls = await getMatchingImages(bookId, pageNum, {
+            width: isNaN(width) || width <= 0 ? undefined : width,
+            accept: req.headers.get('accept'),
+        });
 
         if (imageUrls.length === 0 || !imageUrls[index]) {
             // Return a placeholder or 404
@@ -0,0 +1,116 @@
+import type { Bucket } from '@google-cloud/storage';
+
+// Prebuilt (book, page) -> images index, written by scripts/extract_images.py --index
+// or scripts/image_index.py build. Format:
+// { "version": 1, "prefix": "extracted_images/", "books": { "15": { "114": [[name, width, height, size], ...] } } }
+// Entries may carry a fifth element with WebP/AVIF derivatives (scripts/image_derivatives.py):
+// [name, width, height, size, [[name, width, height, size], ...]]
+export const IMAGE_INDEX_PATH = 'extracted_images/image_index.json';
+
+// Reload the index periodically so a republish is picked up without a redeploy
+const INDEX_TTL_MS = 1000 * 60 * 10;
+
+type VariantEntry = [name: string, width: number, height: number, size: number];
+type IndexEntry = [name: string, width: number, height: number, size: number, variants?: VariantEntry[]];
+
+interface ImageIndexFile {
+    version: number;
+    prefix: string;
+    books: { [bookId: string]: { [page: string]: IndexEntry[] } };
+}
+
+export interface ImageVariant {
+    blob: string;
+    width: number;
+    height: number;
+    size: number;
+}
+
+export interface IndexedImage extends ImageVariant {
+    variants: ImageVariant[];
+}
+
+// Derivative formats and the Accept header token a client must send to receive them
+const VARIANT_MIME: { [ext: string]: string } = { webp: 'image/webp', avif: 'image/avif' };
+
+let cachedIndex: { data: ImageIndexFile | null; loadedAt: number } | null = null;
+let pendingLoad: Promise<ImageIndexFile | null> | null = null;
+
+async function loadIndex(bucket: Bucket): Promise<ImageIndexFile | null> {
+    try {
+        const [contents] = await bucket.file(IMAGE_INDEX_PATH).download();
+        return JSON.parse(contents.toString('utf-8')) as ImageIndexFile;
+    } catch (error: any) {
+        // Missing index is expected until the first indexed publish; callers fall back to listing
+        console.warn(`Image index unavailable (${IMAGE_INDEX_PATH}): ${error.message}`);
+        return null;
+    }
+}
+
+async function getIndex(bucket: Bucket): Promise<ImageIndexFile | null> {
+    if (cachedIndex && Date.now() - cachedIndex.loadedAt < INDEX_TTL_MS) {
+        return cachedIndex.data;
+    }
+    // Share one download between concurrent requests
+    if (!pendingLoad) {
+        pendingLoad = loadIndex(bucket).then(data => {
+            cachedIndex = { data, loadedAt: Date.now() };
+            pendingLoad = null;
+            return data;
+        });
+    }
+    return pendingLoad;
+}
+
+/**
+ * Resolves the images of a book page from the in-memory index.
+ * Returns null when no index is available or the book is not in it (the index may cover only some
+ * books), so the caller can fall back to prefix listing. A page of an indexed book without images
+ * returns an empty list.
+ */
+export async function lookupIndexedImages(bucket: Bucket, bookId: string, page: number): Promise<IndexedImage[] | null> {
+    const index = await getIndex(bucket);
+    if (!index) return null;
+
+    // Normalize bookId: "02" -> "2" (same as the index builder)
+    const normalizedBookId = parseInt(bookId, 10).toString();
+    const book = index.books[normalizedBookId];
+    if (!book) return null;
+    const entries = book[String(page)] || [];
+
+    return entries.map(([name, width, height, size, variants]) => ({
+        blob: `${index.prefix}${name}`,
+        width,
+        height,
+        size,
+        variants: (variants || []).map(([variantName, variantWidth, variantHeight, variantSize]) => ({
+            blob: `${index.prefix}${variantName}`,
+            width: variantWidth,
+            height: variantHeight,
+            size: variantSize,
+        })),
+    }));
+}
+
+/**
+ * Picks the smallest rendition to serve: the original or one of its derivatives.
+ * Derivatives are only considered when the Accept header allows their format.
+ * With a width, the smallest file at least that wide wins (else the widest available);
+ * without one, the smallest full-resolution file wins.
+ */
+export function pickVariant(image: IndexedImage, width?: number, accept?: string | null): ImageVariant {
+    const candidates: ImageVariant[] = [image, ...image.variants.filter(variant => {
+        const ext = variant.blob.split('.').pop()?.toLowerCase() || '';
+        const mime = VARIANT_MIME[ext];
+        return !mime || (accept || '').includes(mime);
+    })];
+
+    let pool = width
+        ? candidates.filter(candidate => candidate.width >= width)
+        : candidates.filter(candidate => candidate.width === image.width);
+    if (pool.length === 0) {
+        const widest = Math.max(...candidates.map(candidate => candidate.width));
+        pool = candidates.filter(candidate => candidate.width === widest);
+    }
+    return pool.reduce((best, candidate) => (candidate.size < best.size ? candidate : best));
+}
@@ -0,0 +1,97 @@
+import type { Bucket } from '@google-cloud/storage';
+
+// Per-book image packs, written by scripts/image_pack.py (extract_images.py --pack).
+// Each book is one object with its images concatenated at aligned offsets; the catalog maps
+// (book, page) -> [[index, offset, length, ext, width, height], ...] in index order. Format:
+// { "version": 1, "align": 4096, "books": { "15": { "pack": "15-Main.1a2b3c4d.pack", "size": 123, "pages": { "114": [...] } } } }
+// Pack names carry a content hash, so a catalog cached from before a republish still points at the old pack.
+export const PACK_PREFIX = 'extracted_images/packs/';
+export const PACK_INDEX_PATH = `${PACK_PREFIX}pack_index.json`;
+
+// Reload the catalog periodically so a republish is picked up without a redeploy
+const PACK_INDEX_TTL_MS = 1000 * 60 * 10;
+
+type PackEntry = [index: number, offset: number, length: number, ext: string, width: number | null, height: number | null];
+
+interface PackIndexFile {
+    version: number;
+    align: number;
+    books: { [bookId: string]: { pack: string; size: number; pages: { [page: string]: PackEntry[] } } };
+}
+
+export interface PackedImage {
+    blob: string;
+    offset: number;
+    length: number;
+    contentType: string;
+}
+
+const MIME_TYPES: { [ext: string]: string } = {
+    jpeg: 'image/jpeg', jpg: 'image/jpeg', png: 'image/png', webp: 'image/webp', avif: 'image/avif', gif: 'image/gif',
+};
+
+let cachedIndex: { data: PackIndexFile | null; loadedAt: number } | null = null;
+let pendingLoad: Promise<PackIndexFile | null> | null = null;
+
+async function loadIndex(bucket: Bucket): Promise<PackIndexFile | null> {
+    try {
+        const [contents] = await bucket.file(PACK_INDEX_PATH).download();
+        return JSON.parse(contents.toString('utf-8')) as PackIndexFile;
+    } catch (error: any) {
+        // Packs are optional; callers fall back to the loose-file lookup
+        console.warn(`Pack index unavailable (${PACK_INDEX_PATH}): ${error.message}`);
+        return null;
+    }
+}
+
+async function getIndex(bucket: Bucket): Promise<PackIndexFile | null> {
+    if (cachedIndex && Date.now() - cachedIndex.loadedAt < PACK_INDEX_TTL_MS) {
+        return cachedIndex.data;
+    }
+    // Share one download between concurrent requests
+    if (!pendingLoad) {
+        pendingLoad = loadIndex(bucket).then(data => {
+            cachedIndex = { data, loadedAt: Date.now() };
+            pendingLoad = null;
+            return data;
+        });
+    }
+    return pendingLoad;
+}
+
+/**
+ * Locates the position-th (0-based) image of a book page inside its pack.
+ * Returns null when no pack catalog is published or the image is not packed.
+ */
+export async function lookupPackedImage(bucket: Bucket, bookId: string, page: number, position: number): Promise<PackedImage | null> {
+    const index = await getIndex(bucket);
+    if (!index) return null;
+
+    // Normalize bookId: "02" -> "2" (same as the pack writer)
+    const book = index.books[parseInt(bookId, 10).toString()];
+    const entry = book?.pages[String(page)]?.[position];
+    if (!entry) return null;
+
+    const [, offset, length, ext] = entry;
+    return {
+        blob: `${PACK_PREFIX}${book.pack}`,
+        offset,
+        length,
+        contentType: MIME_TYPES[ext.toLowerCase()] || 'application/octet-stream',
+    };
+}
+
+/**
+ * Reads one packed image with a single ranged download (end is inclusive).
+ */
+export async function readPackedImage(bucket: Bucket, image: PackedImage): Promise<Buffer> {
+    const [contents] = await bucket.file(image.blob).download({
+        start: image.offset,
+        end: image.offset + image.length - 1,
+        validation: false,  // Whole-object checksums do not apply to a range
+    });
+    if (contents.length !== image.length) {
+        throw new Error(`Short range read from ${image.blob}: ${contents.length} of ${image.length} bytes`);
+    }
+    return contents;
+}
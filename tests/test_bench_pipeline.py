@@ -0,0 +1,22 @@
+from bench_pipeline import compare
+
+def make_report(key, seconds, calibrate=1.0):
+    stages = {"calibrate": {"seconds": calibrate, "relative_cost": 1.0},
+              "box_extraction": {"seconds": seconds, "relative_cost": round(seconds / calibrate, 3)}}
+    for stage in stages.values():
+        stage.update(pages=20, items=40, pages_per_sec=20 / stage["seconds"], items_per_sec=40 / stage["seconds"],
+                     peak_rss_mb=100.0, bytes_written=1000)
+    return {"profile": "quick", "machine": {"key": key}, "stages": stages}
+
+def test_other_machine_compares_relative_cost_only():
+    baseline = {"quick": {"fast": make_report("fast", 2.0, calibrate=0.5)}}
+    failures, warnings = compare(make_report("slow", 8.0, calibrate=2.0), baseline)
+    assert failures == [] and "no baseline for machine 'slow'" in warnings[0]
+    failures, _ = compare(make_report("slow", 12.0, calibrate=2.0), baseline)
+    assert [failure.split(":")[0] for failure in failures] == ["box_extraction"]
+
+def test_same_machine_checks_throughput():
+    baseline = {"quick": {"ci": make_report("ci", 2.0)}}
+    failures, warnings = compare(make_report("ci", 3.0, calibrate=1.5), baseline)
+    assert warnings == [] and [failure.split(" ")[:2] for failure in failures] == [
+        ["box_extraction:", "pages_per_sec"], ["box_extraction:", "items_per_sec"]]
@@ -0,0 +1,23 @@
+import fitz
+
+from box_extraction import (box_clip, compare_pixmaps, make_benchmark_page, render_clips, select_boxes,
+                            select_boxes_reference)
+
+def test_select_boxes_matches_reference():
+    doc = fitz.open()
+    for seed in range(3):
+        page = make_benchmark_page(doc, 800, seed=seed)
+        rects = [shape["rect"] for shape in page.get_drawings()]
+        reference = [tuple(rect) for rect in select_boxes_reference(rects, page.rect)]
+        assert reference and [tuple(rect) for rect in select_boxes(rects, page.rect)] == reference
+
+def test_crop_capture_matches_per_clip_render():
+    doc = fitz.open()
+    page = make_benchmark_page(doc, 300, seed=1)
+    page.insert_text((73.3, 140.7), "Caption across a box edge")
+    clips = [box_clip(rect, page.rect) for rect in select_boxes([shape["rect"] for shape in page.get_drawings()], page.rect)]
+    assert len(clips) > 1
+    clipped, _ = render_clips(page, clips, mode="clip")
+    cropped, mode = render_clips(page, clips, mode="crop")
+    assert mode == "crop"
+    assert [compare_pixmaps(a, b) for a, b in zip(clipped, cropped)] == [(True, 0)] * len(clips)
@@ -0,0 +1,20 @@
+import fitz
+
+from box_extraction import make_benchmark_page
+from drawing_cache import CACHE_DIR, load_drawings, select_boxes_cached, verify
+
+def test_cached_selection_matches_live_select_boxes(tmp_path):
+    pdf = tmp_path / "boxes.pdf"
+    doc = fitz.open()
+    for seed in range(3):
+        make_benchmark_page(doc, 400, seed=seed)
+    doc.new_page()  # page without drawings
+    doc.save(str(pdf))
+
+    cache_dir = str(tmp_path / CACHE_DIR)
+    cache, hit = load_drawings(str(pdf), cache_dir)
+    assert not hit and select_boxes_cached(cache)
+    assert verify(str(pdf), cache) == []
+
+    reloaded, hit = load_drawings(str(pdf), cache_dir)
+    assert hit and verify(str(pdf), reloaded) == []
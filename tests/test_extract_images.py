@@ -0,0 +1,128 @@
+import os
+
+import fitz
+import numpy as np
+import pytest
+
+from extract_images import (extract_images_from_pdf, extract_images_parallel, index_name, page_runs, parse_args,
+                            plan_document, resolve_near_duplicates, split_page_ranges)
+
+class Resolver:
+    def __init__(self, canonical):
+        self.canonical = canonical
+
+    def resolve(self, key):
+        return self.canonical.get(key, key)
+
+def test_split_page_ranges():
+    assert split_page_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert split_page_ranges(0, 4) == []
+
+def random_pixmap(size, seed):
+    data = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    return fitz.Pixmap(fitz.csRGB, size, size, data.tobytes(), False)
+
+def make_book(path, pages, seed):
+    """Pages with a shared logo xref plus one JPEG and one PNG photo each."""
+    doc = fitz.open()
+    logo = None
+    for page_no in range(pages):
+        page = doc.new_page()
+        if logo is None:
+            logo = page.insert_image(fitz.Rect(10, 10, 230, 230), stream=random_pixmap(240, seed).tobytes("png"))
+        else:
+            page.insert_image(fitz.Rect(10, 10, 230, 230), xref=logo)
+        page.insert_image(fitz.Rect(300, 10, 540, 250), stream=random_pixmap(240, seed * 100 + page_no).tobytes("jpeg"))
+        page.insert_image(fitz.Rect(300, 300, 540, 540), stream=random_pixmap(240, seed * 100 + 50 + page_no).tobytes("png"))
+    doc.save(path)
+
+def read_tree(root):
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+def test_parallel_output_matches_serial(tmp_path):
+    pdf_paths = [str(tmp_path / f"{name}.pdf") for name in ("01-Main", "02-Main")]
+    for seed, path in enumerate(pdf_paths, start=1):
+        make_book(path, 7, seed)
+
+    serial_pages = {path: extract_images_from_pdf(path, str(tmp_path / "serial"))["pages"] for path in pdf_paths}
+    summary = extract_images_parallel(pdf_paths, str(tmp_path / "parallel"), workers=2, pages_per_task=3)
+
+    assert {path: book["pages"] for path, book in summary["books"].items()} == serial_pages
+    serial_files = read_tree(tmp_path / "serial")
+    assert len(serial_files) == 2 * 7 * 3 and read_tree(tmp_path / "parallel") == serial_files
+
+def test_page_runs():
+    assert page_runs([3, 4, 5, 9]) == [(2, 5), (8, 9)]
+    assert page_runs([]) == []
+    assert split_page_ranges(10, 4, start=8) == [(8, 10)]
+
+def test_near_duplicate_uses_canonical_blob_metadata():
+    books = {"15-Main": {114: [{"name": "15-Main_p114_01.png", "index": 1, "hash": "aa11", "ext": "png",
+                                "width": 100, "height": 80, "size": 5000}]}}
+    blobs = {"aa11": {"ext": "png", "width": 100, "height": 80, "size": 5000},
+             "bb22": {"ext": "jpeg", "width": 400, "height": 320, "size": 30000}}
+    record = resolve_near_duplicates(books, Resolver({"aa11": "bb22"}), blobs)["15-Main"][114][0]
+    assert (record["hash"], record["ext"], record["width"], record["height"], record["size"]) == \
+        ("bb22", "jpeg", 400, 320, 30000)
+    assert index_name(record) == "blobs/bb/bb22.jpeg"
+    assert record["name"] == "15-Main_p114_01.png"
+
+def test_near_dup_requires_store():
+    with pytest.raises(SystemExit):
+        parse_args(["book.pdf", "--near-dup"])
+    assert parse_args(["book.pdf", "--near-dup", "--store", "store"]).near_dup == -1
+
+def test_incremental_rejects_store_and_parallel():
+    for extra in (["--store", "store"], ["--parallel"], ["--store", "store", "--near-dup"]):
+        with pytest.raises(SystemExit):
+            parse_args(["book.pdf", "--incremental", "state.json"] + extra)
+    assert parse_args(["book.pdf", "--incremental", "state.json"]).incremental == "state.json"
+
+def test_record_manifest_replaces_only_scoped_pages(tmp_path):
+    from extract_images import record_manifest
+    from image_store import ImageManifest
+
+    manifest = ImageManifest(str(tmp_path / "manifest.json"))
+    for page in (1, 2, 3):
+        manifest.record("15-Main", page, 1, f"h{page}", "png", 10, 10, 100, "Intro")
+    record_manifest(manifest, "15-Main", {2: [{"index": 2, "hash": "new", "ext": "png", "width": 10, "height": 10,
+                                               "size": 100}]}, only=[2, 3])
+    assert manifest.images == {"15-Main/1/1": "h1", "15-Main/2/2": "new"}
+    assert manifest.chapters == {"15-Main/1/1": "Intro"}
+
+def test_remove_stale_files_limited_to_scope(tmp_path):
+    from extract_images import remove_stale_files
+
+    for name in ("15-Main_p003_01.png", "15-Main_p003_02.png", "15-Main_p020_01.png", "16-Main_p003_01.png"):
+        (tmp_path / name).write_bytes(b"x")
+    pages = {3: [{"name": "15-Main_p003_01.png"}]}
+    assert remove_stale_files(str(tmp_path), "15-Main", pages, only=[3]) == 1
+    assert sorted(os.listdir(tmp_path)) == ["15-Main_p003_01.png", "15-Main_p020_01.png", "16-Main_p003_01.png"]
+    assert remove_stale_files(str(tmp_path), "15-Main", pages) == 1
+    assert sorted(os.listdir(tmp_path)) == ["15-Main_p003_01.png", "16-Main_p003_01.png"]
+
+def test_plan_counts_unique_xrefs_and_excludes_repeats(tmp_path):
+    icon = random_pixmap(50, 0).tobytes("png")     # too small: rejected by metadata
+    photo = random_pixmap(400, 1).tobytes("jpeg")  # JPEG over MIN_FILE_SIZE_KB: passthrough
+    diagram = random_pixmap(400, 2).tobytes("png")  # PNG: size known only after decoding
+    doc = fitz.open()
+    first = doc.new_page()
+    icon_xref = first.insert_image(fitz.Rect(0, 0, 50, 50), stream=icon)
+    first.insert_image(fitz.Rect(100, 100, 300, 300), stream=photo)
+    first.insert_image(fitz.Rect(100, 400, 300, 600), stream=diagram)
+    for _ in range(3):
+        doc.new_page().insert_image(fitz.Rect(0, 0, 50, 50), xref=icon_xref)
+    pdf = tmp_path / "book.pdf"
+    doc.save(str(pdf))
+
+    plan = plan_document(str(pdf))
+    assert plan["occurrences"] == 6 and plan["unique_xrefs"] == 3 and plan["xref_repeats"] == 3
+    assert plan["rejected_by_metadata"] == 1 and plan["rejected"]["dimension"] == 1
+    assert plan["passthrough"] == 1 and plan["needs_decode"] == 1
+    assert plan["decodes_avoided"] == 2
@@ -0,0 +1,40 @@
+import os
+
+import fitz
+import pytest
+
+pytest.importorskip("PIL")
+
+from image_derivatives import DerivativeManifest, generate_derivatives, variant_name
+
+def write_png(path, size, shade):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+    pix.clear_with(shade)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pix.save(path)
+
+def test_current_sources_are_skipped(tmp_path):
+    root = str(tmp_path)
+    write_png(os.path.join(root, "01-Main", "p1_1.png"), 64, 40)
+    write_png(os.path.join(root, "01-Main", "p2_1.png"), 64, 200)
+    options = {"formats": ["webp"], "widths": [32], "workers": 1}
+
+    _, report = generate_derivatives(root, **options)
+    assert report["images"] == 2 and report["variants"] == 4
+    assert DerivativeManifest(root).is_current("01-Main/p1_1.png", ["webp"], [32])
+
+    _, report = generate_derivatives(root, **options)
+    assert report["images"] == 0
+
+    write_png(os.path.join(root, "01-Main", "p1_1.png"), 80, 40)  # source changed
+    os.remove(os.path.join(root, variant_name("01-Main/p2_1.png", "webp", 32)))  # variant missing
+    manifest = DerivativeManifest(root)
+    assert not manifest.is_current("01-Main/p1_1.png", ["webp"], [32])
+    assert not manifest.is_current("01-Main/p2_1.png", ["webp"], [32])
+    _, report = generate_derivatives(root, **options)
+    assert report["images"] == 2
+
+    _, report = generate_derivatives(root, **options, force=True)
+    assert report["images"] == 2
+    _, report = generate_derivatives(root, formats=["webp"], widths=[16, 32], workers=1)  # new thumbnail width
+    assert report["images"] == 2
@@ -0,0 +1,23 @@
+from image_index import ImageIndex, normalize_book_id
+
+def record(name, chapter=None):
+    return {"name": name, "width": 10, "height": 10, "size": 100, "chapter": chapter}
+
+def test_normalize_book_id():
+    assert [normalize_book_id(book) for book in ("15-Main", "02", "2", "Intro")] == ["15", "2", "2", "Intro"]
+
+def test_lookup_distinguishes_unindexed_book_from_empty_page():
+    index = ImageIndex()
+    index.replace_book("15-Main", {114: [record("a.png")]})
+    assert [entry["blob"] for entry in index.lookup("15", 114)] == ["extracted_images/a.png"]
+    assert index.lookup("15", 115) == []
+    assert index.lookup("16", 114) is None
+
+def test_replace_book_only_keeps_pages_outside_scope():
+    index = ImageIndex()
+    index.replace_book("15-Main", {1: [record("p1.png", "Intro")], 2: [record("p2.png", "Intro")],
+                                   3: [record("p3.png", "Body")]})
+    index.replace_book("15-Main", {2: [record("p2b.png", "Intro")]}, only=[2, 3])
+    assert {page: [entry[0] for entry in entries] for page, entries in index.books["15"].items()} == \
+        {"1": ["p1.png"], "2": ["p2b.png"]}
+    assert index.chapters["15"] == {"1": "Intro", "2": "Intro"}
@@ -0,0 +1,51 @@
+import os
+
+from image_pack import PACK_INDEX_FILENAME, PackReader, PackWriter, load_pack_index, pack_books, save_pack_index
+
+def write_images(root, images):
+    for name, data in images.items():
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(data)
+    return {"15-Main": {114: [{"name": name, "index": i, "ext": "png", "width": 10, "height": 10}
+                              for i, name in enumerate(sorted(images), start=1)]}}
+
+def test_writer_aligns_offsets_and_reader_slices(tmp_path):
+    writer = PackWriter(str(tmp_path), "15-Main", align=16)
+    writer.add(114, 1, b"abc", "png", 1, 1)
+    writer.add(114, 2, b"defgh", "jpeg", 2, 2)
+    book = writer.close()
+    assert book["pages"]["114"] == [[1, 0, 3, "png", 1, 1], [2, 16, 5, "jpeg", 2, 2]]
+    assert writer.padding == 13
+    save_pack_index(str(tmp_path / PACK_INDEX_FILENAME), {"15": book})
+
+    reader = PackReader(str(tmp_path))
+    data, mime = reader.get("15", 114, 1)
+    assert (bytes(data), mime) == (b"defgh", "image/jpeg")
+    assert reader.get("15", 114, 2) is None
+    assert reader.get("16", 114) is None
+
+def test_pack_name_carries_content_hash(tmp_path):
+    first = PackWriter(str(tmp_path), "15-Main")
+    first.add(1, 1, b"same", "png", None, None)
+    second = PackWriter(str(tmp_path), "15-Main")
+    second.add(1, 1, b"same", "png", None, None)
+    other = PackWriter(str(tmp_path), "15-Main")
+    other.add(1, 1, b"different", "png", None, None)
+    names = [writer.close()["pack"] for writer in (first, second, other)]
+    assert names[0] == names[1] != names[2]
+    assert names[0].startswith("15-Main.") and names[0].endswith(".pack")
+
+def test_rebuild_writes_new_object_and_removes_superseded_pack(tmp_path):
+    source, pack_dir = tmp_path / "images", tmp_path / "packs"
+    source.mkdir()
+    books = write_images(str(source), {"15-Main_p114_01.png": b"old image"})
+    pack_books(str(source), str(pack_dir), books)
+    old = load_pack_index(str(pack_dir / PACK_INDEX_FILENAME))["books"]["15"]["pack"]
+
+    books = write_images(str(source), {"15-Main_p114_01.png": b"new image!"})
+    pack_books(str(source), str(pack_dir), books)
+    new = load_pack_index(str(pack_dir / PACK_INDEX_FILENAME))["books"]["15"]["pack"]
+
+    assert new != old
+    assert sorted(os.listdir(pack_dir)) == sorted([new, PACK_INDEX_FILENAME])
+    assert bytes(PackReader(str(pack_dir)).get("15", 114)[0]) == b"new image!"
@@ -0,0 +1,79 @@
+import fitz
+
+from improved_extraction import could_have_table, detect_tables, get_page_fingerprint
+
+def wrapped_pages():
+    """Two pages placed with show_pdf_page(): a ruled table and plain prose, same content stream."""
+    src = fitz.open()
+    table = src.new_page()
+    for i in range(6):
+        table.draw_line((50, 100 + i * 30), (400, 100 + i * 30))
+    for x in (50, 200, 400):
+        table.draw_line((x, 100), (x, 250))
+    for i in range(5):
+        table.insert_text((60, 120 + i * 30), f"cell {i}")
+        table.insert_text((210, 120 + i * 30), f"value {i}")
+    src.new_page().insert_text((50, 100), "Just prose on this page.")
+
+    doc = fitz.open()
+    for i in range(2):
+        page = doc.new_page()
+        page.show_pdf_page(page.rect, src, i)
+    return fitz.open("pdf", doc.tobytes())
+
+def new_report():
+    return {"scanned": [], "skipped": [], "cache_hits": [], "missed": {}, "tables_found": 0,
+            "classifier_seconds": 0.0, "find_tables_seconds": 0.0}
+
+def new_stats():
+    return {"table_pages_scanned": 0, "table_pages_skipped": 0, "table_cache_hits": 0}
+
+def test_xobject_wrapped_pages_get_distinct_fingerprints():
+    doc = wrapped_pages()
+    assert doc[0].read_contents() == doc[1].read_contents()
+    assert get_page_fingerprint(doc[0]) != get_page_fingerprint(doc[1])
+
+def test_prose_page_does_not_hit_table_page_cache_entry():
+    doc = wrapped_pages()
+    cache, stats, report = {}, new_stats(), new_report()
+    assert len(detect_tables(doc[0], cache, stats, report)) == 1
+    assert detect_tables(doc[1], cache, stats, report) == []
+    assert report["cache_hits"] == []
+    assert report["scanned"] == [1]
+
+def test_exhaustive_bypasses_cache():
+    doc = wrapped_pages()
+    cache = {get_page_fingerprint(doc[1]): [[0, 0, 10, 10]]}
+    stats, report = new_stats(), new_report()
+    assert detect_tables(doc[1], cache, stats, report, exhaustive=True) == []
+    assert report["cache_hits"] == []
+    assert report["scanned"] == [2]
+
+def framed_image_page(doc):
+    """A photo with a frame inside a page border, plus a caption: no table."""
+    page = doc.new_page()
+    page.draw_rect(fitz.Rect(20, 20, 575, 822))
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+    pix.clear_with(180)
+    page.insert_image(fitz.Rect(100, 100, 400, 300), pixmap=pix)
+    page.draw_rect(fitz.Rect(98, 98, 402, 302))
+    page.insert_text((100, 320), "Figure 1. A framed photo.")
+    return page
+
+def test_framed_image_page_is_skipped():
+    doc = fitz.open()
+    page = framed_image_page(doc)
+    is_candidate, _ = could_have_table(page)
+    assert not is_candidate
+    stats, report = new_stats(), new_report()
+    assert detect_tables(page, {}, stats, report) == []
+    assert report["skipped"] == [1] and report["scanned"] == []
+
+def test_grid_of_cell_rects_is_candidate():
+    doc = fitz.open()
+    page = doc.new_page()
+    for row in range(4):
+        for col in range(3):
+            page.draw_rect(fitz.Rect(50 + col * 100, 100 + row * 25, 150 + col * 100, 125 + row * 25))
+    is_candidate, signals = could_have_table(page)
+    assert is_candidate and signals["horizontal"] == 5 and signals["vertical"] == 4
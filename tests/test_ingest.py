@@ -0,0 +1,37 @@
+import json
+import os
+
+from ingest import ingest
+from storage_backends import LocalBackend
+from synthetic_pdf import generate_book
+
+SPEC = {"pages": 6, "images_per_page": 1, "image_size": [240, 240], "drawings_per_page": 0, "text_lines": 2}
+
+def run(pdf_paths, tmp_path):
+    return ingest(pdf_paths, output_dir=str(tmp_path / "images"), state_path=str(tmp_path / "state.json"), workers=1,
+                  pages_per_task=2, backend=LocalBackend(str(tmp_path / "bucket")), destination_folder="images/")
+
+def test_rerun_executes_only_pending_tasks(tmp_path):
+    pdf_paths = []
+    for seed, name in enumerate(("01-Main", "02-Main")):
+        path = str(tmp_path / f"{name}.pdf")
+        generate_book(path, {**SPEC, "seed": seed})
+        pdf_paths.append(path)
+
+    first = run(pdf_paths, tmp_path)
+    assert first["tasks"] == 6 and sorted(first["uploads"]) == ["01-Main", "02-Main"]
+    assert run(pdf_paths, tmp_path)["tasks"] == 0
+
+    # Interrupted after two of 02-Main's three tasks
+    state_path = tmp_path / "state.json"
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    book = state["books"]["02-Main"]
+    del book["tasks"]["4-6"]
+    book.update({"complete": False, "uploaded": False})
+    state_path.write_text(json.dumps(state), encoding="utf-8")
+
+    resumed = run(pdf_paths, tmp_path)
+    assert resumed["tasks"] == 1
+    assert list(resumed["books"]) == ["02-Main"] and list(resumed["uploads"]) == ["02-Main"]
+    assert resumed["pages"] == first["pages"]
+    assert os.path.exists(tmp_path / "bucket" / "images" / resumed["pages"]["02-Main"][5][0]["name"])
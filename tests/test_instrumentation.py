@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+def test_metrics_written_when_run_fails(tmp_path):
+    script = ("import sys; sys.path.insert(0, sys.argv[1])\n"
+              "from instrumentation import METRICS, count\n"
+              "METRICS.configure(sys.argv[2])\n"
+              "count('pages_done', book='15-Main')\n"
+              "raise RuntimeError('extraction failed')\n")
+    result = subprocess.run([sys.executable, "-c", script, os.path.join(ROOT, "scripts"), str(tmp_path)],
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    with open(tmp_path / "metrics.prom", encoding="utf-8") as f:
+        assert 'pages_done_total{book="15-Main"} 1' in f.read()
@@ -0,0 +1,73 @@
+import base64
+import hashlib
+from types import SimpleNamespace
+
+import fitz
+
+import parse_pdf_toc
+from local_toc import TOC_PAGE_CONFIG
+
+def blank_pdf():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Scanned contents page without a text layer")
+    return doc.tobytes()
+
+def test_undetected_toc_falls_back_to_uri_reference(monkeypatch):
+    monkeypatch.setattr(parse_pdf_toc, "build_document_part", lambda uri: ("from_uri", uri))
+    payloads = {}
+    factory = parse_pdf_toc.payload_document_factory("pdf", pdf_loader=lambda uri: blank_pdf(), payloads=payloads)
+    assert factory("gs://bucket/01-Content.pdf") == ("from_uri", "gs://bucket/01-Content.pdf")
+    assert payloads["gs://bucket/01-Content.pdf"]["mode"] == "full"
+
+def test_stub_parts_stay_inline():
+    factory = parse_pdf_toc.payload_document_factory("pdf", parse_pdf_toc.InlinePart, pdf_loader=lambda uri: blank_pdf())
+    parts = factory("01-Content.pdf")
+    assert [part.mime_type for part in parts] == ["application/pdf"]
+
+def test_payload_cache_key_tracks_detection_settings(monkeypatch):
+    before = parse_pdf_toc.payload_config_fingerprint()
+    monkeypatch.setitem(TOC_PAGE_CONFIG, "MIN_SCORE", TOC_PAGE_CONFIG["MIN_SCORE"] + 0.1)
+    assert parse_pdf_toc.payload_config_fingerprint() != before
+
+def gcs_blob(md5_hash=None, crc32c=None, generation=None):
+    return SimpleNamespace(name="01-Content.pdf", bucket=SimpleNamespace(name="bucket"),
+                           md5_hash=md5_hash, crc32c=crc32c, generation=generation)
+
+def test_composite_blob_hash_falls_back_to_crc32c_then_generation():
+    assert parse_pdf_toc.blob_content_hash(gcs_blob("bWQ1", "Y3JjMzJj", 7)) == "bWQ1"
+    assert parse_pdf_toc.blob_content_hash(gcs_blob(None, "Y3JjMzJj", 7)) == "crc32c:Y3JjMzJj"
+    assert parse_pdf_toc.blob_content_hash(gcs_blob(None, None, 7)) == "gs://bucket/01-Content.pdf#7"
+
+def test_local_hash_matches_gcs_md5_encoding(tmp_path):
+    data = blank_pdf()
+    (tmp_path / "01-Content.pdf").write_bytes(data)
+    gcs_md5 = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+    assert parse_pdf_toc.get_local_pdf_files(str(tmp_path))[0]["content_hash"] == gcs_md5
+
+def test_last_chapter_ends_at_book_page_count():
+    toc = [{"title": "서문", "page": 5}, {"title": "빅뱅", "page": 12}]
+    results = parse_pdf_toc.build_results({"gs://bucket/01_Content.pdf": toc, "gs://bucket/02_Content.pdf": toc},
+                                          page_counts={"1": 240})
+    assert [chapter["end_page"] for chapter in results["01"]["toc"]] == [11, 240]
+    assert results["02"]["toc"][-1]["end_page"] == 22
+
+def toc_pdf():
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, (title, number) in enumerate([("Big Bang", 5), ("Stars", 21), ("Life", 48), ("Humans", 77)]):
+        page.insert_text((72, 100 + i * 24), f"{title} .......... {number}")
+    return doc.tobytes()
+
+def test_local_toc_accepted_at_threshold_and_falls_back_below():
+    pdfs = {"toc.pdf": toc_pdf(), "scan.pdf": blank_pdf()}
+    targets = [{"uri": uri} for uri in pdfs]
+    local, fallback, report = parse_pdf_toc.resolve_toc_local_first(targets, threshold=1.0, pdf_loader=pdfs.get)
+    confidence = report["per_book"]["toc.pdf"]["confidence"]
+    assert confidence == 1.0
+    assert [item["page"] for item in local["toc.pdf"]] == [5, 21, 48, 77]
+    assert fallback == [{"uri": "scan.pdf"}]
+
+    local, fallback, report = parse_pdf_toc.resolve_toc_local_first(targets, threshold=confidence + 0.01,
+                                                                    pdf_loader=pdfs.get)
+    assert local == {} and fallback == targets
+    assert report["resolved_locally"] == 0 and report["model_fallback"] == 2
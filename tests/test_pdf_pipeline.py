@@ -0,0 +1,55 @@
+import json
+
+import fitz
+import pytest
+
+from pdf_pipeline import JsonlSink, Pipeline, dedup_filter
+
+def write_items(path, items, **kwargs):
+    sink = JsonlSink(str(path), **kwargs)
+    for item in items:
+        sink.write(item)
+    sink.close()
+
+def read_items(path):
+    with open(path, encoding="utf-8") as f:
+        return [(record["book"], record["page"], record["kind"]) for record in map(json.loads, f)]
+
+def test_scoped_run_replaces_only_its_pages(tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_items(path, [{"kind": "text", "book": "15-Main", "page": page, "index": 1} for page in (1, 2, 3)], book="15-Main")
+    write_items(path, [{"kind": "text", "book": "16-Main", "page": 1, "index": 1}], book="16-Main")
+    write_items(path, [{"kind": "image", "book": "15-Main", "page": 2, "index": 1, "data": b"abc"}],
+                book="15-Main", only=[2, 3])
+    assert read_items(path) == [("15-Main", 1, "text"), ("15-Main", 2, "image"), ("16-Main", 1, "text")]
+
+def test_without_book_overwrites(tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_items(path, [{"kind": "text", "book": "15-Main", "page": 1, "index": 1}])
+    write_items(path, [{"kind": "text", "book": "16-Main", "page": 1, "index": 1}])
+    assert read_items(path) == [("16-Main", 1, "text")]
+
+def test_dedup_filter_passes_first_copy_only():
+    keep = dedup_filter()
+    items = [{"kind": "image", "data": b"logo"}, {"kind": "image", "data": b"logo"},
+             {"kind": "text", "data": b"logo"}, {"kind": "image", "data": b"photo"}]
+    assert [keep(item) for item in items] == [True, False, True, True]
+
+def test_failed_run_keeps_existing_output(tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_items(path, [{"kind": "text", "book": "doc", "page": 1, "index": 1}])
+    pdf = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for _ in range(2):
+        doc.new_page()
+    doc.save(str(pdf))
+
+    def failing_stage(ctx):
+        if ctx.page_no == 2:
+            raise RuntimeError("boom")
+        yield {"kind": "text", "book": ctx.book, "page": ctx.page_no, "index": 1, "data": b"new"}
+
+    with pytest.raises(RuntimeError):
+        Pipeline(stages=[failing_stage], sinks=[JsonlSink(str(path))]).run(str(pdf))
+    assert read_items(path) == [("doc", 1, "text")]
+    assert not (tmp_path / "items.jsonl.tmp").exists()
@@ -0,0 +1,31 @@
+import random
+
+from phash_index import MultiIndexHash, PerceptualIndex, hamming
+
+def test_multi_index_matches_linear_scan():
+    rng = random.Random(0)
+    table = MultiIndexHash(4)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    for i, value in enumerate(values):
+        table.add(value, i)
+    for value in values[:50]:
+        query = value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        expected = sorted((hamming(query, other), i) for i, other in enumerate(values) if hamming(query, other) <= 4)
+        assert table.query(query)[0] == expected
+
+def test_larger_blob_becomes_canonical(tmp_path):
+    index = PerceptualIndex(str(tmp_path / "phash_index.json"), threshold=4)
+    assert index.add("small", 0, 10) == "small"
+    assert index.add("alias", 0b111, 5) == "small"
+    assert index.add("large", 0b1, 20) == "large"
+    assert index.resolve("small") == index.resolve("alias") == "large"
+
+def test_promotion_rechecks_existing_aliases(tmp_path):
+    index = PerceptualIndex(str(tmp_path / "phash_index.json"), threshold=4)
+    index.add("canonical", 0, 10)
+    index.add("alias", 0b1111, 5)
+    # Within 4 of the canonical but 8 away from the alias: joins as an alias instead of taking over
+    assert index.add("large", 0b11110000, 20) == "canonical"
+    assert index.resolve("alias") == "canonical"
+    for alias, target in index.canonical.items():
+        assert hamming(index.entries[alias]["phash"], index.entries[target]["phash"]) <= 4
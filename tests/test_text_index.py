@@ -0,0 +1,25 @@
+import json
+import math
+
+from text_index import TEXT_CONFIG, TextIndex, build_index, tokenize
+
+def test_tokenize_splits_hangul_into_bigrams():
+    assert tokenize("빅뱅은 Big History") == ["빅뱅", "뱅은", "big", "history"]
+
+def test_scores_match_bm25_formula(tmp_path):
+    texts = ["star star planet", "star energy energy energy", "planet"]
+    chunks = tmp_path / "chunks.jsonl"
+    with open(chunks, "w", encoding="utf-8") as f:
+        for page, text in enumerate(texts, start=1):
+            f.write(json.dumps({"id": f"1:{page}", "book": "1", "page": page, "chapter": None, "text": text}) + "\n")
+    build_index(str(chunks), str(tmp_path / "index"))
+    index = TextIndex(str(tmp_path / "index"))
+
+    k1, b = TEXT_CONFIG["K1"], TEXT_CONFIG["B"]
+    lens = [len(text.split()) for text in texts]
+    avg_len = sum(lens) / len(lens)
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))  # "star" is in 2 of 3 documents
+    expected = [idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+                for tf, length in zip([2, 1, 0], lens)]
+    assert [round(float(score), 4) for score in index.scores("star")] == [round(score, 4) for score in expected]
+    assert [hit["page"] for hit in index.search("star")] == [1, 2]
@@ -0,0 +1,36 @@
+import pytest
+
+from toc_index import TocIndex, parse_page_ranges, select_pages
+
+CHAPTERS = [
+    {"title": "서문", "start_page": 5, "end_page": 9},
+    {"title": "빅뱅과 우주", "start_page": 10, "end_page": 29},
+    {"title": "별과 원소", "start_page": 30, "end_page": 40},
+]
+
+def make_toc():
+    toc = TocIndex()
+    toc.add_book("15-Main", CHAPTERS, page_count=52)
+    return toc
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("12-14, 3,13,") == [3, 12, 13, 14]
+    with pytest.raises(ValueError):
+        parse_page_ranges("30-12")
+
+def test_resolve_uses_chapter_intervals():
+    toc = make_toc()
+    assert toc.resolve("15", 4) is None
+    assert toc.resolve("015", 10)["title"] == "빅뱅과 우주"
+    assert toc.resolve("15-Main", 29)["title"] == "빅뱅과 우주"
+    assert toc.resolve("15", 52) == {"title": "별과 원소", "start_page": 30, "end_page": 52}
+    assert toc.resolve("15", 53) is None and toc.resolve("16", 10) is None
+    hits = [("15", page) for page in range(1, 60)] + [("16", 10)]
+    assert toc.resolve_many(hits) == [toc.resolve(book, page) for book, page in hits]
+
+def test_select_pages_merges_chapters_and_ranges():
+    toc = make_toc()
+    assert select_pages(toc, "15") is None
+    assert select_pages(toc, "15", chapters=["서문"], pages="8-11,50-60", page_count=52) == [5, 6, 7, 8, 9, 10, 11, 50, 51, 52]
+    with pytest.raises(ValueError):
+        select_pages(None, "15", chapters=["서문"])
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from storage_backends import LocalBackend, StorageBackend
+from upload_to_gcs import sync_directory, upload_directory
+
+class RecordingBackend(LocalBackend):
+    def __init__(self, root, fail=()):
+        super().__init__(root)
+        self.fail = set(fail)
+        self.uploaded = []
+
+    def upload(self, local_path, name):
+        if name.rsplit("/", 1)[-1] in self.fail:
+            raise RuntimeError("upload refused")
+        super().upload(local_path, name)
+        self.uploaded.append(name)
+
+def make_source(root, names):
+    os.makedirs(root, exist_ok=True)
+    for name in names:
+        with open(os.path.join(root, name), "w") as f:
+            f.write(name)
+
+def test_catalog_uploaded_after_packs(tmp_path):
+    make_source(str(tmp_path / "src"), ["pack_index.json", "15-Main.1a2b3c4d.pack", "16-Main.5e6f7a8b.pack"])
+    backend = RecordingBackend(str(tmp_path / "bucket"))
+    upload_directory(backend, str(tmp_path / "src"), "packs/", workers=4)
+    assert backend.uploaded[-1] == "packs/pack_index.json"
+    assert len(backend.uploaded) == 3
+
+def test_catalog_skipped_when_an_upload_fails(tmp_path):
+    make_source(str(tmp_path / "src"), ["pack_index.json", "15-Main.1a2b3c4d.pack"])
+    backend = RecordingBackend(str(tmp_path / "bucket"), fail={"15-Main.1a2b3c4d.pack"})
+    sync_directory(backend, str(tmp_path / "src"), "packs/", workers=2)
+    assert backend.uploaded == []
+
+def test_dry_run_implies_sync():
+    from upload_to_gcs import parse_args
+
+    args = parse_args(["--dry-run"])
+    assert args.sync and args.dry_run
+
+def test_plan_sync_classifies_new_changed_stale(tmp_path):
+    from upload_to_gcs import plan_sync
+
+    make_source(str(tmp_path / "src"), ["same.png", "changed.png", "new.png"])
+    backend = LocalBackend(str(tmp_path / "bucket"))
+    backend.upload(str(tmp_path / "src" / "same.png"), "images/same.png")
+    with open(tmp_path / "old.png", "w") as f:
+        f.write("something else")
+    backend.upload(str(tmp_path / "old.png"), "images/changed.png")
+    backend.upload(str(tmp_path / "old.png"), "images/stale.png")
+
+    plan = plan_sync(backend, str(tmp_path / "src"), "images/")
+    assert [name for name, _, _ in plan["new"]] == ["images/new.png"]
+    assert [name for name, _, _ in plan["changed"]] == ["images/changed.png"]
+    assert plan["delete"] == ["images/stale.png"]
+    assert plan["unchanged"] == 1
+
+def test_sync_keeps_stale_files_when_an_upload_fails(tmp_path):
+    make_source(str(tmp_path / "src"), ["a.png", "b.png"])
+    backend = RecordingBackend(str(tmp_path / "bucket"), fail={"b.png"})
+    LocalBackend.upload(backend, str(tmp_path / "src" / "a.png"), "images/stale.png")
+    sync_directory(backend, str(tmp_path / "src"), "images/", workers=2)
+    assert "images/stale.png" in backend.list_objects("images/")
+
+def test_backend_must_implement_interface():
+    class ListOnlyBackend(StorageBackend):
+        def list(self, prefix):
+            return []
+
+    with pytest.raises(TypeError, match="upload"):
+        ListOnlyBackend()